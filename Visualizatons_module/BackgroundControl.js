@@ -0,0 +1,15 @@
+// Tell the BackgroundServer whether the model runs continuously, and stop the
+// stepping thread when the model is stopped in the browser
+var backgroundControl = function() {
+	controller.step = function step() {
+		this.tick += 1;
+		stepDisplay.innerText = this.tick;
+		send({ type: "get_step", step: this.tick, running: this.running });
+	};
+
+	var stop = controller.stop;
+	controller.stop = function() {
+		stop.call(this);
+		send({ type: "stop" });
+	};
+};
@@ -0,0 +1,357 @@
+"""
+Background stepping server
+==========================
+
+ModularServer which gives every browser connection its own model, created
+and stepped on a pool of worker threads, so that a slow step does not
+freeze the browser, a slow render does not slow down the simulation, and
+one large model does not hold up the other connections.
+
+"""
+import copy
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import tornado.escape
+import tornado.ioloop
+from mesa.visualization.ModularVisualization import ModularServer, SocketHandler
+from mesa.visualization.modules import TextElement
+from mesa.visualization.UserParam import UserSettableParameter
+
+from result_cache import cache_key
+
+
+class BackgroundSocketHandler(SocketHandler):
+    """ Websocket handler which hands the messages of its connection to a
+    Session of the BackgroundServer instead of stepping a shared model.
+
+    Messages:
+        "get_step": Request the next frame. With "running" the model keeps
+                    stepping until "stop", otherwise it does one frame of
+                    steps_per_frame steps.
+        "stop": Stop stepping the model.
+        "reset": Create a new model, sent as a frame once created.
+        "submit_params": Set a parameter of the next model of the session.
+    """
+
+    def open(self):
+        super().open()
+        self.session = Session(self.application, self)
+
+    def on_message(self, message):
+        msg = tornado.escape.json_decode(message)
+        session = self.session
+
+        if msg["type"] == "get_step":
+            if session.model is not None and not session.model.running:
+                self.write_message({"type": "end"})
+            else:
+                session.request_frame(msg.get("running", False))
+
+        elif msg["type"] == "stop":
+            session.pause()
+
+        elif msg["type"] == "reset":
+            session.reset()
+
+        elif msg["type"] == "submit_params":
+            session.set_param(msg["param"], msg["value"])
+
+        else:
+            super().on_message(message)
+
+    def on_close(self):
+        self.session.close()
+
+
+class Session:
+    """ Model of one browser connection, stepped on the executor of the
+    BackgroundServer.
+
+    A session has its own parameters and its own copies of the visualization
+    elements, which keep state between frames. The state of the session is
+    only changed on the IO loop, which runs one job of the session at a time
+    on the executor: a job creates the model, or does one batch of steps and
+    renders a frame when one was requested. A running session submits a new job after every batch, so
+    the sessions take turns on the executor batch by batch.
+    """
+
+    def __init__(self, server, handler):
+        self.server = server
+        self.handler = handler
+        self.model_kwargs = copy.deepcopy(server.model_kwargs)
+        self.elements = [copy.copy(element) for element in server.visualization_elements]
+
+        # Used by the jobs only, one job at a time
+        self.recorder = None
+
+        # Changed on the IO loop only
+        self.model = None
+        self.generation = 0
+        self.reset_requested = False
+        self.frame_requested = False
+        self.running = False
+        self.frame_steps = 0
+        self.busy = False
+        self.closed = False
+        self.last_request = 0
+
+    def set_param(self, param, value):
+        """ Set a parameter of the next model, if it is editable. """
+        if param in self.server.user_params:
+            if isinstance(self.model_kwargs[param], UserSettableParameter):
+                self.model_kwargs[param].value = value
+            else:
+                self.model_kwargs[param] = value
+
+    def reset(self):
+        """ Drop the model and create a new one with the current parameters,
+        its first frame is sent once created.
+        """
+        self.generation += 1
+        self.reset_requested = True
+        self.frame_requested = True
+        self.running = False
+        self.frame_steps = 0
+        self.schedule()
+
+    def request_frame(self, running):
+        """ Ask for the next frame, sent once rendered. """
+        self.frame_requested = True
+        self.running = running
+        self.last_request = time.monotonic()
+        if not running and self.frame_steps == 0:
+            self.frame_steps = self.server.steps_per_frame(self.model_kwargs)
+        self.schedule()
+
+    def pause(self):
+        """ Stop stepping after the current batch. """
+        self.running = False
+        self.frame_steps = 0
+        self.frame_requested = False
+
+    def close(self):
+        self.pause()
+        self.closed = True
+        self.model = None
+
+    def schedule(self):
+        """ Submit the next job of the session to the executor, unless a job
+        is running or there is nothing to do.
+        """
+        if self.busy or self.closed:
+            return
+        if self.running and time.monotonic() - self.last_request > self.server.idle_timeout:
+            self.running = False
+
+        if self.reset_requested:
+            self.reset_requested = False
+            job, args = self.create, (self.server.model_params(self.model_kwargs),)
+        elif self.model is not None and self.model.running and (self.running or self.frame_steps > 0):
+            steps = self.frame_steps if self.frame_steps > 0 else self.server.steps_per_frame(self.model_kwargs)
+            self.frame_steps = 0
+            job, args = self.advance, (self.model, steps)
+        else:
+            return
+
+        self.busy = True
+        tornado.ioloop.IOLoop.current().spawn_callback(self.run_job, self.generation, job, args)
+
+    async def run_job(self, generation, job, args):
+        """ Run a job on the executor and send its frame, unless the session
+        was reset or closed in the meantime.
+        """
+        try:
+            model, frame = await tornado.ioloop.IOLoop.current().run_in_executor(self.server.executor, job, *args)
+        finally:
+            self.busy = False
+
+        if generation == self.generation and not self.closed:
+            self.model = model
+            if frame is not None:
+                self.frame_requested = False
+                if self.handler.ws_connection is not None:
+                    self.handler.write_message(frame)
+            if not model.running:
+                self.running = False
+        self.schedule()
+
+    def create(self, model_params):
+        """ Job creating the model, or replaying it from the cache.
+
+        Returns: (model, frame)
+
+        """
+        model, self.recorder = self.server.create_model(model_params)
+        return model, self.render(model)
+
+    def advance(self, model, steps):
+        """ Job doing steps steps of the model, and rendering a frame if one
+        was requested.
+
+        Returns: (model, frame or None)
+
+        """
+        for _ in range(steps):
+            if not model.running:
+                break
+            model.step()
+            if self.recorder is not None:
+                self.recorder.record(model)
+
+        if self.recorder is not None and not model.running:
+            self.server.cache.put(self.recorder.key, self.recorder.result(model))
+            self.recorder = None
+
+        frame = self.render(model) if self.frame_requested else None
+        return model, frame
+
+    def render(self, model):
+        """ Render the elements of the session.
+
+        Returns: JSON viz_state message
+
+        """
+        data = [element.render(model) for element in self.elements]
+        return tornado.escape.json_encode({"type": "viz_state", "data": data})
+
+
+class BackgroundServer(ModularServer):
+    """ Visualization server with a model per connection, stepped on a pool
+    of worker threads.
+
+    The browser asks for frames at the rate of its frames per second slider.
+    Between two requests the session keeps stepping its model, and a frame
+    is rendered from the latest state only when one was requested, so the
+    steps in between are never rendered. Models are created, stepped and
+    rendered by the executor, never on the IO loop, and max_workers bounds
+    the number of sessions worked on at the same time.
+
+    Every model draws from its own random generators, so the models of the
+    sessions are created and stepped in parallel, and seeded runs are
+    reproducible whatever the other sessions do. The array work of the
+    steps releases the GIL, the Python work of the agent engine does not.
+
+    The number of steps between two frames in single step mode, and at
+    least between two frames while running, is the "steps_per_frame"
+    parameter, which can be a UserSettableParameter in model_params; it is
+    not passed to the model.
+
+    With a ResultCache, a reset with parameters (seed included) that were
+    run to the end before replays the cached run instead of creating a
+    model, and the runs simulated to the end are added to the cache. Runs
+    without a seed are new random runs every time, they are never cached.
+    """
+
+    socket_handler = (r"/ws", BackgroundSocketHandler)
+    handlers = [ModularServer.page_handler, socket_handler,
+                ModularServer.static_handler, ModularServer.local_handler]
+
+    # Parameters of model_params used by the server instead of the model
+    SERVER_PARAMS = ("steps_per_frame",)
+
+    def __init__(self, model_cls, visualization_elements, name="Mesa Model", model_params={},
+                 idle_timeout=5, cache=None, max_workers=4):
+        """ Create a new visualization server with the given elements.
+
+        Args:
+            idle_timeout: seconds after the last frame request at which a
+                          running model is paused, for browsers that went
+                          away without stopping it.
+            cache: ResultCache of the finished runs, None to always simulate.
+            max_workers: number of threads creating, stepping and rendering
+                         the models of the sessions.
+
+        """
+        self.idle_timeout = idle_timeout
+        self.cache = cache
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="session")
+
+        super().__init__(model_cls, visualization_elements, name, model_params)
+        self.local_includes.add("Visualizatons_module\\BackgroundControl.js")
+        self.js_code.append("backgroundControl();")
+
+    def model_params(self, model_kwargs):
+        """ Parameters of the model, without the server parameters.
+
+        Returns: dictionary of keyword arguments of the model class
+
+        """
+        model_params = {}
+        for key, val in model_kwargs.items():
+            if key in self.SERVER_PARAMS:
+                continue
+            if isinstance(val, UserSettableParameter):
+                if val.param_type == "static_text":
+                    continue
+                model_params[key] = val.value
+            else:
+                model_params[key] = val
+        return model_params
+
+    def reset_model(self):
+        """ Models are created by the sessions, the server has none. """
+        self.model = None
+
+    def create_model(self, model_params):
+        """ Instantiate a model with the given parameters, or replay the run
+        from the cache when they have a seed.
+
+        Returns: (model, RunRecorder of the run or None)
+
+        """
+        if self.cache is None or model_params.get("seed") is None:
+            return self.model_cls(**model_params), None
+
+        key = cache_key(model_params)
+        record = self.cache.get(key)
+        if record is not None:
+            return self.cache.replay(record), None
+        model = self.model_cls(**model_params)
+        return model, self.cache.recorder(key, model)
+
+    @staticmethod
+    def steps_per_frame(model_kwargs):
+        value = model_kwargs.get("steps_per_frame", 1)
+        if isinstance(value, UserSettableParameter):
+            value = value.value
+        return max(1, int(value))
+
+
+class SimulationSpeed(TextElement):
+    """ Text element showing the model step and the simulation speed, the
+    number of steps per second since the previous frame.
+    """
+
+    def __init__(self):
+        self.last_step = None
+        self.last_time = None
+
+    def render(self, model):
+        now = time.perf_counter()
+        step = model.schedule.steps
+        if self.last_step is None or step < self.last_step:
+            rate = 0.0
+        else:
+            rate = (step - self.last_step) / max(now - self.last_time, 1e-9)
+        self.last_step = step
+        self.last_time = now
+        return "Model step: {} &nbsp; Simulation speed: {:.1f} steps/s".format(step, rate)
+
+
+class CacheStatus(TextElement):
+    """ Text element showing whether the run is replayed from the
+    ResultCache, and the hit and miss counters of the cache.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def render(self, model):
+        metrics = self.cache.metrics()
+        return ("Run: {} &nbsp; Cache: {} hits ({} memory, {} disk), {} misses, "
+                "{} evictions, {} runs in memory ({:.1f} MB)").format(
+            "replayed from cache" if getattr(model, "replayed", False) else "simulated",
+            metrics["memory_hits"] + metrics["disk_hits"], metrics["memory_hits"], metrics["disk_hits"],
+            metrics["misses"], metrics["memory_evictions"] + metrics["disk_evictions"],
+            metrics["memory_runs"], metrics["memory_bytes"] / 2 ** 20)
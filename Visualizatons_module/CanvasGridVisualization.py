@@ -6,7 +6,11 @@ Modular Canvas Rendering
 Module for visualizing model objects in grid cells.
 
 """
-from collections import defaultdict
+import base64
+import json
+import weakref
+
+import numpy as np
 from mesa.visualization.ModularVisualization import VisualizationElement
 
 
@@ -15,10 +19,21 @@ class CanvasGrid(VisualizationElement):
     portrayal for each object. A portrayal is a JSON-ready dictionary which
     tells the relevant JavaScript code (GridDraw.js) where to draw what shape.
 
-    The render method returns a dictionary, keyed on layers, with values as
-    lists of portrayals to draw. Portrayals themselves are generated by the
-    user-provided portrayal_method, which accepts an object as an input and
-    produces a portrayal of it.
+    The render method returns the cells to draw as a dictionary
+    {"keyframe": bool, "cells": [[x, y, [portrayal, ...]], ...]}. A keyframe
+    holds every non-empty cell and replaces the whole canvas; it is sent for
+    the first frame of a model, so after a reset or a reconnect. The frames
+    in between only hold the cells whose portrayals changed since the last
+    frame, an empty list clearing the cell, and CanvasModule.js redraws just
+    those cells. Portrayals themselves are generated by the user-provided
+    portrayal_method, which accepts an object as an input and produces a
+    portrayal of it.
+
+    For large grids a packed frame can be sent instead: the user-provided
+    cell_state_method gives one byte per cell, an index into palette, and
+    render returns {"packed": base64 of the bytes}. The bytes are ordered as
+    the pixels of the canvas, top row first, and CanvasModule.js draws them
+    as one image of grid_width x grid_height pixels scaled to the canvas.
 
     A portrayal as a dictionary with the following structure:
         "x", "y": Coordinates for the cell in which the object is placed.
@@ -55,6 +70,11 @@ class CanvasGrid(VisualizationElement):
         grid_height, grid_width: Size of the grid to visualize, in cells.
         canvas_height, canvas_width: Size, in pixels, of the grid visualization
                                      to draw on the client.
+        delta: When False every frame is a keyframe.
+        cell_state_method: Function which gives the width x height uint8
+                           array of the state of every cell of a model,
+                           None to send portrayals.
+        palette: HTML colors of the cell states, used with cell_state_method.
         template: "canvas_module.html" stores the module's HTML template.
 
     """
@@ -69,6 +89,9 @@ class CanvasGrid(VisualizationElement):
         grid_height,
         canvas_width=500,
         canvas_height=500,
+        delta=True,
+        cell_state_method=None,
+        palette=None,
     ):
         """ Instantiate a new CanvasGrid.
 
@@ -78,6 +101,9 @@ class CanvasGrid(VisualizationElement):
             grid_width, grid_height: Size of the grid, in cells.
             canvas_height, canvas_width: Size of the canvas to draw in the
                                          client, in pixels. (default: 500x500)
+            delta: Send only the changed cells between keyframes.
+            cell_state_method, palette: Send packed frames of cell states
+                                        drawn in the palette colors.
 
         """
         self.portrayal_method = portrayal_method
@@ -85,23 +111,74 @@ class CanvasGrid(VisualizationElement):
         self.grid_height = grid_height
         self.canvas_width = canvas_width
         self.canvas_height = canvas_height
+        self.delta = delta
+        self.cell_state_method = cell_state_method
+        self.palette = palette
+
+        # Model and portrayals of every cell of the last frame sent
+        self.last_model = None
+        self.last_cells = None
 
-        new_element = "new CanvasModule({}, {}, {}, {})".format(
-            self.canvas_width, self.canvas_height, self.grid_width, self.grid_height
+        new_element = "new CanvasModule({}, {}, {}, {}, {})".format(
+            self.canvas_width, self.canvas_height, self.grid_width, self.grid_height,
+            json.dumps(palette)
         )
 
         self.js_code = "elements.push(" + new_element + ");"
 
+    def cell_portrayals(self, model):
+        """ Portray the objects of every cell, in one pass over the grid.
+
+        Returns: list of the portrayals of every cell, cell x * grid height + y
+
+        """
+        cells = []
+        for contents, x, y in model.grid.coord_iter():
+            if contents is None:
+                objects = ()
+            elif isinstance(contents, (list, set)):
+                objects = contents
+            else:
+                objects = (contents,)
+
+            portrayals = []
+            for obj in objects:
+                portrayal = self.portrayal_method(obj)
+                if portrayal:
+                    portrayal["x"] = x
+                    portrayal["y"] = y
+                    portrayals.append(portrayal)
+            cells.append(portrayals)
+        return cells
+
     def render(self, model):
-        grid_state = defaultdict(list)
-        for x in range(model.grid.width):
-            for y in range(model.grid.height):
-                cell_objects = model.grid.get_cell_list_contents([(x, y)])
-                for obj in cell_objects:
-                    portrayal = self.portrayal_method(obj)
-                    if portrayal:
-                        portrayal["x"] = x
-                        portrayal["y"] = y
-                        grid_state[portrayal["Layer"]].append(portrayal)
-
-        return grid_state
+        if self.cell_state_method is not None:
+            return self.render_packed(model)
+
+        cells = self.cell_portrayals(model)
+        height = model.grid.height
+
+        keyframe = (not self.delta or self.last_model is None or self.last_model() is not model
+                    or len(self.last_cells) != len(cells))
+        if keyframe:
+            changed = [[i // height, i % height, portrayals]
+                       for i, portrayals in enumerate(cells) if portrayals]
+        else:
+            changed = [[i // height, i % height, portrayals]
+                       for i, (portrayals, last) in enumerate(zip(cells, self.last_cells))
+                       if portrayals != last]
+
+        self.last_model = weakref.ref(model)
+        self.last_cells = cells
+        return {"keyframe": keyframe, "cells": changed}
+
+    def render_packed(self, model):
+        """ Pack the cell states of the model, one byte per cell.
+
+        Returns: dictionary with the base64 encoded bytes of the cells,
+                 canvas pixel order
+
+        """
+        states = np.asarray(self.cell_state_method(model), dtype=np.uint8)
+        pixels = np.ascontiguousarray(states.T[::-1])
+        return {"packed": base64.b64encode(pixels.tobytes()).decode("ascii")}
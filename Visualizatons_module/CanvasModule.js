@@ -1,4 +1,4 @@
-var CanvasModule = function(canvas_width, canvas_height, grid_width, grid_height) {
+var CanvasModule = function(canvas_width, canvas_height, grid_width, grid_height, palette) {
 	// Create the element
 	// ------------------
 
@@ -14,7 +14,7 @@ var CanvasModule = function(canvas_width, canvas_height, grid_width, grid_height
 	$("#elements").append(parent);
 	parent.append(canvas);
 	parent.append(interaction_canvas);
-	
+
 
 	// Create the context for the agents and interactions and the drawing controller:
 	var context = canvas.getContext("2d");
@@ -23,17 +23,137 @@ var CanvasModule = function(canvas_width, canvas_height, grid_width, grid_height
 	var interactionHandler = new InteractionHandler(canvas_width, canvas_height, grid_width, grid_height, interaction_canvas.getContext("2d"));
 	var canvasDraw = new GridVisualization(canvas_width, canvas_height, grid_width, grid_height, context, interactionHandler);
 
-	// Render canvas with updated data
-	this.render = function(data) {
+	// Same cell size as GridVisualization
+	var cellWidth = Math.floor(canvas_width / grid_width);
+	var cellHeight = Math.floor(canvas_height / grid_height);
+
+	// Portrayals drawn in every cell, keyed on "x,y"
+	var cells = {};
+
+	// Portrayals the tooltips point at, by index in the lookup table of the
+	// interaction handler. Delta frames append the portrayals of the changed
+	// cells, the ones they replace stay until the next rebuild
+	var tooltips = [];
+	var liveTooltips = 0;
+
+	// Draw one portrayal, with the y inversion of GridVisualization.drawLayer
+	var drawPortrayal = function(p) {
+		if (!Array.isArray(p.Color))
+			p.Color = [p.Color];
+		p.y = grid_height - p.y - 1;
+		if (!p.stroke_color)
+			p.stroke_color = p.Color[0];
+
+		if (p.Shape == "rect")
+			canvasDraw.drawRectangle(p.x, p.y, p.w, p.h, p.Color, p.stroke_color, p.Filled, p.text, p.text_color);
+		else if (p.Shape == "circle")
+			canvasDraw.drawCircle(p.x, p.y, p.r, p.Color, p.stroke_color, p.Filled, p.text, p.text_color);
+		else if (p.Shape == "arrowHead")
+			canvasDraw.drawArrowHead(p.x, p.y, p.heading_x, p.heading_y, p.scale, p.Color, p.stroke_color, p.Filled, p.text, p.text_color);
+		else
+			canvasDraw.drawCustomImage(p.Shape, p.x, p.y, p.scale, p.text, p.text_color);
+	};
+
+	// Point the tooltips at the portrayals of all cells
+	var rebuildInteractions = function() {
+		tooltips = [];
+		interactionHandler.mouseoverLookupTable.init();
+		for (var key in cells) {
+			cells[key].forEach(function(p) {
+				interactionHandler.mouseoverLookupTable.set(p.x, p.y, tooltips.length);
+				tooltips.push(p);
+			});
+		}
+		liveTooltips = tooltips.length;
+		interactionHandler.updateMouseListeners(tooltips);
+	};
+
+	// Point the tooltips of one cell at its new portrayals, drawn with y
+	// already inverted. The mouse listener reads the same tooltips array, so
+	// it does not need to be replaced
+	var updateInteractions = function(x, y, old_portrayals, portrayals) {
+		interactionHandler.mouseoverLookupTable.get(x, grid_height - y - 1).length = 0;
+		liveTooltips += portrayals.length - (old_portrayals ? old_portrayals.length : 0);
+		portrayals.forEach(function(p) {
+			interactionHandler.mouseoverLookupTable.set(p.x, p.y, tooltips.length);
+			tooltips.push(p);
+		});
+	};
+	rebuildInteractions();
+
+	// Packed frames are drawn as one pixel per cell on an offscreen canvas,
+	// then scaled to the grid area of the canvas
+	var image_canvas = document.createElement("canvas");
+	image_canvas.width = grid_width;
+	image_canvas.height = grid_height;
+	var image_context = image_canvas.getContext("2d");
+	var image = image_context.createImageData(grid_width, grid_height);
+
+	// RGBA of every cell state, as 32 bit pixels in the byte order of the platform
+	var pixel_bytes = new Uint8ClampedArray(4 * (palette ? palette.length : 0));
+	(palette || []).forEach(function(color, state) {
+		image_context.fillStyle = color;
+		image_context.fillRect(0, 0, 1, 1);
+		pixel_bytes.set(image_context.getImageData(0, 0, 1, 1).data, 4 * state);
+	});
+	var state_pixels = new Uint32Array(pixel_bytes.buffer);
+	var pixels = new Uint32Array(image.data.buffer);
+
+	var renderPacked = function(packed) {
+		var cell_states = atob(packed);
+		for (var i = 0; i < cell_states.length; i++)
+			pixels[i] = state_pixels[cell_states.charCodeAt(i)];
+		image_context.putImageData(image, 0, 0);
+
 		canvasDraw.resetCanvas();
-		for (var layer in data)
-			canvasDraw.drawLayer(data[layer]);
+		context.imageSmoothingEnabled = false;
+		// Grids with more cells than the canvas has pixels are shrunk to the canvas
+		context.drawImage(image_canvas, 0, 0,
+			cellWidth > 0 ? cellWidth * grid_width : canvas_width,
+			cellHeight > 0 ? cellHeight * grid_height : canvas_height);
+
+		// Cells have no portrayals to show as tooltips
+		cells = {};
+		rebuildInteractions();
+	};
+
+	// Render canvas with updated data: a packed frame replaces the whole image,
+	// a keyframe redraws everything, other frames only clear and redraw the
+	// cells that changed and update their tooltips
+	this.render = function(data) {
+		if (data.packed !== undefined) {
+			renderPacked(data.packed);
+			return;
+		}
+		if (data.keyframe) {
+			cells = {};
+			canvasDraw.resetCanvas();
+		}
+		data.cells.forEach(function(cell) {
+			var x = cell[0], y = cell[1], portrayals = cell[2];
+			var key = x + "," + y;
+			if (!data.keyframe)
+				context.clearRect(x * cellWidth, (grid_height - y - 1) * cellHeight, cellWidth, cellHeight);
+			portrayals.forEach(drawPortrayal);
+			if (!data.keyframe)
+				updateInteractions(x, y, cells[key], portrayals);
+			if (portrayals.length > 0)
+				cells[key] = portrayals;
+			else
+				delete cells[key];
+		});
 		canvasDraw.drawGridLines("#eee");
+		// Keyframes, and delta frames once the replaced portrayals outnumber
+		// the live ones, rebuild the tooltips from all cells
+		if (data.keyframe || tooltips.length > 2 * liveTooltips + 64)
+			rebuildInteractions();
 	};
 
 	// Reset canvas
 	this.reset = function() {
+		cells = {};
 		canvasDraw.resetCanvas();
+		rebuildInteractions();
 	};
 
 };
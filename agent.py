@@ -3,12 +3,25 @@ import numpy as np
 
 import enum
 
+"""Actions of the agents, an action is stored as its index in ACTIONS"""
+
+ACTIONS = ("Stay In", "Party", "Buy grocery", "Help elderly")
+STAY_IN = 0
+NO_ACTION = -1
+
+"""Tables shared by all agents, indexed by action"""
+
+ACTION_PAYOFF = (0.4, 0.7, 0.5, 0.5)
+ACTION_INFECTION_PROB = (0.1, 0.7, 0.5, 0.5)
+INITIAL_ACTION_PROB = (0.5, 0.5 / 3, 0.5 / 3, 0.5 / 3)
+
 
 class InfectionState(enum.IntEnum):
     """Infected states to keep track"""
     CLEAN = 0
     INFECTED = 1
     RECOVERED = 2
+    DEAD = 3
 
 
 class QuarantineState(enum.IntEnum):
@@ -18,7 +31,7 @@ class QuarantineState(enum.IntEnum):
 
 
 class MainAgent(Agent):
-    def __init__(self, unique_id, model, pos):
+    def __init__(self, unique_id, model, pos, action_prob=None):
         """Agent class which has all the parameters and functions
 
         Parameters:
@@ -26,8 +39,10 @@ class MainAgent(Agent):
             self.quarantinestate: indicates the state of quarantine of an agent
             self.aspiration: indicates the aspiration of an agent, initialized with global aspiration from the mainmodel
             self.habituation: indicates the habituation level of an agent
-            self.action_payoff: payoff for each action chosen by an agent
-            self.action_prob: probability of choosing an action, go out is divided into 3 sub actions
+            self.action_prob: probability of choosing each action in ACTIONS, go out is divided into 3 sub actions.
+                A float array of 4, action_prob when given: the row of the agent in the matrix of action
+                probabilities of the model
+            self.action: index in ACTIONS of the action done in the current step, NO_ACTION before the first step
 
         """
         super().__init__(unique_id, model)  # inherit the parent class
@@ -37,87 +52,34 @@ class MainAgent(Agent):
 
         self.aspiration = self.model.global_aspiration
         self.habituation = self.model.habituation
-        self.action_payoff = {
-            "Stay In": 0.4,
-            "Party": 0.7,
-            "Buy grocery": 0.5,
-            "Help elderly": 0.5
-        }
-
-        self.action_prob = {
-            "Stay In": 0.5,
-            "Party": 0.5 / 3,
-            "Buy grocery": 0.5 / 3,
-            "Help elderly": 0.5 / 3
-        }
-
-        self.stimulus = list()
-        self.action_done = list()
-
-    def action_picker(self):
-        """Agent chooses an action to do in the current step of the simulation and appends it
-        to the list of action done.
-        """
-
-        if self.model.lockdown==True:
-            action_probability_stayin_t0 = self.action_prob['Stay In']
-
-            # Add effect of government stringent to the action probabilities
-            action_probability_stayin_t1 = self.action_prob['Stay In'] + (
-                self.model.government_stringent / 100)
-
-            action_probability_adjust = (
-                action_probability_stayin_t1 - action_probability_stayin_t0) / 3
-
-            probability_error = False  # Check that there is no probability goes below 0
-
-            for key in list(self.action_prob.keys()):
-                if key != 'Stay In':
-                    if ((self.action_prob[key] -
-                         action_probability_adjust) < 0):
-                        probability_error = True
-                        break
 
-            if probability_error is False:
-                self.action_prob['Stay In'] = self.action_prob['Stay In'] + \
-                    (self.model.government_stringent / 100)
-                for key in list(self.action_prob.keys()):
-                    if key != 'Stay In':
-                        self.action_prob[key] = self.action_prob[key] - \
-                            action_probability_adjust
-
-        if (self.quarantinestate == QuarantineState.QUARANTINE):
-            action = "Stay In"
-        else:
-            action = np.random.choice(  # Agent picks an action to perform.
-                list(
-                    self.action_prob.keys()), p=list(
-                    self.action_prob.values()))
-
-        # Append the action chosen by the agent
-        self.action_done.append(action)
+        self.action_prob = np.array(INITIAL_ACTION_PROB) if action_prob is None else action_prob
+        self.action = NO_ACTION
 
     def action_outcome_spread(self):
-        """Agent spreads the virus depending on the state of himself and his neighbours
+        """Agent gets infected by each of his infected neighbours with the infection probability
+        of his action. Only susceptible agents in the frontier of the model have infected neighbours.
         """
 
-        possible_spread_list = self.model.grid.get_neighborhood(
-            self.pos, moore=True, include_center=False)
-
-        for neighbour in possible_spread_list:
-            if ((self.model.grid.is_cell_empty(neighbour) is False) and (
-                    self.model.grid.get_cell_list_contents(neighbour)[0].infectionstate == InfectionState.INFECTED)):
-                action_performed = self.action_done[-1]
-
-                if (self.random.random() <= self.model.action_infection_prob[action_performed] and
-                        (self.infectionstate == InfectionState.CLEAN)):
-                    self.infectionstate = InfectionState.INFECTED
-                    self.infected_time = self.model.schedule.time
-
-                    # A fraction of agents choose to self quarantine on being
-                    # infected
-                    if (self.random.random() <= self.model.quarantine_prob):
-                        self.quarantinestate = QuarantineState.QUARANTINE
+        if self.unique_id not in self.model.frontier:
+            return
+
+        infected_neighbours = int(self.model.infection_pressure[self.pos])
+        for _ in range(infected_neighbours):
+            if self.random.random() <= self.model.action_infection_prob[self.action]:
+                self.infectionstate = InfectionState.INFECTED
+                self.infected_time = self.model.schedule.time
+                self.model.count_transition(InfectionState.CLEAN, InfectionState.INFECTED)
+                self.model.progression.add(self.infected_time, (self.unique_id,))
+                self.model.log_transition("infectionstate", self.unique_id, InfectionState.INFECTED)
+                self.model.infect(self)
+
+                # A fraction of agents choose to self quarantine on being
+                # infected
+                if (self.random.random() <= self.model.quarantine_prob):
+                    self.quarantinestate = QuarantineState.QUARANTINE
+                    self.model.log_transition("quarantinestate", self.unique_id, QuarantineState.QUARANTINE)
+                break
 
     def social_dilemma_influence(self):
         """Updation of aspiration for the agent based on his
@@ -127,13 +89,13 @@ class MainAgent(Agent):
         if self.model.lockdown == True:
 
 	        payoff = 0
-	        action_performed = self.action_done[-1]
+	        action_performed = self.action
 
 	        if (self.infectionstate == InfectionState.INFECTED and self.model.schedule.time -
 	                self.infected_time == 0):  # Agent recieves no payoff on being infected.
 	            payoff = 0
 	        else:
-	            payoff = self.action_payoff[action_performed]
+	            payoff = ACTION_PAYOFF[action_performed]
 	        stimulus = payoff - self.aspiration
 
 	        if (stimulus < 0 and self.infectionstate != InfectionState.INFECTED):
@@ -163,8 +125,7 @@ class MainAgent(Agent):
 	                action_probability_t1 - action_probability_t0) / (self.model.action_count - 1)
 
 	            probability_error = False
-	            for key in list(self.action_prob.keys(
-	            )):  # Ensure the probability for actions are never negative
+	            for key in range(len(ACTIONS)):  # Ensure the probability for actions are never negative
 	                if (key != action_performed):
 	                    if ((self.action_prob[key] - probability_adjust) < 0):
 	                        probability_error = True
@@ -172,7 +133,7 @@ class MainAgent(Agent):
 
 	            if (probability_error is False):
 	                self.action_prob[action_performed] = action_probability_t1
-	                for key in list(self.action_prob.keys()):
+	                for key in range(len(ACTIONS)):
 	                    if (key != action_performed):
 	                        self.action_prob[key] = (
 	                            self.action_prob[key] - probability_adjust)
@@ -181,49 +142,39 @@ class MainAgent(Agent):
         """If the agent is not staying in, move to an empty cell
         """
 
-        if (self.action_done[-1] != "Stay In"):
-            self.model.grid.move_to_empty(self)
+        if (self.action != STAY_IN):
+            self.model.move_to_empty(self)
 
-    def update_status(self):
-        """Update agents from:
-        infected -> quarantine,
-        infected/quarantine -> dead,
-        infected -> recover,
-        quarantine -> free
+    def die(self):
+        """The agent dies of the virus and leaves the simulation, called by the model
+        when a death trial of the infected agent succeeds
         """
-
-        if ((self.infectionstate == InfectionState.INFECTED) and
-                ((self.model.schedule.time - self.infected_time) > self.model.recovery_days * 0.666) and
-                ((self.model.schedule.time - self.infected_time) < self.model.recovery_days)):
-
-            if (np.random.choice([0, 1], p=[
-                    1 - self.model.death_rate, self.model.death_rate]) == 1):
-                self.model.grid.remove_agent(self)
-                self.model.schedule.remove(self)
-                self.model.dead_agents_number = self.model.dead_agents_number + 1
-        elif (self.model.recovery_days < (self.model.schedule.time - self.infected_time)
-              and self.infectionstate == InfectionState.INFECTED):
-            self.infectionstate = InfectionState.RECOVERED
-            self.quarantinestate = QuarantineState.FREE
-        else:
-            pass
+        self.model.remove_agent(self)
+        self.model.dead_agents_number = self.model.dead_agents_number + 1
+        self.model.count_transition(InfectionState.INFECTED, InfectionState.DEAD)
+        self.model.uncount_action(self.action == STAY_IN)
+
+    def recover(self):
+        """The agent recovers from the virus and leaves quarantine, called by the model
+        at the end of the infection
+        """
+        self.infectionstate = InfectionState.RECOVERED
+        self.quarantinestate = QuarantineState.FREE
+        self.model.count_transition(InfectionState.INFECTED, InfectionState.RECOVERED)
+        self.model.update_pressure(self.pos, -1)
 
     def randomizer(self):
         """Set equal probabilities of performaing an action to make agent pick
         a different action to avaoid SCE
         """
-        for key in self.action_prob.keys():
-            if (key == self.action_done[-1]):
-                self.action_prob[key] = 0.1
-            else:
-                self.action_prob[key] = 0.3
+        self.action_prob[:] = 0.3
+        self.action_prob[self.action] = 0.1
 
     def step(self):
-        self.action_picker()
+        """The action of the agent for this step has already been picked by
+        MainModel.pick_actions for the whole population, and its death or recovery
+        is handled by MainModel.update_status after all agents have stepped
+        """
         self.move()
         self.action_outcome_spread()
         self.social_dilemma_influence()
-        self.update_status()
-
-        self.model.dilemma_list.append(
-            [int(self.model.schedule.time), self.action_done[-1]])
@@ -0,0 +1,478 @@
+import argparse
+import json
+import os
+import time
+import tracemalloc
+
+import numpy as np
+from mesa.datacollection import DataCollector
+from mesa.space import SingleGrid
+from mesa.time import RandomActivation
+
+from agent import MainAgent, STAY_IN
+import checkpoint
+from collector import ColumnarDataCollector
+from model import MainModel, InfectionState
+from progression import ProgressionWheel
+from vectorized import moore_neighbour_count
+
+"""Benchmarks of the simulation engines. Run with
+
+    python benchmark.py --sizes 40 200 1000 --steps 5
+
+The agent loop at 1000x1000 creates several hundred thousand MainAgent objects,
+expect it to take minutes per step.
+"""
+
+model_params = {
+    "population_density": 0.5,
+    "death_rate": 0.02,
+    "transfer_rate": 0.3,
+    "initial_infection_rate": 0.02,
+    "government_stringent": 0.5,
+    "government_action_threshold": 0.3,
+    "global_aspiration": 0.3,
+}
+
+
+def benchmark_engine(engine, size, steps):
+    """Time the construction and the steps of one model
+
+    Returns: dictionary with the setup time, the time per step and the agent steps per second
+    """
+    start = time.perf_counter()
+    model = MainModel(width=size, height=size, engine=engine, **model_params)
+    setup_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(steps):
+        model.step()
+    step_time = (time.perf_counter() - start) / steps
+
+    return {
+        "engine": engine,
+        "size": size,
+        "agents": model.total_population,
+        "setup": setup_time,
+        "step": step_time,
+        "agent_steps_per_second": model.total_population / step_time,
+    }
+
+
+def benchmark_engines(sizes=(40, 200, 1000), steps=5, engines=("agent", "vectorized")):
+    """Benchmark every engine for every grid size and print the results
+
+    Returns: list of result dictionaries
+    """
+    results = []
+    print("{:>12} {:>6} {:>9} {:>10} {:>12} {:>18}".format(
+        "engine", "size", "agents", "setup (s)", "step (s)", "agent steps/s"))
+    for size in sizes:
+        for engine in engines:
+            result = benchmark_engine(engine, size, steps)
+            results.append(result)
+            print("{engine:>12} {size:>6} {agents:>9} {setup:>10.3f} {step:>12.4f} {agent_steps_per_second:>18.0f}".format(
+                **result))
+    return results
+
+
+def benchmark_spread_kernel(sizes=(1000, 2000), infected_share=0.1, repeats=10):
+    """Time the infected Moore neighbour count of the vectorized engine on large grids
+
+    Returns: list of (size, seconds per call) tuples
+    """
+    results = []
+    for size in sizes:
+        infected = np.random.random((size, size)) < infected_share
+        start = time.perf_counter()
+        for _ in range(repeats):
+            moore_neighbour_count(infected)
+        seconds = (time.perf_counter() - start) / repeats
+        results.append((size, seconds))
+        print("spread kernel {0}x{0}: {1:.4f} s per step".format(size, seconds))
+    return results
+
+
+def legacy_model_reporters():
+    """Model reporters as they were before the counters and the fused aggregation,
+    each of them walking schedule.agents on its own. Used as baseline only.
+    """
+    def count_state(state):
+        return lambda m: len([a for a in m.schedule.agents if a.infectionstate == state])
+
+    def count_action(stay_in):
+        return lambda m: len([a for a in m.schedule.agents if (a.action == STAY_IN) == stay_in])
+
+    def aspiration(m):
+        return sum([a.aspiration for a in m.schedule.agents])
+
+    def stay_in(m):
+        return sum([a.action_prob[0] for a in m.schedule.agents]) / (len(m.schedule.agents) - 1)
+
+    def go_out(m):
+        return sum([a.action_prob[1] + a.action_prob[3] + a.action_prob[2]
+                    for a in m.schedule.agents]) / (len(m.schedule.agents) - 1)
+
+    return {
+        "Infected": count_state(InfectionState.INFECTED),
+        "Recovered": count_state(InfectionState.RECOVERED),
+        "Dead": lambda m: m.dead_agents_number,
+        "Stay In": count_action(True),
+        "Go Out": count_action(False),
+        "Susceptible": count_state(InfectionState.CLEAN),
+        "Aspiration": aspiration,
+        "Average Aspiration": aspiration,
+        "Average Stay In": stay_in,
+        "Average Get Out": go_out,
+    }
+
+
+def benchmark_collection(size=200, repeats=10, engines=("agent", "vectorized")):
+    """Time the model level data collection of one step, with one reporter pass per
+    reporter (before) and with the fused population metrics (after)
+
+    Returns: list of (engine, agents, seconds before, seconds after) tuples
+    """
+    results = []
+    for engine in engines:
+        model = MainModel(width=size, height=size, engine=engine, **model_params)
+
+        # Pick the actions of one step, so that every reporter has something to count
+        if engine == "agent":
+            model.pick_actions()
+        else:
+            model.engine.action_picker()
+
+        before = None
+        if engine == "agent":
+            legacy = DataCollector(model_reporters=legacy_model_reporters())
+            start = time.perf_counter()
+            for _ in range(repeats):
+                legacy.collect(model)
+            before = (time.perf_counter() - start) / repeats
+
+        collector = ColumnarDataCollector(model.datacollector.model_reporters)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            model.population_metrics_step = None
+            collector.collect(model)
+        after = (time.perf_counter() - start) / repeats
+
+        results.append((engine, model.total_population, before, after))
+        print("collection {} ({} agents): before {} s, after {:.5f} s per step".format(
+            engine, model.total_population, "-" if before is None else "{:.5f}".format(before), after))
+    return results
+
+
+def benchmark_collector_memory(size=40, steps=1000, engine="agent"):
+    """Measure the memory taken by the collected data, with the mesa DataCollector keeping
+    the agent reporters at every step (before) and with the ColumnarDataCollector without
+    agent reporters, with them every 10 steps and for a sample of 100 agents at every step
+
+    Returns: list of (collector, agents, bytes per 1000 steps) tuples
+    """
+    model = MainModel(width=size, height=size, engine=engine, seed=0, **model_params)
+    model_reporters = model.datacollector.model_reporters
+    agent_reporters = model.datacollector.agent_reporters
+    collectors = [
+        ("mesa, all agents every step", lambda: DataCollector(model_reporters, agent_reporters)),
+        ("columnar, no agents", lambda: ColumnarDataCollector(model_reporters, agent_reporters)),
+        ("columnar, all agents every 10 steps",
+         lambda: ColumnarDataCollector(model_reporters, agent_reporters, agent_every=10)),
+        ("columnar, 100 agents every step",
+         lambda: ColumnarDataCollector(model_reporters, agent_reporters, agent_every=1, agent_sample=100)),
+    ]
+
+    results = []
+    print("{:>36} {:>8} {:>18}".format("collector", "agents", "bytes/1000 steps"))
+    for name, create in collectors:
+        if engine != "agent" and name.startswith("mesa"):
+            continue
+        tracemalloc.start()
+        collector = create()
+        for step in range(steps):
+            model.schedule.steps = step
+            collector.collect(model)
+        used = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del collector
+
+        result = (name, model.total_population, used * 1000 // steps)
+        results.append(result)
+        print("{:>36} {:>8} {:>18}".format(*result))
+    return results
+
+
+def legacy_create_agents(model):
+    """Agent creation of the agent engine before the array draws: one random draw per cell,
+    one np.random.choice per agent, and position_agent, which got the cell as its x argument
+    and so placed every agent on a random cell drawn from the sorted empty cells. Used as
+    baseline only.
+
+    Returns: number of agents created
+    """
+    model.grid = SingleGrid(model.width, model.height, True)
+    model.schedule = RandomActivation(model)
+    i = 0
+    for cell in model.grid.coord_iter():
+        x, y = cell[1], cell[2]
+        if model.random.random() < model.population_density:
+            agent = MainAgent(i, model, (x, y))
+            if (np.random.choice([0, 1], p=[
+                    1 - model.initial_infection_rate, model.initial_infection_rate])) == 1:
+                agent.infectionstate = InfectionState.INFECTED
+            model.grid.position_agent(agent, (x, y))
+            model.schedule.add(agent)
+            i = i + 1
+    return i
+
+
+def benchmark_startup(sizes=(100, 500, 1000, 2000), engines=("agent", "vectorized"), legacy_max=100):
+    """Time the construction of a model, and for the agent engine the creation of the agents
+    with the per cell loop (before, up to legacy_max only as it grows with the square of the
+    agents) and with the array draws (after)
+
+    Returns: list of (engine, size, agents, seconds to construct, seconds to create the agents
+            before, seconds after) tuples
+    """
+    results = []
+    print("{:>10} {:>6} {:>9} {:>14} {:>12} {:>12}".format(
+        "engine", "size", "agents", "construct (s)", "before (s)", "after (s)"))
+    for size in sizes:
+        for engine in engines:
+            start = time.perf_counter()
+            model = MainModel(width=size, height=size, engine=engine, seed=0, **model_params)
+            construct = time.perf_counter() - start
+
+            before = after = None
+            if engine == "agent":
+                model.grid = SingleGrid(size, size, True)
+                model.schedule = RandomActivation(model)
+                model.progression = ProgressionWheel(model.recovery_days)
+                start = time.perf_counter()
+                model.create_agents()
+                after = time.perf_counter() - start
+                if size <= legacy_max:
+                    start = time.perf_counter()
+                    legacy_create_agents(model)
+                    before = time.perf_counter() - start
+            elif engine == "tiled":
+                model.engine.close()
+
+            result = (engine, size, model.total_population, construct, before, after)
+            results.append(result)
+            print("{:>10} {:>6} {:>9} {:>14.3f} {:>12} {:>12}".format(
+                engine, size, model.total_population, construct,
+                "-" if before is None else "{:.3f}".format(before), "-" if after is None else "{:.3f}".format(after)))
+    return results
+
+
+def benchmark_checkpoint(size=200, steps=5, engines=("agent", "vectorized"), path="benchmark_checkpoint.npz"):
+    """Time the checkpoint and the restore of a model after some steps, next to the time of one step
+
+    Returns: list of (engine, agents, seconds per step, seconds to save, seconds the model waits
+            for a background save, seconds to load, file size) tuples
+    """
+    results = []
+    for engine in engines:
+        model = MainModel(width=size, height=size, engine=engine, **model_params)
+        start = time.perf_counter()
+        for _ in range(steps):
+            model.step()
+        step_time = (time.perf_counter() - start) / steps
+
+        start = time.perf_counter()
+        checkpoint.save(model, path)
+        save_time = time.perf_counter() - start
+        start = time.perf_counter()
+        writer = checkpoint.save(model, path, background=True)
+        background_time = time.perf_counter() - start
+        writer.join()
+
+        start = time.perf_counter()
+        checkpoint.load(path)
+        load_time = time.perf_counter() - start
+        file_size = os.path.getsize(path)
+        os.remove(path)
+
+        results.append((engine, model.total_population, step_time, save_time, background_time, load_time, file_size))
+        print("checkpoint {} ({} agents, {} steps): step {:.4f} s, save {:.4f} s, background save {:.4f} s, "
+              "load {:.4f} s, {:.0f} kB".format(engine, model.total_population, steps, step_time, save_time,
+                                               background_time, load_time, file_size / 1000))
+    return results
+
+
+def legacy_spread_scan(model):
+    """Infected neighbour search of the spread phase before the frontier: every agent
+    scans its Moore neighbourhood (agent engine), or the whole grid is convolved
+    (vectorized engine). The infection trials are left out. Used as baseline only.
+    """
+    if model.engine is None:
+        exposed = 0
+        for a in model.schedule.agents:
+            for neighbour in model.grid.get_neighborhood(a.pos, moore=True, include_center=False):
+                if ((model.grid.is_cell_empty(neighbour) is False) and (
+                        model.grid.get_cell_list_contents(neighbour)[0].infectionstate == InfectionState.INFECTED)):
+                    exposed = exposed + 1
+        return exposed
+
+    engine = model.engine
+    infected_grid = np.zeros((engine.width, engine.height), dtype=bool)
+    infected = engine.alive & (engine.infection == InfectionState.INFECTED)
+    infected_grid[engine.x[infected], engine.y[infected]] = True
+    pressure = moore_neighbour_count(infected_grid)
+    susceptible = np.flatnonzero(engine.alive & (engine.infection == InfectionState.CLEAN))
+    return int(np.count_nonzero(pressure[engine.x[susceptible], engine.y[susceptible]]))
+
+
+def frontier_spread_scan(model):
+    """Infected neighbour search of the spread phase with the frontier
+    """
+    if model.engine is None:
+        exposed = 0
+        for a in model.schedule.agents:
+            if a.unique_id in model.frontier:
+                exposed = exposed + int(model.infection_pressure[a.pos])
+        return exposed
+    return model.engine.frontier.agents().size
+
+
+def benchmark_frontier(size=200, engine="agent", max_steps=60, initial_infection_rate=0.001):
+    """Time the infected neighbour search of the spread phase with and without the frontier
+    at every step of one epidemic, started from few infected agents so that the early and
+    the late phase have a small frontier
+
+    Returns: list of (step, infected, frontier, seconds before, seconds after) tuples
+    """
+    params = dict(model_params, initial_infection_rate=initial_infection_rate)
+    model = MainModel(width=size, height=size, engine=engine, frontier_data=True, **params)
+
+    results = []
+    print("{:>6} {:>9} {:>9} {:>12} {:>12}".format("step", "infected", "frontier", "before (s)", "after (s)"))
+    while model.running and model.schedule.steps < max_steps:
+        start = time.perf_counter()
+        legacy_spread_scan(model)
+        before = time.perf_counter() - start
+        start = time.perf_counter()
+        frontier_spread_scan(model)
+        after = time.perf_counter() - start
+
+        result = (model.schedule.steps, model.get_infection_number(), model.get_frontier_size(), before, after)
+        results.append(result)
+        print("{:>6} {:>9} {:>9} {:>12.5f} {:>12.5f}".format(*result))
+        model.step()
+    return results
+
+
+def benchmark_tiled(size=5000, steps=5, tiles=(1, 2, 4, 8)):
+    """Time the steps of the tiled engine for every number of tiles against the vectorized
+    engine on the same grid, with the reporters of the last step to compare them
+
+    Returns: list of (engine, tiles, setup seconds, seconds per step, infected, recovered, dead) tuples
+    """
+    results = []
+    print("{:>12} {:>6} {:>10} {:>10} {:>10} {:>10} {:>8}".format(
+        "engine", "tiles", "setup (s)", "step (s)", "infected", "recovered", "dead"))
+    for engine, engine_tiles in [("vectorized", None)] + [("tiled", number) for number in tiles]:
+        start = time.perf_counter()
+        model = MainModel(width=size, height=size, engine=engine, tiles=engine_tiles, seed=0, **model_params)
+        setup_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(steps):
+            model.step()
+        step_time = (time.perf_counter() - start) / steps
+
+        result = (engine, engine_tiles or 1, setup_time, step_time, model.get_infection_number(),
+                  model.get_recovered_number(), model.get_dead_number())
+        results.append(result)
+        print("{:>12} {:>6} {:>10.2f} {:>10.3f} {:>10} {:>10} {:>8}".format(*result))
+        if engine == "tiled":
+            model.engine.close()
+        del model
+    return results
+
+
+def benchmark_canvas(size=500, steps=5, engine="vectorized"):
+    """Time the rendering of the grid view and measure the JSON payload of a frame, with
+    every cell portrayed, with only the changed cells, and packed as one byte per cell
+
+    Returns: list of (format, seconds per frame, bytes per frame) tuples
+    """
+    from server import draw, cell_states, cell_palette
+    from Visualizatons_module.CanvasGridVisualization import CanvasGrid
+
+    formats = [
+        ("portrayals", CanvasGrid(draw, size, size, delta=False)),
+        ("delta", CanvasGrid(draw, size, size)),
+        ("packed", CanvasGrid(draw, size, size, cell_state_method=cell_states, palette=cell_palette)),
+    ]
+    model = MainModel(width=size, height=size, engine=engine, seed=0, **model_params)
+    seconds = {name: 0.0 for name, canvas in formats}
+    payload = {name: 0 for name, canvas in formats}
+    for _ in range(steps):
+        model.step()
+        for name, canvas in formats:
+            start = time.perf_counter()
+            frame = json.dumps(canvas.render(model))
+            seconds[name] += time.perf_counter() - start
+            payload[name] += len(frame)
+
+    results = []
+    print("{:>12} {:>6} {:>12} {:>14}".format("format", "size", "render (s)", "bytes/frame"))
+    for name, canvas in formats:
+        result = (name, seconds[name] / steps, payload[name] // steps)
+        results.append(result)
+        print("{:>12} {:>6} {:>12.4f} {:>14}".format(name, size, result[1], result[2]))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the simulation engines")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[40, 200, 1000])
+    parser.add_argument("--steps", type=int, default=5)
+    parser.add_argument("--engines", nargs="+", default=["agent", "vectorized"])
+    parser.add_argument("--spread", action="store_true", help="benchmark the spread kernel instead of the engines")
+    parser.add_argument("--collection", action="store_true",
+                        help="benchmark the data collection of one step instead of the engines")
+    parser.add_argument("--startup", action="store_true",
+                        help="benchmark the construction of the models instead of their steps")
+    parser.add_argument("--collector-memory", action="store_true",
+                        help="measure the memory of the collected data over --steps steps instead of the engines")
+    parser.add_argument("--checkpoint", action="store_true",
+                        help="benchmark saving and restoring a checkpoint instead of the engines")
+    parser.add_argument("--frontier", action="store_true",
+                        help="benchmark the infected neighbour search of the spread phase over one epidemic")
+    parser.add_argument("--canvas", action="store_true",
+                        help="benchmark the rendering and the payload of the grid view instead of the engines")
+    parser.add_argument("--tiled", action="store_true",
+                        help="benchmark the tiled engine for the numbers of tiles of --tiles instead of the engines")
+    parser.add_argument("--tiles", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    if args.spread:
+        benchmark_spread_kernel(args.sizes)
+    elif args.collection:
+        for size in args.sizes:
+            benchmark_collection(size, engines=args.engines)
+    elif args.startup:
+        benchmark_startup(args.sizes, args.engines)
+    elif args.collector_memory:
+        for size in args.sizes:
+            benchmark_collector_memory(size, args.steps, args.engines[0])
+    elif args.frontier:
+        for size in args.sizes:
+            for engine in args.engines:
+                print("frontier {} {}x{}".format(engine, size, size))
+                benchmark_frontier(size, engine, max_steps=max(args.steps, 60))
+    elif args.canvas:
+        for size in args.sizes:
+            benchmark_canvas(size, args.steps, args.engines[-1])
+    elif args.tiled:
+        for size in args.sizes:
+            benchmark_tiled(size, args.steps, args.tiles)
+    elif args.checkpoint:
+        for size in args.sizes:
+            benchmark_checkpoint(size, args.steps, engines=args.engines)
+    else:
+        benchmark_engines(args.sizes, args.steps, args.engines)
@@ -0,0 +1,133 @@
+import numpy as np
+
+"""Pool of the empty cells of the grid, with constant time pick, claim and release"""
+
+
+class EmptyCellPool:
+    def __init__(self, width, height, occupied):
+        """Indexed set of the empty cells of a width x height grid. Cells are stored
+        as flat indices x * height + y in a dense array, and every cell knows its
+        position in the dense array, so a cell is removed by swapping it with the last one.
+
+        Parameters:
+            self.cells: dense array, the first self.size entries are the empty cells
+            self.index: position of every cell in self.cells, -1 for occupied cells
+            occupied: width x height boolean array of the cells holding an agent
+        """
+        self.width = width
+        self.height = height
+        self.cells = np.flatnonzero(~np.asarray(occupied, dtype=bool).reshape(-1))
+        self.size = self.cells.size
+        self.cells = np.concatenate(
+            [self.cells, np.zeros(width * height - self.size, dtype=self.cells.dtype)])
+        self.index = np.full(width * height, -1, dtype=np.int64)
+        self.index[self.cells[:self.size]] = np.arange(self.size)
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, pos):
+        return self.index[pos[0] * self.height + pos[1]] != -1
+
+    def release(self, pos):
+        """Add the cell at pos to the pool
+        """
+        cell = pos[0] * self.height + pos[1]
+        self.cells[self.size] = cell
+        self.index[cell] = self.size
+        self.size = self.size + 1
+
+    def restore(self, cells):
+        """Make the pool hold exactly the given flat cell indices, in that order
+        """
+        self.size = cells.size
+        self.cells[:self.size] = cells
+        self.index[:] = -1
+        self.index[cells] = np.arange(self.size)
+
+    def claim(self, pos):
+        """Remove the cell at pos from the pool
+        """
+        self._remove_at(self.index[pos[0] * self.height + pos[1]])
+
+    def claim_random(self, random):
+        """Pick a random empty cell with the given random.Random and remove it from the pool
+
+        Returns: (x, y) of the claimed cell
+        """
+        if self.size == 0:
+            raise Exception("ERROR: No empty cells")
+        position = random.randrange(self.size)
+        cell = int(self.cells[position])
+        self._remove_at(position)
+        return divmod(cell, self.height)
+
+    def _remove_at(self, position):
+        last = self.cells[self.size - 1]
+        cell = self.cells[position]
+        self.cells[position] = last
+        self.index[last] = position
+        self.index[cell] = -1
+        self.size = self.size - 1
+
+    def release_many(self, cells):
+        """Add the given flat cell indices to the pool
+        """
+        end = self.size + cells.size
+        self.cells[self.size:end] = cells
+        self.index[cells] = np.arange(self.size, end)
+        self.size = end
+
+    def claim_random_many(self, number, generator):
+        """Pick number distinct random empty cells with the given np.random.Generator and remove them from the pool
+
+        Returns: flat cell indices of the claimed cells, in random order
+        """
+        if number > self.size:
+            raise Exception("ERROR: No empty cells")
+        positions = sample_distinct(self.size, number, generator)
+        claimed = self.cells[positions]
+
+        # Fill the holes left below the new size with the cells above it that stay in the pool
+        new_size = self.size - number
+        tail = np.arange(new_size, self.size)
+        fillers = tail[~np.isin(tail, positions)]
+        holes = positions[positions < new_size]
+        self.cells[holes] = self.cells[fillers]
+        self.index[self.cells[holes]] = holes
+        self.index[claimed] = -1
+        self.size = new_size
+        return claimed
+
+    def relocate(self, cells, generator):
+        """Move the agents standing on the given flat cell indices to distinct random
+        empty cells. New cells are claimed before the old ones are released, as with
+        one move_to_empty after the other, unless there are not enough empty cells.
+
+        Returns: flat cell indices of the new cells, in the order of cells
+        """
+        if cells.size <= self.size:
+            claimed = self.claim_random_many(cells.size, generator)
+            self.release_many(cells)
+        else:
+            self.release_many(cells)
+            claimed = self.claim_random_many(cells.size, generator)
+        return claimed
+
+
+def sample_distinct(population, number, generator):
+    """Draw number distinct integers from range(population) with generator, uniformly
+    over all subsets and in random order. Small samples are drawn with replacement and
+    topped up until they are distinct, large ones come from a permutation.
+
+    Returns: int64 array of length number
+    """
+    if number * 10 > population:
+        return generator.permutation(population)[:number]
+
+    selected = np.unique(generator.integers(0, population, number))
+    while selected.size < number:
+        extra = generator.integers(0, population, number - selected.size)
+        selected = np.union1d(selected, extra)
+    generator.shuffle(selected)
+    return selected
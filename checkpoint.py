@@ -0,0 +1,268 @@
+import json
+import os
+import random
+import threading
+
+import numpy as np
+
+from agent import MainAgent, InfectionState, QuarantineState
+from history import ActionHistory
+from model import MainModel
+from vectorized import EMPTY
+
+"""Checkpoints of a MainModel. The whole state of a model (parameters, counters, agents,
+grid, empty cell pool, infection timer wheel, action history, collected data and the states
+of model.random and model.generator) is written as arrays to one uncompressed .npz file,
+and a model restored from it continues exactly as the original would have. The file is written under a temporary
+name and renamed, so a crash while saving keeps the previous checkpoint.
+"""
+
+"""Constructor parameters of MainModel kept in a checkpoint"""
+PARAMETERS = ("population_density", "death_rate", "transfer_rate", "initial_infection_rate",
+              "width", "height", "government_stringent", "government_action_threshold",
+              "global_aspiration", "recovery_days", "habituation", "learning_rate")
+
+"""Scalar attributes of the model, the last ones only exist on some subclasses"""
+SCALARS = ("dead_agents_number", "stay_in_count", "go_out_count", "lockdown", "running",
+           "step_counter", "total_population")
+OPTIONAL_SCALARS = ("save_results",)
+
+GRAPH_LISTS = ("stay_in_list", "stay_out_list", "steps_list", "aspiration_list", "infection_list")
+
+"""Arrays of the VectorizedEngine, its occupancy grid is rebuilt from them"""
+ENGINE_ARRAYS = ("x", "y", "infection", "quarantine", "infected_time", "aspiration",
+                 "action_prob", "action", "alive")
+
+
+def save(model, path, background=False):
+    """Write the state of model to the file at path. With background the state is copied
+    and the file is written by a separate thread while the model goes on. Only then does
+    the save hold the model for the copy alone, well under a step; without background
+    it also waits for the file, which can take longer than a step on a slow disk.
+
+    Returns: the writing thread when background, else None
+    """
+    state = snapshot(model)
+    if not background:
+        write(state, path)
+        return None
+    thread = threading.Thread(target=write, args=(state, path))
+    thread.start()
+    return thread
+
+
+def write(state, path):
+    """Write the arrays of a snapshot to the file at path
+    """
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as file:
+        np.savez(file, **state)
+    os.replace(temporary, path)
+
+
+def snapshot(model):
+    """Copy the state of model into arrays
+
+    Returns: dictionary of array name to array
+    """
+    engine = "agent" if model.engine is None else model.engine.name
+    if engine == "tiled":
+        raise ValueError("Checkpoints of the tiled engine are not supported, the empty cells live in its workers")
+    if model.transition_log is not None:
+        raise ValueError("Checkpoints of a model with a transition log are not supported, the log is not saved")
+
+    state = {}
+    for name in PARAMETERS + SCALARS:
+        state["param_" + name] = np.asarray(getattr(model, name))
+    for name in OPTIONAL_SCALARS:
+        if hasattr(model, name):
+            state["param_" + name] = np.asarray(getattr(model, name))
+    state["engine"] = np.asarray(engine)
+    state["infection_counts"] = np.asarray(model.infection_counts, dtype=np.int64)
+    state["schedule"] = np.asarray([model.schedule.steps, model.schedule.time])
+    for name in GRAPH_LISTS:
+        state["graph_" + name] = np.asarray(getattr(model, name), dtype=np.float64)
+
+    version, mt_state, gauss = model.random.getstate()
+    state["random_version"] = np.asarray(version)
+    state["random_state"] = np.asarray(mt_state, dtype=np.uint32)
+    state["random_gauss"] = np.asarray(np.nan if gauss is None else gauss)
+    state["generator_state"] = np.asarray(json.dumps(model.generator.bit_generator.state))
+
+    pool = model.empty_cells if model.engine is None else model.engine.empty_cells
+    state["empty_cells"] = pool.cells[:pool.size].astype(np.int32)
+
+    state["progression_agents"], state["progression_lengths"] = model.progression.scheduled()
+
+    history = model.action_history
+    state["history_depth"] = np.asarray(-1 if history.depth is None else history.depth)
+    state["history_steps"] = np.asarray(history.steps)
+    state["history_counts"] = history.counts[:history.steps].copy()
+    if history.actions is not None:
+        state["history_actions"] = history.actions.copy()
+
+    if model.engine is None:
+        agents = sorted(model.schedule.agents, key=lambda a: a.unique_id)
+        state["agent_unique_id"] = np.asarray([a.unique_id for a in agents], dtype=np.int64)
+        state["agent_pos"] = np.asarray([a.pos for a in agents], dtype=np.int32).reshape(-1, 2)
+        state["agent_infection"] = np.asarray([a.infectionstate for a in agents], dtype=np.int8)
+        state["agent_quarantine"] = np.asarray([a.quarantinestate for a in agents], dtype=np.int8)
+        state["agent_infected_time"] = np.asarray([a.infected_time for a in agents], dtype=np.int64)
+        state["agent_aspiration"] = np.asarray([a.aspiration for a in agents], dtype=np.float64)
+        state["agent_habituation"] = np.asarray([a.habituation for a in agents], dtype=np.float64)
+        state["agent_action"] = np.asarray([a.action for a in agents], dtype=np.int8)
+        state["action_probs"] = model.action_probs.copy()
+    else:
+        for name in ENGINE_ARRAYS:
+            state["engine_" + name] = getattr(model.engine, name).copy()
+
+    state.update(collected_data(model.datacollector))
+    return state
+
+
+def collected_data(datacollector):
+    """Arrays of the data collected so far: one array per model reporter, the step,
+    unique_id and reported values of every agent record, and the agent collection settings
+
+    Returns: dictionary of array name to array
+    """
+    data = {}
+    for name, values in datacollector.model_vars.items():
+        data["model_var_" + name] = values.copy()
+
+    table = datacollector.agent_table()
+    columns = ["step", "unique_id"] + list(datacollector.agent_reporters)
+    for i, name in enumerate(columns):
+        data["agent_record_" + name] = table[:, i].astype(np.int64)
+
+    data["agent_every"] = np.asarray(datacollector.agent_every)
+    data["agent_sample"] = np.asarray(-1 if datacollector.agent_sample is None else datacollector.agent_sample)
+    if datacollector.sample_ids is not None:
+        data["agent_sample_ids"] = datacollector.sample_ids.copy()
+    return data
+
+
+def load(path, model_class=MainModel):
+    """Create a model of model_class (MainModel or a subclass) from the checkpoint at path
+
+    Returns: the restored model
+    """
+    with np.load(path) as file:
+        state = {name: file[name] for name in file.files}
+    return restore(state, model_class)
+
+
+def restore(state, model_class=MainModel):
+    """Create a model of model_class (MainModel or a subclass) from a snapshot. The arrays
+    of the snapshot are copied, so one snapshot can be restored several times.
+
+    Returns: the restored model
+    """
+    def scalar(name):
+        return state[name].item()
+
+    params = {name: scalar("param_" + name) for name in PARAMETERS}
+    engine = scalar("engine")
+    depth = scalar("history_depth")
+    depth = None if depth == -1 else depth
+
+    """Build an empty model with the same parameters, then fill in the state"""
+    model = model_class.__new__(model_class)
+    MainModel.__init__(model, **dict(params, population_density=0), engine=engine,
+                       frontier_data="model_var_Frontier" in state)
+    model.population_density = params["population_density"]
+    for name in SCALARS + OPTIONAL_SCALARS:
+        if "param_" + name in state:
+            setattr(model, name, scalar("param_" + name))
+    model.infection_counts = state["infection_counts"].tolist()
+    model.schedule.steps, model.schedule.time = state["schedule"].tolist()
+    for name in GRAPH_LISTS:
+        values = state["graph_" + name]
+        setattr(model, name, values.astype(np.int64).tolist() if name in ("stay_in_list", "stay_out_list", "steps_list")
+                else values.tolist())
+
+    if engine == "agent":
+        restore_agents(model, state)
+        model.create_frontier()
+    else:
+        restore_engine(model, state)
+
+    pool = model.empty_cells if model.engine is None else model.engine.empty_cells
+    pool.restore(state["empty_cells"])
+
+    model.progression.restore(state["progression_agents"], state["progression_lengths"])
+
+    history = ActionHistory(model.total_population, depth)
+    model.action_history = history
+    history.steps = scalar("history_steps")
+    history.counts = np.zeros((max(64, history.steps), history.counts.shape[1]), dtype=np.int32)
+    history.counts[:history.steps] = state["history_counts"]
+    if "history_actions" in state:
+        history.actions = state["history_actions"].copy()
+
+    restore_collected_data(model.datacollector, state)
+
+    mt_state = tuple(int(value) for value in state["random_state"])
+    gauss = scalar("random_gauss")
+    model.random = random.Random()
+    model.random.setstate((scalar("random_version"), mt_state, None if np.isnan(gauss) else gauss))
+    model.generator.bit_generator.state = json.loads(scalar("generator_state"))
+
+    model.population_metrics = None
+    model.population_metrics_step = None
+    return model
+
+
+def restore_agents(model, state):
+    """Recreate the MainAgent objects in order of unique_id, which is the order they
+    were added to the schedule, so the schedule shuffles them the same way
+    """
+    model.action_probs = state["action_probs"].copy()
+    model.agents_by_id = [None] * model.action_probs.shape[0]
+    columns = zip(state["agent_unique_id"].tolist(), state["agent_pos"].tolist(),
+                  state["agent_infection"].tolist(), state["agent_quarantine"].tolist(),
+                  state["agent_infected_time"].tolist(), state["agent_aspiration"].tolist(),
+                  state["agent_habituation"].tolist(), state["agent_action"].tolist())
+    for unique_id, pos, infection, quarantine, infected_time, aspiration, habituation, action in columns:
+        pos = tuple(pos)
+        agent = MainAgent(unique_id, model, pos)
+        agent.infectionstate = InfectionState(infection)
+        agent.quarantinestate = QuarantineState(quarantine)
+        agent.infected_time = infected_time
+        agent.aspiration = aspiration
+        agent.habituation = habituation
+        agent.action = action
+        agent.action_prob = model.action_probs[unique_id]
+        model.grid.place_agent(agent, pos)
+        model.schedule.add(agent)
+        model.agents_by_id[unique_id] = agent
+
+
+def restore_engine(model, state):
+    """Put the arrays of the VectorizedEngine back, its occupancy grid and frontier are rebuilt from them
+    """
+    engine = model.engine
+    for name in ENGINE_ARRAYS:
+        setattr(engine, name, state["engine_" + name].copy())
+    engine.n = engine.x.size
+
+    alive = np.flatnonzero(engine.alive)
+    engine.occupancy[:] = EMPTY
+    engine.occupancy[engine.x[alive], engine.y[alive]] = alive
+    if engine.frontier is not None:
+        engine.frontier.stale = True
+
+
+def restore_collected_data(datacollector, state):
+    """Put the data collected before the checkpoint back into the ColumnarDataCollector
+    """
+    columns = ["step", "unique_id"] + list(datacollector.agent_reporters)
+    table = np.stack([state["agent_record_" + name] for name in columns], axis=1)
+    datacollector.restore({name: state["model_var_" + name] for name in datacollector.model_reporters}, table)
+
+    if "agent_every" in state:
+        datacollector.agent_every = state["agent_every"].item()
+        sample = state["agent_sample"].item()
+        datacollector.agent_sample = None if sample == -1 else sample
+    if "agent_sample_ids" in state:
+        datacollector.sample_ids = state["agent_sample_ids"].copy()
@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+
+from history import grow
+
+"""Data collection of the model into preallocated NumPy arrays, in place of the mesa DataCollector"""
+
+
+class ColumnarDataCollector:
+    def __init__(self, model_reporters, agent_reporters=None, agent_every=0, agent_sample=None, sample_seed=None):
+        """Collects the values of the model reporters at every step as one row of a float64
+        array, whose length doubles when it is full. The agent reporters are only collected
+        when agent_every is set: every agent_every steps, for all live agents or for a fixed
+        random sample of them, as one int32 row per agent (step, unique_id, values).
+
+        Parameters:
+            model_reporters: dictionary of reporter name to function of the model
+            agent_reporters: dictionary of reporter name to integer agent attribute, read
+                through MainModel.get_agent_attributes
+            agent_every: collect the agent reporters every agent_every steps, 0 never
+            agent_sample: number of agents whose reporters are collected, drawn at the first
+                agent collection with a generator of its own seeded by sample_seed, None for all agents
+            self.values: steps x model reporters float64 array, rows past self.steps unused
+            self.agent_records: records x (2 + agent reporters) int32 array, rows past self.agent_rows unused
+            self.sample_ids: sorted unique_ids of the sampled agents, None until drawn or without sample
+        """
+        self.model_reporters = dict(model_reporters)
+        self.agent_reporters = dict(agent_reporters or {})
+        self.agent_every = agent_every
+        self.agent_sample = agent_sample
+        self.sample_generator = np.random.default_rng(sample_seed)
+        self.sample_ids = None
+
+        self.steps = 0
+        self.values = np.zeros((64, len(self.model_reporters)), dtype=np.float64)
+        self.agent_rows = 0
+        self.agent_records = np.zeros((64, 2 + len(self.agent_reporters)), dtype=np.int32)
+
+    def collect(self, model):
+        """Add the values of the reporters at the current step
+        """
+        if self.steps == self.values.shape[0]:
+            self.values = grow(self.values)
+        row = self.values[self.steps]
+        for i, reporter in enumerate(self.model_reporters.values()):
+            row[i] = reporter(model)
+
+        if self.agent_every and self.agent_reporters and self.steps % self.agent_every == 0:
+            self.collect_agents(model)
+        self.steps = self.steps + 1
+
+    def collect_agents(self, model):
+        """Add one record per live agent, or per live agent of the sample
+        """
+        unique_ids, columns = model.get_agent_attributes(list(self.agent_reporters.values()))
+        if self.agent_sample is not None:
+            if self.sample_ids is None:
+                number = min(self.agent_sample, unique_ids.size)
+                self.sample_ids = np.sort(self.sample_generator.choice(unique_ids, number, replace=False))
+            sampled = np.isin(unique_ids, self.sample_ids, assume_unique=True)
+            unique_ids = unique_ids[sampled]
+            columns = [column[sampled] for column in columns]
+
+        end = self.agent_rows + unique_ids.size
+        if end > self.agent_records.shape[0]:
+            grown = np.zeros((max(end, 2 * self.agent_records.shape[0]), self.agent_records.shape[1]), dtype=np.int32)
+            grown[:self.agent_rows] = self.agent_records[:self.agent_rows]
+            self.agent_records = grown
+        records = self.agent_records[self.agent_rows:end]
+        records[:, 0] = self.steps
+        records[:, 1] = unique_ids
+        for i, column in enumerate(columns):
+            records[:, 2 + i] = column
+        self.agent_rows = end
+
+    @property
+    def model_vars(self):
+        """Values of every model reporter so far, as views of the collected array, like the
+        model_vars lists of the mesa DataCollector
+
+        Returns: dictionary of reporter name to float64 array
+        """
+        values = self.values[:self.steps]
+        return {name: values[:, i] for i, name in enumerate(self.model_reporters)}
+
+    def to_dataframe(self):
+        """Get the values of the model reporters, without copying them
+
+        Returns: DataFrame with one row per step and one column per model reporter
+        """
+        return pd.DataFrame(self.values[:self.steps], columns=list(self.model_reporters), copy=False)
+
+    def get_model_vars_dataframe(self):
+        """Same as to_dataframe, under the name of the mesa DataCollector
+
+        Returns: DataFrame with one row per step and one column per model reporter
+        """
+        return self.to_dataframe()
+
+    def agent_table(self):
+        """Get the agent records so far
+
+        Returns: records x (2 + agent reporters) int32 array of step, unique_id and reported values
+        """
+        return self.agent_records[:self.agent_rows]
+
+    def get_agent_vars_dataframe(self):
+        """Get the agent records, indexed by step and agent as in the mesa DataCollector
+
+        Returns: DataFrame with a (Step, AgentID) index and one column per agent reporter
+        """
+        table = self.agent_table()
+        index = pd.MultiIndex.from_arrays([table[:, 0], table[:, 1]], names=["Step", "AgentID"])
+        return pd.DataFrame(table[:, 2:], index=index, columns=list(self.agent_reporters), copy=False)
+
+    def memory_bytes(self):
+        """Returns: number of bytes of the arrays allocated for the collected data"""
+        return self.values.nbytes + self.agent_records.nbytes
+
+    def restore(self, model_vars, agent_table):
+        """Put back collected data, as returned by model_vars and agent_table
+        """
+        self.steps = len(next(iter(model_vars.values()))) if model_vars else 0
+        self.values = np.zeros((max(64, self.steps), len(self.model_reporters)), dtype=np.float64)
+        for i, name in enumerate(self.model_reporters):
+            self.values[:self.steps, i] = model_vars[name]
+
+        self.agent_rows = agent_table.shape[0]
+        self.agent_records = np.zeros((max(64, self.agent_rows), 2 + len(self.agent_reporters)), dtype=np.int32)
+        self.agent_records[:self.agent_rows] = agent_table
@@ -0,0 +1,2 @@
+"""Root of the tests, pytest puts this directory on sys.path so the tests in tests/ import
+the modules of the repo"""
@@ -0,0 +1,91 @@
+import numpy as np
+
+from agent import ACTIONS, NO_ACTION
+
+"""Compact history of the actions done by the agents"""
+
+
+class ActionHistory:
+    def __init__(self, agents, depth=0):
+        """History of the actions picked at every step. The number of agents doing each
+        action is always kept, one row of ints per step. The action of every agent is only
+        kept on request, as one int8 row per step with a column per agent.
+
+        Parameters:
+            agents: number of agents, agent unique_id is the column of the agent
+            depth: 0 keeps only the action counts, a positive number keeps the actions of
+                every agent for that many last steps (ring buffer), None keeps all steps
+        """
+        self.agents = agents
+        self.depth = depth
+        self.steps = 0
+        self.counts = np.zeros((64, len(ACTIONS)), dtype=np.int32)
+
+        if depth == 0:
+            self.actions = None
+        elif depth is None:
+            self.actions = np.full((64, agents), NO_ACTION, dtype=np.int8)
+        else:
+            self.actions = np.full((depth, agents), NO_ACTION, dtype=np.int8)
+
+    def record(self, actions, unique_ids):
+        """Add the actions of the current step, actions[i] being done by agent unique_ids[i].
+        Agents that are not listed get NO_ACTION.
+        """
+        if self.actions is not None:
+            if self.depth is None:
+                if self.steps == self.actions.shape[0]:
+                    self.actions = grow(self.actions, NO_ACTION)
+                row = self.steps
+            else:
+                row = self.steps % self.depth
+            self.actions[row] = NO_ACTION
+            self.actions[row, unique_ids] = actions
+
+        self.record_counts(np.bincount(actions, minlength=len(ACTIONS)))
+
+    def record_counts(self, counts):
+        """Add the number of agents doing each action at the current step, for a history
+        that keeps no agent actions
+        """
+        if self.steps == self.counts.shape[0]:
+            self.counts = grow(self.counts)
+        self.counts[self.steps] = counts
+        self.steps = self.steps + 1
+
+    def action_counts(self):
+        """Get the number of agents doing each action
+
+        Returns: steps x 4 array, columns ordered as ACTIONS
+        """
+        return self.counts[:self.steps]
+
+    def agent_actions(self):
+        """Get the kept actions of every agent, oldest step first
+
+        Returns: kept steps x agents int8 array of action indices
+        """
+        if self.actions is None:
+            raise ValueError("The actions of the agents are not kept, create the model with action_history_depth")
+        if self.depth is None:
+            return self.actions[:self.steps]
+        if self.steps <= self.depth:
+            return self.actions[:self.steps]
+        return np.roll(self.actions, -(self.steps % self.depth), axis=0)
+
+    def agent_history(self, unique_id):
+        """Get the kept actions of one agent, oldest step first
+
+        Returns: int8 array of action indices, NO_ACTION for the steps the agent was not present
+        """
+        return self.agent_actions()[:, unique_id]
+
+
+def grow(array, fill=0):
+    """Double the number of rows of an array
+
+    Returns: the new array, with the old rows first
+    """
+    grown = np.full((array.shape[0] * 2,) + array.shape[1:], fill, dtype=array.dtype)
+    grown[:array.shape[0]] = array
+    return grown
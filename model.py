@@ -1,13 +1,20 @@
 from mesa import Model
 from mesa.space import SingleGrid
-from mesa.datacollection import DataCollector
 from mesa.time import RandomActivation
 import numpy as np
 
-from agent import MainAgent
+from agent import MainAgent, STAY_IN, NO_ACTION, ACTION_INFECTION_PROB, INITIAL_ACTION_PROB
+from cell_pool import EmptyCellPool
+from collector import ColumnarDataCollector
+from history import ActionHistory
+from progression import ProgressionWheel
+import tiled
+import vectorized
 
+import contextlib
 import enum
 import csv
+import gc
 import os
 
 """infection and quarantine states"""
@@ -27,14 +34,16 @@ class QuarantineState(enum.IntEnum):
     FREE = 4
 
 
+"""Arrays of the VectorizedEngine and TiledEngine holding the attributes of MainAgent"""
+ENGINE_ATTRIBUTES = {"infectionstate": "infection", "quarantinestate": "quarantine", "action": "action"}
+
+
 def get_susceptible_number(model):
     """Get number of susceptible agents
 
     Returns: total number of susceptible agents
     """
-    susceptible_agents = [
-        a for a in model.schedule.agents if a.infectionstate == InfectionState.CLEAN]
-    return len(susceptible_agents)
+    return model.infection_counts[InfectionState.CLEAN]
 
 
 def get_infected_number(model):
@@ -42,9 +51,7 @@ def get_infected_number(model):
 
     Returns: total number of infected agents
     """
-    infected_agents = [
-        a for a in model.schedule.agents if a.infectionstate == InfectionState.INFECTED]
-    return len(infected_agents)
+    return model.infection_counts[InfectionState.INFECTED]
 
 
 def get_recovered_number(model):
@@ -52,9 +59,7 @@ def get_recovered_number(model):
 
     Returns: total number of recovered agents
     """
-    recovered_agents = [
-        a for a in model.schedule.agents if a.infectionstate == InfectionState.RECOVERED]
-    return len(recovered_agents)
+    return model.infection_counts[InfectionState.RECOVERED]
 
 
 def get_dead_number(model):
@@ -70,12 +75,7 @@ def get_stay_in(model):
 
     Returns: Total number of agents that are staying in at current step
     """
-    try:
-        stay_in_number = [
-            a for a in model.schedule.agents if a.action_done[-1] == 'Stay In']
-        return len(stay_in_number)
-    except Exception:
-        return 0
+    return model.stay_in_count
 
 
 def get_go_out(model):
@@ -83,12 +83,7 @@ def get_go_out(model):
 
     Returns: Total number of agents that go out at current step
     """
-    try:
-        go_out_number = [
-            a for a in model.schedule.agents if a.action_done[-1] != 'Stay In']
-        return len(go_out_number)
-    except Exception:
-        return 0
+    return model.go_out_count
 
 
 def get_average_aspiration(model):
@@ -96,10 +91,7 @@ def get_average_aspiration(model):
 
     Returns: average aspiration of all the agents in population
     """
-    aspiration_list = []
-    for i, a in enumerate(model.schedule.agents):
-        aspiration_list.append(a.aspiration)
-    return (sum(aspiration_list))
+    return model.get_population_metrics()["aspiration_sum"]
 
 
 def get_average_stay_in(model):
@@ -107,11 +99,8 @@ def get_average_stay_in(model):
 
     Returns: average probability of all agents who are staying in
     """
-    stay_in_list = []
-    for i, a in enumerate(model.schedule.agents):
-        stay_in_list.append(a.action_prob["Stay In"])
-
-    return (sum(stay_in_list) / i)
+    metrics = model.get_population_metrics()
+    return metrics["stay_in_prob_sum"] / (metrics["agents"] - 1)
 
 
 def get_average_go_out(model):
@@ -119,14 +108,30 @@ def get_average_go_out(model):
 
     Returns: average action probability of all agents of the action going out
     """
-    go_out_list = []
-    for i, a in enumerate(model.schedule.agents):
-        go_out_list.append(
-            (a.action_prob["Party"] +
-             a.action_prob["Help elderly"] +
-             a.action_prob["Buy grocery"]))
+    metrics = model.get_population_metrics()
+    return metrics["go_out_prob_sum"] / (metrics["agents"] - 1)
+
 
-    return (sum(go_out_list) / i)
+def get_frontier(model):
+    """Get the number of susceptible agents next to an infected agent
+
+    Returns: size of the infection frontier
+    """
+    return model.get_frontier_size()
+
+
+@contextlib.contextmanager
+def paused_garbage_collection():
+    """Disable the cyclic garbage collector while millions of objects are created at once,
+    each generation threshold crossed would otherwise scan all of the objects created so far
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
 
 
 class MainModel(Model):
@@ -141,7 +146,9 @@ class MainModel(Model):
     def __init__(self, population_density, death_rate, transfer_rate,
                  initial_infection_rate, width, height, government_stringent,
                  government_action_threshold, global_aspiration,
-                 recovery_days=11, habituation=0.1, learning_rate=0.1, ):
+                 recovery_days=11, habituation=0.1, learning_rate=0.1, engine="agent",
+                 action_history_depth=0, seed=None, tiles=None, agent_data_every=0, agent_data_sample=None,
+                 log=None, frontier_data=False):
         """Model class which has all the model paramaters and functions
 
         Parameters:
@@ -162,8 +169,41 @@ class MainModel(Model):
             self.habituation: the habituation of the agents - sensitivity to the change in stimulus of action
             self.learning_rate: learning rate of the agents - controls rate of change of aspiration level
             self.global_aspiration: initial global aspiration of the population
-            self.action_infection_prob: Probability of getting infected for a particular action
+            self.action_infection_prob: Probability of getting infected for a particular action, indexed as ACTIONS
+
+            self.engine: None when the agents are simulated as MainAgent objects (engine="agent"),
+                a VectorizedEngine holding all agents in arrays when engine="vectorized",
+                a TiledEngine splitting the grid between worker processes when engine="tiled"
+            tiles: number of tiles (worker processes) of the tiled engine, os.cpu_count() when None
+
+            self.infection_counts: number of agents in each InfectionState, updated on every transition
+            self.stay_in_count, self.go_out_count: number of agents staying in and going out at the current step
+            self.population_metrics: aggregates over all agents, computed once per step by get_population_metrics
+            self.empty_cells: EmptyCellPool of the cells without an agent, used to move agents
+            self.action_probs: agents x 4 matrix of action probabilities, row unique_id is the action_prob of that agent
+            self.agents_by_id: list of the MainAgent objects, indexed by unique_id
+            self.progression: ProgressionWheel of the infected agents, drives deaths and recoveries
+            self.infection_pressure: width x height array with the number of infected agents around every cell
+            self.frontier: set of the unique_id of the susceptible agents with at least one infected
+                Moore neighbour, the only agents that can get infected
+            self.action_history: ActionHistory with the number of agents doing each action at every step,
+                and the action of every agent for the last action_history_depth steps
+                (0 keeps no agent actions, None keeps all steps)
+            seed: seed of the random number generators, None leaves them unseeded
+            self.generator: np.random.Generator of the model, used for all NumPy draws of the model
+                and its engine, self.random being the random.Random of mesa
+            self.datacollector: ColumnarDataCollector of the model reporters at every step, and of the
+                infection and quarantine states of the agents every agent_data_every steps (0 never)
+                for all agents or a random sample of agent_data_sample agents
+            self.frontier_data: also collect the size of the frontier as "Frontier". The agent engine
+                always keeps the frontier for its spread, the vectorized and tiled engines keep it only then
+            log: TransitionLog getting the changes of the states of the agents as they happen,
+                kept as self.transition_log, None to keep no log
         """
+        """Mesa puts the generator on the class, where the next model would replace it"""
+        self.random = self.random
+        self.generator = np.random.default_rng(seed)
+
         self.population_density = population_density
         self.death_rate = death_rate
         self.width = width
@@ -173,6 +213,12 @@ class MainModel(Model):
         self.recovery_days = recovery_days
         self.dead_agents_number = 0
 
+        self.infection_counts = [0] * len(InfectionState)
+        self.stay_in_count = 0
+        self.go_out_count = 0
+        self.population_metrics = None
+        self.population_metrics_step = None
+
         self.government_action_threshold = government_action_threshold
         self.government_stringent = government_stringent
 
@@ -184,77 +230,332 @@ class MainModel(Model):
         self.learning_rate = learning_rate
         self.global_aspiration = global_aspiration
         self.action_count = 4
-        self.action_infection_prob = {
-            "Stay In": 0.1,
-            "Party": 0.7,
-            "Buy grocery": 0.5,
-            "Help elderly": 0.5
-        }
+        self.action_infection_prob = ACTION_INFECTION_PROB
 
         """graphing parameters"""
 
         self.step_counter = 0
-        self.dilemma_list = []
         self.stay_in_list = []
         self.stay_out_list = []
         self.steps_list = []
         self.aspiration_list = []
         self.infection_list = []
 
-        self.grid = SingleGrid(width, height, True)
         self.schedule = RandomActivation(self)
-        i = 0
-
-        """Get all the cells in SingleGrid"""
-        for cell in self.grid.coord_iter():
-            x, y = cell[1], cell[2]
-
-            """Add agents and infect them with initial infection rate"""
-
-            if self.random.random() < self.population_density:
-                agent = MainAgent(i, self, (x, y))
-
-                if (np.random.choice([0, 1], p=[
-                        1 - self.initial_infection_rate, self.initial_infection_rate])) == 1:
-                    agent.infectionstate = InfectionState.INFECTED
-                    agent.quarantinestate = QuarantineState.FREE
-                    agent.infected_time = self.schedule.time
-
-                self.grid.position_agent(agent, (x, y))
-                self.schedule.add(agent)
-                i = i + 1
-
-        self.total_population = i
+        self.progression = ProgressionWheel(recovery_days)
+        self.frontier_data = frontier_data
+
+        if engine == "vectorized":
+            self.engine = vectorized.VectorizedEngine(self)
+            self.grid = self.engine.grid
+            self.total_population = self.engine.n
+        elif engine == "tiled":
+            self.engine = tiled.TiledEngine(self, tiles)
+            self.grid = self.engine.grid
+            self.total_population = self.engine.n
+        elif engine == "agent":
+            self.engine = None
+            with paused_garbage_collection():
+                self.grid = SingleGrid(width, height, True)
+                occupied = self.create_agents()
+            self.total_population = len(self.agents_by_id)
+            self.empty_cells = EmptyCellPool(width, height, occupied)
+            self.create_frontier()
+        else:
+            raise ValueError("Unknown engine: " + str(engine))
+
+        self.action_history = ActionHistory(self.total_population, action_history_depth)
 
         self.running = True
 
-        self.datacollector = DataCollector(
-            model_reporters={
-                "Infected": get_infected_number,
-                "Recovered": get_recovered_number,
-                "Dead": get_dead_number,
-                "Stay In": get_stay_in,
-                "Go Out": get_go_out,
-                "Susceptible": get_susceptible_number,
-                "Aspiration": get_average_aspiration,
-                "Average Aspiration": get_average_aspiration,
-                "Average Stay In": get_average_stay_in,
-                "Average Get Out": get_average_go_out,
+        model_reporters = {
+            "Infected": get_infected_number,
+            "Recovered": get_recovered_number,
+            "Dead": get_dead_number,
+            "Stay In": get_stay_in,
+            "Go Out": get_go_out,
+            "Susceptible": get_susceptible_number,
+            "Aspiration": get_average_aspiration,
+            "Average Aspiration": get_average_aspiration,
+            "Average Stay In": get_average_stay_in,
+            "Average Get Out": get_average_go_out,
+        }
+        if frontier_data:
+            model_reporters["Frontier"] = get_frontier
 
-            },
+        self.datacollector = ColumnarDataCollector(
+            model_reporters=model_reporters,
 
             agent_reporters={
                 "QuarantineState": "quarantinestate",
                 "InfectionState": "infectionstate",
             },
+            agent_every=agent_data_every,
+            agent_sample=agent_data_sample,
+            sample_seed=seed,
         )
 
+        self.transition_log = log
+        if log is not None:
+            log.start(self.total_population)
+            """The agents infected when the model is created, logged at step 0"""
+            unique_ids, (infection,) = self.get_agent_attributes(("infectionstate",))
+            self.log_transition("infectionstate", unique_ids, infection)
+            log.record(self.step_counter)
+
+    def create_agents(self):
+        """Create the MainAgent objects and place them on the grid. The occupied cells and the
+        initially infected agents are drawn as whole arrays, as in the VectorizedEngine, so a
+        seed gives the same initial population with both engines.
+
+        Returns: width x height bool array of the occupied cells
+        """
+
+        """Add agents and infect them with initial infection rate"""
+
+        occupied = self.generator.random((self.width, self.height)) < self.population_density
+        x, y = np.nonzero(occupied)
+        n = x.size
+        infected = self.generator.random(n) < self.initial_infection_rate
+
+        """Keep the action probabilities of all agents in one matrix"""
+        self.action_probs = np.tile(INITIAL_ACTION_PROB, (n, 1))
+
+        """The drawn cells are distinct and empty, so they are filled in directly instead of
+        with place_agent, and taken out of the empty cells of the grid at once"""
+        positions = list(zip(x.tolist(), y.tolist()))
+        cells = self.grid.grid
+        self.agents_by_id = []
+        for unique_id, pos in enumerate(positions):
+            agent = MainAgent(unique_id, self, pos, self.action_probs[unique_id])
+            agent.pos = pos
+            cells[pos[0]][pos[1]] = agent
+            self.schedule.add(agent)
+            self.agents_by_id.append(agent)
+        self.grid.empties.difference_update(positions)
+
+        infected_ids = np.flatnonzero(infected)
+        for unique_id in infected_ids.tolist():
+            agent = self.agents_by_id[unique_id]
+            agent.infectionstate = InfectionState.INFECTED
+            agent.infected_time = self.schedule.time
+        self.progression.add(self.schedule.time, infected_ids.tolist())
+        self.infection_counts[InfectionState.INFECTED] += infected_ids.size
+        self.infection_counts[InfectionState.CLEAN] += n - infected_ids.size
+
+        return occupied
+
+    def create_frontier(self):
+        """Count the infected agents around every cell and collect the susceptible agents
+        next to them, both kept up to date on every infection, recovery, death and move
+        """
+        infected = np.zeros((self.width, self.height), dtype=bool)
+        for a in self.schedule.agents:
+            if a.infectionstate == InfectionState.INFECTED:
+                infected[a.pos] = True
+        self.infection_pressure = vectorized.moore_neighbour_count(infected).astype(np.int32)
+        self.frontier = set(a.unique_id for a in self.schedule.agents
+                            if a.infectionstate == InfectionState.CLEAN and self.infection_pressure[a.pos] > 0)
+
+    def update_pressure(self, pos, change):
+        """Add change infected agents around the cell at pos, susceptible agents in the
+        cells around it join or leave the frontier when they get or lose their last infected neighbour
+        """
+        x, y = pos
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                if dx == 0 and dy == 0:
+                    continue
+                cell = ((x + dx) % self.width, (y + dy) % self.height)
+                before = self.infection_pressure[cell]
+                self.infection_pressure[cell] = before + change
+                if (before == 0) != (before + change == 0):
+                    neighbour = self.grid[cell[0]][cell[1]]
+                    if neighbour is not None and neighbour.infectionstate == InfectionState.CLEAN:
+                        if before == 0:
+                            self.frontier.add(neighbour.unique_id)
+                        else:
+                            self.frontier.discard(neighbour.unique_id)
+
+    def infect(self, agent):
+        """Update the frontier for an agent that just got infected
+        """
+        self.frontier.discard(agent.unique_id)
+        self.update_pressure(agent.pos, 1)
+
+    def get_frontier_size(self):
+        """Get the number of susceptible agents with at least one infected neighbour
+
+        Returns: size of the frontier
+        """
+        if self.engine is None:
+            return len(self.frontier)
+        return self.engine.frontier_size()
+
+    def move_to_empty(self, agent):
+        """Move an agent to a random empty cell, picked from the empty cell pool in constant time
+        """
+        old_pos = agent.pos
+        new_pos = self.empty_cells.claim_random(self.random)
+        self.empty_cells.release(old_pos)
+        self.grid.move_agent(agent, new_pos)
+
+        if agent.infectionstate == InfectionState.INFECTED:
+            self.update_pressure(old_pos, -1)
+            self.update_pressure(new_pos, 1)
+        elif agent.infectionstate == InfectionState.CLEAN:
+            if self.infection_pressure[new_pos] > 0:
+                self.frontier.add(agent.unique_id)
+            else:
+                self.frontier.discard(agent.unique_id)
+
+    def remove_agent(self, agent):
+        """Take an agent out of the grid and the schedule, its cell goes back to the empty cell pool
+        """
+        pos = agent.pos
+        self.empty_cells.release(pos)
+        self.grid.remove_agent(agent)
+        self.schedule.remove(agent)
+        if agent.infectionstate == InfectionState.INFECTED:
+            self.update_pressure(pos, -1)
+
+    def pick_actions(self):
+        """Every agent chooses an action for the current step. The actions of the whole
+        population are drawn at once from the matrix of action probabilities, with the
+        lockdown stringency applied in the same pass.
+        """
+        agents = self.schedule.agents
+        unique_ids = np.array([a.unique_id for a in agents], dtype=np.intp)
+        prob = self.action_probs[unique_ids]
+
+        if self.lockdown:
+            vectorized.apply_stringency(prob, self.government_stringent)
+            self.action_probs[unique_ids] = prob
+
+        quarantined = np.array(
+            [a.quarantinestate == QuarantineState.QUARANTINE for a in agents], dtype=bool)
+        actions = vectorized.sample_actions(prob, quarantined, self.generator)
+        self.record_actions(actions, unique_ids)
+
+        for a, action in zip(agents, actions.tolist()):
+            a.action = action
+
+    def count_transition(self, old_state, new_state, number=1):
+        """Update the infection counters when number agents go from old_state to new_state
+        """
+        self.infection_counts[old_state] -= number
+        self.infection_counts[new_state] += number
+
+    def log_transition(self, attribute, unique_ids, state):
+        """Add the change of an attribute of agents to state to the transition log, if the model has one
+        """
+        if self.transition_log is not None:
+            self.transition_log.change(attribute, unique_ids, state)
+
+    def record_actions(self, actions, unique_ids):
+        """Reset the stay in and go out counters from the actions picked for this step
+        and add them to the action history and the transition log
+        """
+        self.stay_in_count = int(np.count_nonzero(actions == STAY_IN))
+        self.go_out_count = len(actions) - self.stay_in_count
+        self.action_history.record(actions, unique_ids)
+        self.log_transition("action", unique_ids, actions)
+
+    def record_action_counts(self, counts):
+        """Same as record_actions, from the number of agents doing each action, for engines
+        which do not gather the actions of all agents at one place
+        """
+        self.stay_in_count = int(counts[STAY_IN])
+        self.go_out_count = int(counts.sum()) - self.stay_in_count
+        self.action_history.record_counts(counts)
+
+    def uncount_action(self, stay_in):
+        """Take the action of an agent that left the simulation out of the action counters
+        """
+        if stay_in:
+            self.stay_in_count -= 1
+        else:
+            self.go_out_count -= 1
+
+    def get_population_metrics(self):
+        """Get the aggregates over all agents needed by the model reporters. They are
+        computed in a single pass over the agents (or array reductions for the vectorized
+        engine) and cached until the next step, so every reporter of a step reads the same result.
+
+        Returns: dictionary with the number of agents, the sum of their aspiration and
+                the sums of their stay in and go out probabilities
+        """
+        if self.population_metrics_step != self.schedule.steps:
+            if self.engine is None:
+                aspiration_sum = 0
+                agents = self.schedule.agents
+                unique_ids = []
+                for a in agents:
+                    aspiration_sum = aspiration_sum + a.aspiration
+                    unique_ids.append(a.unique_id)
+                prob = self.action_probs[unique_ids]
+                stay_in_prob_sum = float(prob[:, STAY_IN].sum())
+                go_out_prob_sum = float(prob.sum() - stay_in_prob_sum)
+                self.population_metrics = {
+                    "agents": len(agents),
+                    "aspiration_sum": aspiration_sum,
+                    "stay_in_prob_sum": stay_in_prob_sum,
+                    "go_out_prob_sum": go_out_prob_sum,
+                }
+            else:
+                self.population_metrics = self.engine.population_metrics()
+            self.population_metrics_step = self.schedule.steps
+        return self.population_metrics
+
+    def get_agent_attributes(self, attributes):
+        """Get integer attributes of the live agents, for the agent reporters of the datacollector
+
+        Returns: (int64 array of unique_id, list of one int64 array per attribute), in the same agent order
+        """
+        if self.engine is None:
+            agents = self.schedule.agents
+            unique_ids = np.fromiter((a.unique_id for a in agents), dtype=np.int64, count=len(agents))
+            columns = [np.fromiter((getattr(a, attribute) for a in agents), dtype=np.int64, count=len(agents))
+                       for attribute in attributes]
+        else:
+            unique_ids = np.flatnonzero(self.engine.alive)
+            columns = [getattr(self.engine, ENGINE_ATTRIBUTES[attribute])[unique_ids].astype(np.int64)
+                       for attribute in attributes]
+        return unique_ids, columns
+
+    def step_agents(self):
+        """Advance all agents by one step, with the engine the model was created with
+        """
+        if self.engine is None:
+            self.pick_actions()
+            self.schedule.step()
+            self.update_status(self.schedule.time - 1)
+        else:
+            self.engine.step()
+
+        if self.transition_log is not None:
+            self.transition_log.record(self.step_counter)
+
+    def update_status(self, time):
+        """Deaths and recoveries of the agents whose events are due at step time, the
+        death trials of all of them drawn at once
+        """
+        dead, recovered = self.progression.advance(time, self.death_rate, self.generator)
+        for unique_id in dead.tolist():
+            self.agents_by_id[unique_id].die()
+        for unique_id in recovered.tolist():
+            self.agents_by_id[unique_id].recover()
+        self.log_transition("infectionstate", dead, InfectionState.DEAD)
+        self.log_transition("action", dead, NO_ACTION)
+        self.log_transition("infectionstate", recovered, InfectionState.RECOVERED)
+        self.log_transition("quarantinestate", recovered, QuarantineState.FREE)
+
     def step(self):
 
         self.step_counter = self.step_counter + 1
 
         self.datacollector.collect(self)
-        self.schedule.step()
+        self.step_agents()
 
         """Impose lockdown if infection number goes above the given threshold"""
 
@@ -272,78 +573,45 @@ class MainModel(Model):
 
         Returns: the number of agents staying in at that particular step
         """
-        try:
-            stay_in_list = [
-                a for a in self.schedule.agents if a.action_done[-1] == "Stay In"]
-            return len(stay_in_list)
-        except Exception:
-            return 0
+        return self.stay_in_count
 
     def get_stay_out_number(self):
         """Get number of agents going out, used for graphing and visualization
 
         Returns: the number of agents going out at that particular step
         """
-        try:
-            stay_out_list = [
-                a for a in self.schedule.agents if a.action_done[-1] != "Stay In"]
-            return len(stay_out_list)
-        except Exception:
-            return 0
+        return self.go_out_count
 
     def get_avg_aspiration(self):
         """Get average aspiration of the population, used for graphing and visualization
 
         Returns: the average population of the agents at that particular step
         """
-        try:
-            total_aspiration = 0
-            for i, a in enumerate(self.schedule.agents):
-                total_aspiration = total_aspiration + a.aspiration
-            return (total_aspiration / i)
-        except Exception:
+        metrics = self.get_population_metrics()
+        if metrics["agents"] < 2:
             return 0
+        return metrics["aspiration_sum"] / (metrics["agents"] - 1)
 
     def get_susceptible_number(self):
         """Get the number of agents that are susceptible to the virus, used for graphing and visualization
 
         Returns: number of agents that are susceptible to the virus until that step
         """
-        susceptible_number = 0
-        for cell in self.grid.coord_iter():
-            if (cell[0] is not None):
-                agent = cell[0]
-                if (agent.infectionstate == InfectionState.CLEAN):
-                    susceptible_number = susceptible_number + 1
-        return susceptible_number
+        return self.infection_counts[InfectionState.CLEAN]
 
     def get_infection_number(self):
         """Get the number of agents that are infected to the virus, used for graphing and visualization
 
         Returns: number of agents that are infected to the virus until that step
         """
-
-        infected_number = 0
-        for cell in self.grid.coord_iter():
-            if (cell[0] is not None):
-                agent = cell[0]
-                if (agent.infectionstate == InfectionState.INFECTED):
-                    infected_number = infected_number + 1
-        return infected_number
+        return self.infection_counts[InfectionState.INFECTED]
 
     def get_recovered_number(self):
         """Get the number of agents who recovered from the virus, used for graphing and visualization
 
         Returns: number of agents that recovered from the virus until that step
         """
-
-        recovered_number = 0
-        for cell in self.grid.coord_iter():
-            if (cell[0] is not None):
-                agent = cell[0]
-                if (agent.infectionstate == InfectionState.RECOVERED):
-                    recovered_number = recovered_number + 1
-        return recovered_number
+        return self.infection_counts[InfectionState.RECOVERED]
 
     def get_dead_number(self):
         """Get the number of agents who died from the virus, used for graphing and visualization
@@ -1,133 +1,124 @@
+import argparse
+import functools
+import multiprocessing
+import os
+import time
+
 import pandas as pd
 import numpy as np
 import csv
 import matplotlib.pyplot as plt
 import seaborn as sns
+
+import batch_run
+from results_store import ResultsStore
 sns.set()
 
+"""Steps of the simulation shown in the facet graphs"""
+STEPS_TO_GRAPH = list(range(4, 16))
 
-def plot_graph_aspiration_no_government_facet():
-    """Plot graph for number of agents going out and staying in for
-    range of aspiration when there is no involvement of government
+"""Folder of the binary copies of the CSVs, see read_csv_cached"""
+CACHE_FOLDER = "simulation/.cache"
 
-    Returns:
-        Displays a facet grids of graphs of agents staying in and
-        going out for varying aspiration
-    """
-    column_names = ["steps", "stayin", "goout"]
-
-    steps_list = []
-    stayin_list = []
-    goout_list = []
-    aspiration_list = []
-    file_names = ["simulation/dilemma_aspiration_0.1_stringent_0.csv",
-                  "simulation/dilemma_aspiration_0.5_stringent_0.csv",
-                  "simulation/dilemma_aspiration_0.9_stringent_0.csv"]
-
-    for i, file in enumerate(file_names):
-        df = pd.read_csv(file, names=column_names)
-
-        steps_to_graph = [4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15]
-
-        df = df[df['steps'].isin(steps_to_graph)]
-
-        steps_list.extend(df['steps'].values.tolist())
-        stayin_list.extend(df['stayin'].values.tolist())
-        goout_list.extend(df['goout'].values.tolist())
-
-        if i == 0:
-            aspiration_list.extend([0.1] * len(df["steps"].values.tolist()))
-        elif i == 1:
-            aspiration_list.extend([0.5] * len(df["steps"].values.tolist()))
-        else:
-            aspiration_list.extend([0.9] * len(df["steps"].values.tolist()))
-
-    df_to_graph = pd.DataFrame(list(zip(steps_list,
-                                        stayin_list,
-                                        goout_list,
-                                        aspiration_list)),
-                               columns=["steps",
-                                        "stayin",
-                                        "goout",
-                                        "aspiration"])
+_memory_cache = {}
 
-    grid = sns.FacetGrid(
-        df_to_graph,
-        col="aspiration",
-        hue="aspiration",
-        palette="tab20c",
-        col_wrap=3,
-        height=3,
-        legend_out=True)
 
-    grid.map(
-        plt.plot,
-        "steps",
-        "stayin",
-        marker="o",
-        color="green",
-        label="stayin")
-    grid.map(
-        plt.plot,
-        "steps",
-        "goout",
-        marker="+",
-        color="red",
-        label="goout")
+def read_csv_cached(path, column_names):
+    """Read a CSV without header. The parsed columns are kept in memory and in a binary
+    .npz copy in CACHE_FOLDER, keyed by the path and the modification time of the CSV,
+    so a CSV is only parsed again after it changed.
 
-    grid.set(xlabel="steps", ylabel="")
+    Returns: DataFrame with the given column names
+    """
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    if key in _memory_cache:
+        return _memory_cache[key]
+
+    cache_path = os.path.join(CACHE_FOLDER, path.replace(os.sep, "_") + ".npz")
+    df = None
+    if os.path.exists(cache_path):
+        with np.load(cache_path) as cached:
+            if (cached["mtime"] == stat.st_mtime_ns and cached["size"] == stat.st_size and
+                    list(cached["columns"]) == list(column_names)):
+                df = pd.DataFrame({name: cached["column_" + name] for name in column_names})
+
+    if df is None:
+        df = pd.read_csv(path, names=column_names)
+        os.makedirs(CACHE_FOLDER, exist_ok=True)
+        temporary = cache_path + ".tmp"
+        with open(temporary, "wb") as file:
+            np.savez(file, mtime=stat.st_mtime_ns, size=stat.st_size, columns=np.array(column_names),
+                     **{"column_" + name: df[name].values for name in column_names})
+        os.replace(temporary, cache_path)
+
+    _memory_cache[key] = df
+    return df
+
+
+def load_dilemma(aspirations, stringent, steps=STEPS_TO_GRAPH, store=None):
+    """Load the number of agents staying in and going out for every aspiration at one
+    government strictness, from the CSVs of batch_run.py or, when store is given, from
+    the ResultsStore at that path averaged over the seeds
+
+    Returns: DataFrame with columns steps, stayin, goout, aspiration
+    """
+    if store is not None:
+        df = ResultsStore(store).load(aspiration=aspirations, stringent=stringent, steps=steps)
+        df = df.groupby(["aspiration", "step"], as_index=False)[["stay_in", "go_out"]].mean()
+        return df.rename(columns={"step": "steps", "stay_in": "stayin", "go_out": "goout"})[
+            ["steps", "stayin", "goout", "aspiration"]]
 
-    plt.subplots_adjust(top=0.8)
-    grid.fig.suptitle('No government strictness')
+    frames = []
+    for aspiration in aspirations:
+        df = read_csv_cached(batch_run.dilemma_csv_path(aspiration, stringent), ["steps", "stayin", "goout"])
+        frames.append(df[df["steps"].isin(steps)].assign(aspiration=aspiration))
+    return pd.concat(frames, ignore_index=True)
 
-    plt.show()
 
+def load_infection(stringencies, steps=13, store=None):
+    """Load the infection rate of the first steps after the lockdown for every government
+    strictness, from the CSVs of batch_run.py or, when store is given, from the
+    ResultsStore at that path averaged over the runs, step by step after the lockdown
 
-def plot_graph_aspiration_government_1_facet():
+    Returns: DataFrame with a row per strictness and a column per step after the lockdown
+    """
+    rows = []
+    if store is not None:
+        df = ResultsStore(store).load(stringent=stringencies)
+        df["position"] = df.groupby(["aspiration", "stringent", "seed"]).cumcount()
+        df = df[df["position"] < steps].groupby(["stringent", "position"], as_index=False)["infection"].mean()
+        for stringent in stringencies:
+            rows.append(df["infection"].values[df["stringent"].values == stringent])
+    else:
+        for stringent in stringencies:
+            df = read_csv_cached(batch_run.infection_csv_path(stringent), ["steps", "infection"])
+            rows.append(df["infection"].values[:steps])
+
+    return pd.DataFrame([np.pad(row.astype(float), (0, steps - len(row)), constant_values=np.nan)
+                         for row in rows],
+                        columns=[str(step) for step in range(5, 5 + steps)])
+
+
+def show_or_save(figure, output):
+    """Display the figure, or save it to the file output and close it when output is given
+    """
+    if output is None:
+        plt.show()
+    else:
+        figure.savefig(output)
+        plt.close(figure)
+
+
+def plot_graph_aspiration_facet(stringent, title, aspirations=(0.1, 0.5, 0.9), store=None, output=None):
     """Plot graph for number of agents going out and staying in for
-    range of aspiration when there government strictness of 0.1
+    range of aspiration at the given government strictness
 
     Returns:
         Displays a facet grids of graphs of agents staying in and
-        going out for varying aspiration
+        going out for varying aspiration, or saves it to the file output
     """
-
-    column_names = ["steps", "stayin", "goout"]
-
-    steps_list = []
-    stayin_list = []
-    goout_list = []
-    aspiration_list = []
-    file_names = ["simulation/dilemma_aspiration_0.1_stringent_0.1.csv",
-                  "simulation/dilemma_aspiration_0.5_stringent_0.1.csv",
-                  "simulation/dilemma_aspiration_0.9_stringent_0.1.csv"]
-
-    for i, file in enumerate(file_names):
-        df = pd.read_csv(file, names=column_names)
-
-        steps_to_graph = [4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15]
-
-        df = df[df['steps'].isin(steps_to_graph)]
-
-        steps_list.extend(df['steps'].values.tolist())
-        stayin_list.extend(df['stayin'].values.tolist())
-        goout_list.extend(df['goout'].values.tolist())
-
-        if i == 0:
-            aspiration_list.extend([0.1] * len(df["steps"].values.tolist()))
-        elif i == 1:
-            aspiration_list.extend([0.5] * len(df["steps"].values.tolist()))
-        else:
-            aspiration_list.extend([0.9] * len(df["steps"].values.tolist()))
-
-    df_to_graph = pd.DataFrame(list(zip(steps_list,
-                                        stayin_list,
-                                        goout_list,
-                                        aspiration_list)),
-                               columns=["steps",
-                                        "stayin",
-                                        "goout",
-                                        "aspiration"])
+    df_to_graph = load_dilemma(aspirations, stringent, store=store)
 
     grid = sns.FacetGrid(
         df_to_graph,
@@ -156,220 +147,122 @@ def plot_graph_aspiration_government_1_facet():
     grid.set(xlabel="steps", ylabel="")
 
     plt.subplots_adjust(top=0.8)
-    grid.fig.suptitle('Government Strictness = 0.1')
+    grid.fig.suptitle(title)
 
-    plt.show()
+    show_or_save(grid.fig, output)
 
 
-def plot_graph_aspiration_government_5_facet():
+def plot_graph_aspiration_no_government_facet():
     """Plot graph for number of agents going out and staying in for
-    range of aspiration when there government strictness of 0.5
-
-    Returns:
-        Displays a facet grids of graphs of agents staying in and
-        going out for varying aspiration
+    range of aspiration when there is no involvement of government
     """
+    plot_graph_aspiration_facet(0, 'No government strictness')
 
-    column_names = ["steps", "stayin", "goout"]
-
-    steps_list = []
-    stayin_list = []
-    goout_list = []
-    aspiration_list = []
-    file_names = ["simulation/dilemma_aspiration_0.1_stringent_0.5.csv",
-                  "simulation/dilemma_aspiration_0.5_stringent_0.5.csv",
-                  "simulation/dilemma_aspiration_0.9_stringent_0.5.csv"]
-
-    for i, file in enumerate(file_names):
-        df = pd.read_csv(file, names=column_names)
-
-        steps_to_graph = [4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15]
-
-        df = df[df['steps'].isin(steps_to_graph)]
-
-        steps_list.extend(df['steps'].values.tolist())
-        stayin_list.extend(df['stayin'].values.tolist())
-        goout_list.extend(df['goout'].values.tolist())
-
-        if i == 0:
-            aspiration_list.extend([0.1] * len(df["steps"].values.tolist()))
-        elif i == 1:
-            aspiration_list.extend([0.5] * len(df["steps"].values.tolist()))
-        else:
-            aspiration_list.extend([0.9] * len(df["steps"].values.tolist()))
-
-    df_to_graph = pd.DataFrame(list(zip(steps_list,
-                                        stayin_list,
-                                        goout_list,
-                                        aspiration_list)),
-                               columns=["steps",
-                                        "stayin",
-                                        "goout",
-                                        "aspiration"])
-
-    grid = sns.FacetGrid(
-        df_to_graph,
-        col="aspiration",
-        hue="aspiration",
-        palette="tab20c",
-        col_wrap=3,
-        height=3,
-        legend_out=True)
-
-    grid.map(
-        plt.plot,
-        "steps",
-        "stayin",
-        marker="o",
-        color="green",
-        label="stayin")
-    grid.map(
-        plt.plot,
-        "steps",
-        "goout",
-        marker="+",
-        color="red",
-        label="goout")
 
-    grid.set(xlabel="steps", ylabel="")
+def plot_graph_aspiration_government_1_facet():
+    """Plot graph for number of agents going out and staying in for
+    range of aspiration when there government strictness of 0.1
+    """
+    plot_graph_aspiration_facet(0.1, 'Government Strictness = 0.1')
 
-    plt.subplots_adjust(top=0.8)
-    grid.fig.suptitle('Government Strictness = 0.5')
 
-    plt.show()
+def plot_graph_aspiration_government_5_facet():
+    """Plot graph for number of agents going out and staying in for
+    range of aspiration when there government strictness of 0.5
+    """
+    plot_graph_aspiration_facet(0.5, 'Government Strictness = 0.5')
 
 
 def plot_graph_aspiration_government_9_facet():
     """Plot graph for number of agents going out and staying in for
     range of aspiration when there government strictness of 0.9
-
-    Returns:
-        Displays a facet grids of graphs of agents staying in and
-        going out for varying aspiration
     """
+    plot_graph_aspiration_facet(0.9, 'Government Strictness = 0.9')
 
-    column_names = ["steps", "stayin", "goout"]
-
-    steps_list = []
-    stayin_list = []
-    goout_list = []
-    aspiration_list = []
-    file_names = ["simulation/dilemma_aspiration_0.1_stringent_0.9.csv",
-                  "simulation/dilemma_aspiration_0.5_stringent_0.9.csv",
-                  "simulation/dilemma_aspiration_0.9_stringent_0.9.csv"]
-
-    for i, file in enumerate(file_names):
-        df = pd.read_csv(file, names=column_names)
-
-        steps_to_graph = [4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15]
-
-        df = df[df['steps'].isin(steps_to_graph)]
 
-        steps_list.extend(df['steps'].values.tolist())
-        stayin_list.extend(df['stayin'].values.tolist())
-        goout_list.extend(df['goout'].values.tolist())
+def plot_heatmap(stringencies=(0.9, 0.8, 0.7, 0.6, 0.5, 0.4, 0.3, 0.2, 0.1, 0), store=None, output=None):
+    """Plot the graph of heatmap of infection with respect to steps and government strictness
 
-        if i == 0:
-            aspiration_list.extend([0.1] * len(df["steps"].values.tolist()))
-        elif i == 1:
-            aspiration_list.extend([0.5] * len(df["steps"].values.tolist()))
-        else:
-            aspiration_list.extend([0.9] * len(df["steps"].values.tolist()))
+    Returns:
+        The graph of heatmap, xaxis as steps and yaxis as government strictness,
+        displayed or saved to the file output
+    """
+    df_to_graph = load_infection(stringencies, store=store)
+    strictness_list = [float(stringent) for stringent in stringencies]
 
-    df_to_graph = pd.DataFrame(list(zip(steps_list,
-                                        stayin_list,
-                                        goout_list,
-                                        aspiration_list)),
-                               columns=["steps",
-                                        "stayin",
-                                        "goout",
-                                        "aspiration"])
+    heat_map = sns.heatmap(df_to_graph, cmap="Reds", vmin=0.0, vmax=1.0, annot=True,
+                           linewidth=0.3, cbar_kws={"shrink": .8}, yticklabels=strictness_list)
 
-    grid = sns.FacetGrid(
-        df_to_graph,
-        col="aspiration",
-        hue="aspiration",
-        palette="tab20c",
-        col_wrap=3,
-        height=3,
-        legend_out=True)
+    heat_map.set(xlabel="steps", ylabel="government stringency")
 
-    grid.map(
-        plt.plot,
-        "steps",
-        "stayin",
-        marker="o",
-        color="green",
-        label="stayin")
-    grid.map(
-        plt.plot,
-        "steps",
-        "goout",
-        marker="+",
-        color="red",
-        label="goout")
+    show_or_save(heat_map.figure, output)
 
-    grid.set(xlabel="steps", ylabel="")
 
-    plt.subplots_adjust(top=0.8)
-    grid.fig.suptitle('Government Strictness = 0.9')
+def figure_specs(stringencies=(0, 0.1, 0.5, 0.9), aspirations=(0.1, 0.5, 0.9), store=None):
+    """Figures of a report: one facet graph per government strictness and the heatmap
 
-    plt.show()
+    Returns: list of (file name, plotting function, keyword arguments) tuples
+    """
+    specs = []
+    for stringent in stringencies:
+        title = 'No government strictness' if stringent == 0 else 'Government Strictness = ' + str(stringent)
+        specs.append(("dilemma_stringent_" + str(stringent), plot_graph_aspiration_facet,
+                      {"stringent": stringent, "title": title, "aspirations": aspirations, "store": store}))
+    specs.append(("infection_heatmap", plot_heatmap, {"store": store}))
+    return specs
 
 
-def plot_heatmap():
-    """Plot the graph of heatmap of infection with respect to steps and government strictness
+def render_figure(spec, folder, image_format="png"):
+    """Draw one figure of figure_specs with the non-interactive Agg backend and save it in folder.
+    Runs in a worker process.
 
-    Returns:
-        The graph of heatmap, xaxis as steps and yaxis as government strictness
+    Returns: (path of the image, seconds taken)
     """
-    column_names = ["steps", "infection"]
-
-    file_names = ["simulation/infection_number_stringent_0.9.csv", "simulation/infection_number_stringent_0.8.csv",
-                  "simulation/infection_number_stringent_0.7.csv", "simulation/infection_number_stringent_0.6.csv",
-                  "simulation/infection_number_stringent_0.5.csv", "simulation/infection_number_stringent_0.4.csv",
-                  "simulation/infection_number_stringent_0.3.csv", "simulation/infection_number_stringent_0.2.csv",
-                  "simulation/infection_number_stringent_0.1.csv", "simulation/infection_number_stringent_0.csv"]
-
-    strictness_list = [0.9, 0.8, 0.7, 0.6, 0.5, 0.4, 0.3, 0.2, 0.1, 0.0]
-    column_names_graph = [
-        "5",
-        "6",
-        "7",
-        "8",
-        "9",
-        "10",
-        "11",
-        "12",
-        "13",
-        "14",
-        "15",
-        "16",
-        "17"]
-    df_to_graph = pd.DataFrame(columns=column_names_graph)
-
-    for i, file in enumerate(file_names):
-        infection_list = []
-
-        df = pd.read_csv(file, names=column_names)
-        infection_list.extend(df['infection'].values.tolist())
-
-        df_to_graph.loc[i] = infection_list[0:13]
-
-    midpoint = (df_to_graph.values.max() - df_to_graph.values.min()) / 2
-
-    heat_map = sns.heatmap(df_to_graph, cmap="Reds", vmin=0.0, vmax=1.0, annot=True,
-                           linewidth=0.3, cbar_kws={"shrink": .8}, yticklabels=strictness_list)
-
-    heat_map.set(xlabel="steps", ylabel="government stringency")
+    plt.switch_backend("Agg")
+    name, function, kwargs = spec
+    path = os.path.join(folder, name + "." + image_format)
 
-    plt.show()
+    start = time.perf_counter()
+    function(output=path, **kwargs)
+    return path, time.perf_counter() - start
 
 
-"""Plot the graph functions"""
+def render_figures(specs, folder, processes=None, image_format="png"):
+    """Render the figures to image files in folder on a pool of processes, printing
+    the time taken by every figure
 
-plot_graph_aspiration_no_government_facet()
-plot_graph_aspiration_government_1_facet()
-plot_graph_aspiration_government_5_facet()
-plot_graph_aspiration_government_9_facet()
-plot_heatmap()
+    Returns: list of (path of the image, seconds taken), in the order the figures finish
+    """
+    os.makedirs(folder, exist_ok=True)
+    renderer = functools.partial(render_figure, folder=folder, image_format=image_format)
+
+    start = time.perf_counter()
+    results = []
+    with multiprocessing.Pool(processes) as pool:
+        for path, seconds in pool.imap_unordered(renderer, specs):
+            results.append((path, seconds))
+            print("{}: {:.2f} s".format(path, seconds))
+    print("{} figures in {:.2f} s".format(len(results), time.perf_counter() - start))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plot the graphs of the parameter sweep")
+    parser.add_argument("--output", help="folder to save the figures in without display, all figures are rendered in parallel")
+    parser.add_argument("--processes", type=int, default=None, help="number of worker processes, all cores by default")
+    parser.add_argument("--format", default="png", help="image format of the saved figures")
+    parser.add_argument("--all-stringencies", action="store_true",
+                        help="one facet graph for every strictness of the sweep instead of 0, 0.1, 0.5 and 0.9")
+    parser.add_argument("--store", default=None, help="read the results store of sweep.py instead of the CSVs")
+    args = parser.parse_args()
+
+    stringencies = batch_run.br_params["government_stringent"] if args.all_stringencies else (0, 0.1, 0.5, 0.9)
+    specs = figure_specs(stringencies, store=args.store)
+
+    if args.output is not None:
+        render_figures(specs, args.output, args.processes, args.format)
+    else:
+        """Plot the graph functions"""
+
+        for name, function, kwargs in specs:
+            function(**kwargs)
@@ -0,0 +1,75 @@
+import math
+
+import numpy as np
+
+"""Course of the infection of the agents, driven by the step at which they got infected"""
+
+
+class ProgressionWheel:
+    def __init__(self, recovery_days):
+        """Timer wheel of the infected agents. Bucket t % size holds the agents infected at
+        step t that are still alive and infected. An infected agent has a death trial every
+        step d days after its infection with recovery_days * 0.666 < d < recovery_days, and
+        recovers at the first step more than recovery_days after it. So only the buckets of
+        those infection steps are due at a step, and agents that are not infected cost nothing.
+
+        Parameters:
+            self.death_days: days after the infection with a death trial
+            self.recovery_day: days after the infection at which the agent recovers
+            self.buckets: list of size lists of agents (unique_id or engine index), one per infection step
+        """
+        self.death_days = [day for day in range(1, math.ceil(recovery_days))
+                           if recovery_days * 0.666 < day < recovery_days]
+        self.recovery_day = math.floor(recovery_days) + 1
+        self.size = self.recovery_day + 1
+        self.buckets = [[] for _ in range(self.size)]
+
+    def add(self, time, agents):
+        """Schedule the agents infected at step time
+        """
+        self.buckets[time % self.size].extend(agents)
+
+    def advance(self, time, death_rate, generator):
+        """Process the events due at step time: one batched death trial with probability
+        death_rate for every agent inside its death window, drawn with the np.random.Generator
+        generator, and recovery of the agents at the end of the infection. Dead and recovered
+        agents leave the wheel.
+
+        Returns: (agents that died, agents that recovered) as int64 arrays
+        """
+        due = [(time - day) % self.size for day in self.death_days if time - day >= 0]
+        at_risk = [np.asarray(self.buckets[bucket], dtype=np.int64) for bucket in due]
+        sizes = [agents.size for agents in at_risk]
+        draws = generator.random(sum(sizes)) < death_rate
+
+        dead = []
+        start = 0
+        for bucket, agents, size in zip(due, at_risk, sizes):
+            died = draws[start:start + size]
+            start = start + size
+            if died.any():
+                dead.append(agents[died])
+                self.buckets[bucket] = agents[~died].tolist()
+        dead = np.concatenate(dead) if dead else np.empty(0, dtype=np.int64)
+
+        recovered = np.empty(0, dtype=np.int64)
+        if time - self.recovery_day >= 0:
+            bucket = (time - self.recovery_day) % self.size
+            recovered = np.asarray(self.buckets[bucket], dtype=np.int64)
+            self.buckets[bucket] = []
+        return dead, recovered
+
+    def scheduled(self):
+        """All agents in the wheel, bucket after bucket
+
+        Returns: (int64 array of agents, int64 array of the number of agents in every bucket)
+        """
+        lengths = np.asarray([len(bucket) for bucket in self.buckets], dtype=np.int64)
+        agents = np.concatenate([np.asarray(bucket, dtype=np.int64) for bucket in self.buckets])
+        return agents, lengths
+
+    def restore(self, agents, lengths):
+        """Put back the buckets returned by scheduled
+        """
+        ends = np.cumsum(lengths)
+        self.buckets = [chunk.tolist() for chunk in np.split(agents, ends[:-1])]
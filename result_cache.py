@@ -0,0 +1,216 @@
+import collections
+import hashlib
+import json
+import os
+import threading
+import types
+
+import numpy as np
+
+from vectorized import EMPTY, ArrayGrid
+
+"""Cache of the finished runs of the interactive server. A run is kept as the state of every
+cell after every step (one byte per cell) and the series of the model reporters, keyed by the
+model parameters including the seed, so a configuration that was run before is replayed
+from the cache instead of simulated again. Runs are kept in memory and on disk, both bounded
+in size, the least recently used runs being evicted first.
+"""
+
+
+"""Changed whenever the model gives other runs for the same parameters and seed, so runs
+cached by an older model are not replayed"""
+MODEL_VERSION = 2
+
+
+def cache_key(params):
+    """Returns: hex digest identifying the model parameters, seed included"""
+    text = json.dumps([MODEL_VERSION, params], sort_keys=True, default=str)
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def record_size(record):
+    """Returns: number of bytes of the arrays of a run record"""
+    return sum(array.nbytes for array in record.values())
+
+
+class ResultCache:
+    def __init__(self, cell_state_method, cell_agent_states, path="simulation/.server_cache",
+                 memory_bytes=64 * 2 ** 20, disk_bytes=2 ** 30):
+        """LRU cache of run records in memory and in the folder at path, shared by all sessions
+
+        Parameters:
+            cell_state_method: function giving the width x height uint8 array of the state of every cell of a model
+            cell_agent_states: (InfectionState, QuarantineState) of the agent shown for every cell state,
+                None for the state of an empty cell
+            self.memory: records in memory, least recently used first
+            self.memory_bytes, self.disk_bytes: size limits of the records in memory and on disk
+            self.counters: number of memory hits, disk hits, misses, evictions from memory and from disk
+        """
+        self.cell_state_method = cell_state_method
+        self.cell_agent_states = cell_agent_states
+        self.path = path
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+
+        self.lock = threading.Lock()
+        self.memory = collections.OrderedDict()
+        self.memory_size = 0
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0,
+                         "memory_evictions": 0, "disk_evictions": 0}
+
+    def file_path(self, key):
+        return os.path.join(self.path, key + ".npz")
+
+    def get(self, key):
+        """Get the record of the run with the given key, from memory or else from disk
+
+        Returns: dictionary of array name to array, None when the run is not cached
+        """
+        with self.lock:
+            record = self.memory.get(key)
+            if record is not None:
+                self.memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return record
+
+        path = self.file_path(key)
+        try:
+            with np.load(path) as file:
+                record = {name: file[name] for name in file.files}
+            os.utime(path)
+        except (OSError, ValueError):
+            with self.lock:
+                self.counters["misses"] += 1
+            return None
+
+        with self.lock:
+            self.counters["disk_hits"] += 1
+            self.keep_in_memory(key, record)
+        return record
+
+    def put(self, key, record):
+        """Add the record of a finished run to memory and disk
+        """
+        with self.lock:
+            self.keep_in_memory(key, record)
+
+        os.makedirs(self.path, exist_ok=True)
+        path = self.file_path(key)
+        temporary = path + ".tmp"
+        with open(temporary, "wb") as file:
+            np.savez_compressed(file, **record)
+        os.replace(temporary, path)
+        self.evict_disk()
+
+    def keep_in_memory(self, key, record):
+        if key in self.memory:
+            self.memory_size -= record_size(self.memory.pop(key))
+        self.memory[key] = record
+        self.memory_size += record_size(record)
+        while self.memory_size > self.memory_bytes and len(self.memory) > 1:
+            old_key, old_record = self.memory.popitem(last=False)
+            self.memory_size -= record_size(old_record)
+            self.counters["memory_evictions"] += 1
+
+    def evict_disk(self):
+        """Remove the least recently used files until the folder fits in disk_bytes
+        """
+        files = []
+        for name in os.listdir(self.path):
+            if name.endswith(".npz"):
+                stat = os.stat(os.path.join(self.path, name))
+                files.append((stat.st_mtime, stat.st_size, name))
+        files.sort()
+        total = sum(size for mtime, size, name in files)
+        for mtime, size, name in files[:-1]:
+            if total <= self.disk_bytes:
+                break
+            os.remove(os.path.join(self.path, name))
+            total -= size
+            with self.lock:
+                self.counters["disk_evictions"] += 1
+
+    def metrics(self):
+        """Returns: dictionary of the hit, miss and eviction counters, the hit rate and the bytes in memory"""
+        with self.lock:
+            metrics = dict(self.counters)
+            metrics["memory_runs"] = len(self.memory)
+            metrics["memory_bytes"] = self.memory_size
+        hits = metrics["memory_hits"] + metrics["disk_hits"]
+        requests = hits + metrics["misses"]
+        metrics["hit_rate"] = hits / requests if requests else 0.0
+        return metrics
+
+    def recorder(self, key, model):
+        """Returns: RunRecorder of a new model with the given key"""
+        return RunRecorder(key, self.cell_state_method, model)
+
+    def replay(self, record):
+        """Returns: ReplayModel of a cached run"""
+        return ReplayModel(record, self.cell_agent_states)
+
+
+class RunRecorder:
+    def __init__(self, key, cell_state_method, model):
+        """Records the cell states of a live model after every step
+
+        Parameters:
+            self.key: cache key of the model parameters
+            self.frames: cell states at the start and after every step
+        """
+        self.key = key
+        self.cell_state_method = cell_state_method
+        self.frames = [np.asarray(cell_state_method(model), dtype=np.uint8)]
+
+    def record(self, model):
+        self.frames.append(np.asarray(self.cell_state_method(model), dtype=np.uint8))
+
+    def result(self, model):
+        """Returns: record of the finished run, the frames and the series of the model reporters"""
+        record = {"frames": np.stack(self.frames)}
+        for name, values in model.datacollector.model_vars.items():
+            record["model_var_" + name] = np.asarray(values)
+        return record
+
+
+class ReplayModel:
+    """Finished run replayed from its record, with the attributes of MainModel that the
+    visualization elements read: the grid and the engine arrays of the current frame, the
+    schedule steps and the reporter series collected so far
+    """
+
+    def __init__(self, record, cell_agent_states):
+        self.frames = record["frames"]
+        self.series = {name[len("model_var_"):]: array.tolist()
+                       for name, array in record.items() if name.startswith("model_var_")}
+        self.width, self.height = self.frames.shape[1:]
+        self.replayed = True
+
+        self.infection_table = np.array([0 if states is None else states[0] for states in cell_agent_states], dtype=np.int8)
+        self.quarantine_table = np.array([0 if states is None else states[1] for states in cell_agent_states], dtype=np.int8)
+        self.empty_state = [states is None for states in cell_agent_states].index(True)
+
+        self.schedule = types.SimpleNamespace(steps=0, time=0)
+        self.datacollector = types.SimpleNamespace(model_vars={})
+        self.engine = types.SimpleNamespace(width=self.width, height=self.height,
+                                            occupancy=np.full((self.width, self.height), EMPTY, dtype=np.int32))
+        self.grid = ArrayGrid(self.engine)
+        self.show(0)
+
+    def show(self, step):
+        """Put the state after step steps in the engine arrays"""
+        states = self.frames[step]
+        x, y = np.nonzero(states != self.empty_state)
+        engine = self.engine
+        engine.x, engine.y = x, y
+        engine.infection = self.infection_table[states[x, y]]
+        engine.quarantine = self.quarantine_table[states[x, y]]
+        engine.occupancy[:] = EMPTY
+        engine.occupancy[x, y] = np.arange(x.size, dtype=np.int32)
+
+        self.schedule.steps = self.schedule.time = step
+        self.datacollector.model_vars = {name: values[:step] for name, values in self.series.items()}
+        self.running = step < len(self.frames) - 1
+
+    def step(self):
+        self.show(self.schedule.steps + 1)
@@ -0,0 +1,133 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+"""Columnar store of the results of the parameter sweep. A store is a folder of .npz parts,
+every part holding the same columns for a chunk of runs, one row per recorded step of a run.
+Parts are written once and never modified, so appending a chunk of runs is one new file.
+"""
+
+COLUMNS = {
+    "aspiration": np.float64,
+    "stringent": np.float64,
+    "seed": np.uint64,
+    "iteration": np.int32,
+    "step": np.int32,
+    "stay_in": np.int32,
+    "go_out": np.int32,
+    "average_aspiration": np.float64,
+    "infection": np.float64,
+}
+
+
+class ResultsStore:
+    def __init__(self, path="simulation/results"):
+        """Store of the sweep results in the folder at path, created on the first append
+
+        Parameters:
+            self.path: folder of the parts of the store
+        """
+        self.path = path
+
+    def parts(self):
+        """Returns: sorted paths of the parts of the store"""
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(os.path.join(self.path, name) for name in os.listdir(self.path)
+                      if name.startswith("part-") and name.endswith(".npz"))
+
+    def append(self, runs):
+        """Add the rows of runs as a new part. The part is written under a temporary name
+        and renamed, so readers never see a partly written part.
+
+        Parameters:
+            runs: list of run_job results of sweep.py
+
+        Returns: path of the new part, None when the runs have no rows
+        """
+        columns = run_columns(runs)
+        if len(columns["step"]) == 0:
+            return None
+
+        os.makedirs(self.path, exist_ok=True)
+        return self._write_part(columns)
+
+    def _write_part(self, columns):
+        parts = self.parts()
+        number = int(os.path.basename(parts[-1])[5:-4]) + 1 if parts else 0
+        path = os.path.join(self.path, "part-{:06d}.npz".format(number))
+        temporary = path + ".tmp"
+        with open(temporary, "wb") as file:
+            np.savez(file, **columns)
+        os.replace(temporary, path)
+        return path
+
+    def columns(self):
+        """Read every part of the store once
+
+        Returns: dictionary of column name to array of all rows
+        """
+        chunks = {name: [] for name in COLUMNS}
+        for path in self.parts():
+            with np.load(path) as part:
+                for name in COLUMNS:
+                    chunks[name].append(part[name])
+        return {name: np.concatenate(chunks[name]) if chunks[name] else np.empty(0, dtype=dtype)
+                for name, dtype in COLUMNS.items()}
+
+    def load(self, aspiration=None, stringent=None, seed=None, steps=None):
+        """Load the rows matching the given values, None selects every value
+
+        Returns: DataFrame with the columns of COLUMNS, sorted by aspiration, stringent, seed and step
+        """
+        columns = self.columns()
+        selected = np.ones(len(columns["step"]), dtype=bool)
+        for name, values in (("aspiration", aspiration), ("stringent", stringent),
+                             ("seed", seed), ("step", steps)):
+            if values is not None:
+                selected &= np.isin(columns[name], np.atleast_1d(values))
+
+        frame = pd.DataFrame({name: column[selected] for name, column in columns.items()})
+        return frame.sort_values(["aspiration", "stringent", "seed", "step"], kind="stable",
+                                 ignore_index=True)
+
+    def compact(self):
+        """Merge all parts into a single one, to be done while nobody appends to the store
+
+        Returns: path of the merged part, None when the store is empty
+        """
+        old_parts = self.parts()
+        if len(old_parts) < 2:
+            return old_parts[0] if old_parts else None
+
+        path = self._write_part(self.columns())
+        for old_part in old_parts:
+            os.remove(old_part)
+        return path
+
+
+def run_columns(runs):
+    """Columns of the rows of the runs that reached their end, one row per recorded step
+
+    Returns: dictionary of column name to array
+    """
+    runs = [run for run in runs if run["finished"]]
+    lengths = [len(run["steps_list"]) for run in runs]
+
+    def joined(name):
+        return np.concatenate([run[name] for run in runs]) if runs else []
+
+    columns = {
+        "aspiration": [run["params"]["global_aspiration"] for run in runs],
+        "stringent": [run["params"]["government_stringent"] for run in runs],
+        "seed": [run["seed"] for run in runs],
+        "iteration": [run["iteration"] for run in runs],
+    }
+    columns = {name: np.repeat(values, lengths) for name, values in columns.items()}
+    columns["step"] = joined("steps_list")
+    columns["stay_in"] = joined("stay_in_list")
+    columns["go_out"] = joined("stay_out_list")
+    columns["average_aspiration"] = joined("aspiration_list")
+    columns["infection"] = joined("infection_list")
+    return {name: np.asarray(columns[name], dtype=dtype) for name, dtype in COLUMNS.items()}
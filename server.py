@@ -1,11 +1,15 @@
-from mesa.visualization.ModularVisualization import ModularServer
 from mesa.visualization.modules import TextElement
 from mesa.visualization.UserParam import UserSettableParameter
+from Visualizatons_module.BackgroundServer import BackgroundServer, CacheStatus, SimulationSpeed
 from Visualizatons_module.CanvasGridVisualization import CanvasGrid
 from Visualizatons_module.ChartVisualization import ChartModule
 from Visualizatons_module.TextDisplay import TextDisplay
 
+import numpy as np
+
 from model import MainModel, InfectionState, QuarantineState
+from result_cache import ResultCache
+from vectorized import EMPTY
 
 """Declare colorcodes for different agent states"""
 
@@ -66,9 +70,62 @@ def draw(agent):
     return portrayal
 
 
+"""Cell states of the packed grid frames, indexed as cell_palette"""
+
+EMPTY_CELL, CLEAN_CELL, RECOVERED_CELL, QUARANTINE_CELL, INFECTED_CELL = range(5)
+cell_palette = ["#ffffff", clean_color, recovered_color, quarantine_color, infected_color]
+
+"""States of the agent drawn for every cell state, used to replay cached runs"""
+cell_agent_states = [None,
+                     (InfectionState.CLEAN, QuarantineState.FREE),
+                     (InfectionState.RECOVERED, QuarantineState.FREE),
+                     (InfectionState.INFECTED, QuarantineState.QUARANTINE),
+                     (InfectionState.INFECTED, QuarantineState.FREE)]
+
+
+def cell_states(model):
+    """Function to give the state of every cell for packed frames, with the colors of draw
+
+    Parameters: model
+
+    Returns: width x height uint8 array of cell states
+    """
+    if model.engine is None:
+        agents = model.schedule.agents
+        x = np.fromiter((a.pos[0] for a in agents), dtype=np.int64, count=len(agents))
+        y = np.fromiter((a.pos[1] for a in agents), dtype=np.int64, count=len(agents))
+        infection = np.fromiter((a.infectionstate for a in agents), dtype=np.int8, count=len(agents))
+        quarantine = np.fromiter((a.quarantinestate for a in agents), dtype=np.int8, count=len(agents))
+    else:
+        engine = model.engine
+        x, y = np.nonzero(engine.occupancy != EMPTY)
+        agents = engine.occupancy[x, y]
+        infection = engine.infection[agents]
+        quarantine = engine.quarantine[agents]
+
+    # Later rules win, as the first matching branch of draw
+    agent_states = np.full(infection.shape, INFECTED_CELL, dtype=np.uint8)
+    agent_states[quarantine == QuarantineState.QUARANTINE] = QUARANTINE_CELL
+    agent_states[infection == InfectionState.RECOVERED] = RECOVERED_CELL
+    agent_states[infection == InfectionState.CLEAN] = CLEAN_CELL
+
+    states = np.full((model.width, model.height), EMPTY_CELL, dtype=np.uint8)
+    states[x, y] = agent_states
+    return states
+
+
+"""Size of the grid, larger grids than 100x100 are sent as packed frames"""
+
+grid_width = 40
+grid_height = 40
+
 space_text_element = SpaceTextElement()
 agent_legend_element = AgentsLegend()
-canvas_element = CanvasGrid(draw, 40, 40, 400, 400)
+if grid_width * grid_height > 100 * 100:
+    canvas_element = CanvasGrid(draw, grid_width, grid_height, 500, 500,
+                                cell_state_method=cell_states, palette=cell_palette)
+else:
+    canvas_element = CanvasGrid(draw, grid_width, grid_height, 400, 400)
 
 
 """Module for line chart one"""
@@ -102,27 +159,41 @@ line_chart_aspiration_comparision = ChartModule([{"Label": "Aspiration",
                                                 title='"Compare aspiration-Stay In numbers-Get out numbers"')
 
 model_legend = TextDisplay()
+simulation_speed = SimulationSpeed()
+
+"""Runs simulated to the end, replayed when the same parameters and seed are used again"""
+result_cache = ResultCache(cell_states, cell_agent_states)
+cache_status = CacheStatus(result_cache)
 
 """Model parameters are passed to the server"""
 
 
 model_params = {
-    "height": 40,
-    "width": 40,
+    "height": grid_height,
+    "width": grid_width,
     "population_density": UserSettableParameter("slider", "Population Density", 0.5, 0.1, 0.8, 0.1),
     "death_rate": 0.02,
     "transfer_rate": UserSettableParameter("slider", "Virus Transfer Rate", 0.3, 0.1, 0.6, 0.1),
     "initial_infection_rate": UserSettableParameter("slider", "Initial Infection Number", 0.02, 0.01, 0.08, 0.01),
     "government_stringent": UserSettableParameter("slider", "Government Strictness", 0.5, 0.0, 0.9, 0.1),
     "government_action_threshold": UserSettableParameter("slider", "Government Action Threshold", 0.3, 0.1, 0.9, 0.1),
-    "global_aspiration": UserSettableParameter("slider", "Global Aspiration", 0.3, 0.1, 0.9, 0.1)
+    "global_aspiration": UserSettableParameter("slider", "Global Aspiration", 0.3, 0.1, 0.9, 0.1),
+    "seed": UserSettableParameter("number", "Random seed", value=0),
+    "steps_per_frame": UserSettableParameter("slider", "Steps per frame", 1, 1, 50, 1)
 }
 
-server = ModularServer(MainModel,
-                       [canvas_element,
-                        model_legend,
-                        space_text_element,
-                        line_chart,
-                        line_chart_aspiration_comparision],
-                       "Infection Model",
-                       model_params)
+"""Every browser has its own model, stepped in the background by max_workers threads; the browser shows
+the latest state at its frame rate"""
+
+server = BackgroundServer(MainModel,
+                          [canvas_element,
+                           model_legend,
+                           simulation_speed,
+                           cache_status,
+                           space_text_element,
+                           line_chart,
+                           line_chart_aspiration_comparision],
+                          "Infection Model",
+                          model_params,
+                          cache=result_cache,
+                          max_workers=4)
@@ -0,0 +1,324 @@
+import argparse
+import functools
+import itertools
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+import batch_run
+import checkpoint
+from results_store import ResultsStore
+
+"""Parallel parameter sweep of batch_run.MainModel. Every (parameter combination, iteration)
+is one job with its own seed, the jobs run on a process pool and the results are handled
+as soon as a run finishes. Run with
+
+    python sweep.py --processes 8
+
+The results of all runs are appended to the columnar ResultsStore in 'simulation/results',
+a chunk of runs at a time. With --csv the sweep also writes the CSVs of python batch_run.py.
+
+With --fork the part of a run before the lockdown, which does not depend on the aspiration
+or the strictness, is simulated once per iteration and every parameter combination continues
+from a snapshot of it. All combinations of an iteration then share the same seed.
+"""
+
+
+def sweep_jobs(params, iterations=1, seed=0):
+    """Jobs of the sweep, in the order BatchRunner runs them: the product of the parameter
+    values in the order of params, with the iterations innermost. Every job gets an
+    independent seed spawned from seed, so a job has the same seed whatever the pool size.
+
+    Returns: list of (job index, parameter dictionary, iteration, seed) tuples
+    """
+    names = list(params)
+    combinations = list(itertools.product(*[params[name] for name in names]))
+    seeds = np.random.SeedSequence(seed).spawn(len(combinations) * iterations)
+
+    jobs = []
+    for combination in combinations:
+        for iteration in range(iterations):
+            index = len(jobs)
+            jobs.append((index, dict(zip(names, combination)), iteration,
+                         int(seeds[index].generate_state(1)[0])))
+    return jobs
+
+
+def run_job(job, max_steps=1000, fixed_params=None):
+    """Run one model of the sweep until it ends or reaches max_steps. Runs in a worker process.
+
+    Returns: dictionary with the job, the graph lists of the run, the final numbers and the run time
+    """
+    index, params, iteration, seed = job
+    start = time.perf_counter()
+
+    model = batch_run.MainModel(seed=seed, save_results=False, **(fixed_params or {}), **params)
+    while model.running and model.schedule.steps < max_steps:
+        model.step()
+
+    return job_result(model, job, start)
+
+
+def job_result(model, job, start):
+    """Returns: the run_job result of a model that stopped running"""
+    index, params, iteration, seed = job
+    return {
+        "index": index,
+        "params": params,
+        "iteration": iteration,
+        "seed": seed,
+        "steps": model.schedule.steps,
+        "finished": not model.running,
+        "stay_in_list": model.stay_in_list,
+        "stay_out_list": model.stay_out_list,
+        "steps_list": model.steps_list,
+        "aspiration_list": model.aspiration_list,
+        "infection_list": model.infection_list,
+        "infected": model.get_infection_number(),
+        "recovered": model.get_recovered_number(),
+        "dead": model.get_dead_number(),
+        "susceptible": model.get_susceptible_number(),
+        "worker": os.getpid(),
+        "seconds": time.perf_counter() - start,
+    }
+
+
+"""Snapshots of the fork mode, set before the variant pool is created so that forked
+workers share them copy-on-write instead of receiving them with every job"""
+_prefix_snapshots = {}
+
+
+def fork_jobs(params, iterations=1, seed=0):
+    """Prefix jobs of the fork mode, one per iteration, each with the variants that
+    continue from it. Variants keep the job index of the same run in sweep_jobs.
+
+    Returns: list of (iteration, seed, list of (job index, parameter dictionary)) tuples
+    """
+    names = list(params)
+    combinations = list(itertools.product(*[params[name] for name in names]))
+    seeds = np.random.SeedSequence(seed).spawn(iterations)
+
+    jobs = []
+    for iteration in range(iterations):
+        variants = [(number * iterations + iteration, dict(zip(names, combination)))
+                    for number, combination in enumerate(combinations)]
+        jobs.append((iteration, int(seeds[iteration].generate_state(1)[0]), variants))
+    return jobs
+
+
+def run_prefix(job, max_steps=1000, fixed_params=None):
+    """Run the part of a run shared by all variants, until the lockdown starts, the run
+    ends or it reaches max_steps. Aspiration and strictness have no effect before the
+    lockdown, so the first variant is used. Runs in a worker process.
+
+    Returns: (iteration, snapshot of the model, seconds taken)
+    """
+    iteration, seed, variants = job
+    start = time.perf_counter()
+
+    model = batch_run.MainModel(seed=seed, save_results=False, **(fixed_params or {}), **variants[0][1])
+    while model.running and model.schedule.steps < max_steps and not model.lockdown:
+        model.step()
+
+    return iteration, checkpoint.snapshot(model), time.perf_counter() - start
+
+
+def run_variant(job, max_steps=1000, snapshot=None):
+    """Continue a prefix snapshot with the aspiration and strictness of one variant until
+    the run ends or reaches max_steps. Runs in a worker process.
+
+    Returns: the run_job result of the variant
+    """
+    index, params, iteration, seed = job[:4]
+    if snapshot is None:
+        snapshot = _prefix_snapshots[iteration]
+    start = time.perf_counter()
+
+    model = checkpoint.restore(snapshot, batch_run.MainModel)
+    model.government_stringent = params["government_stringent"]
+    set_global_aspiration(model, params["global_aspiration"])
+    while model.running and model.schedule.steps < max_steps:
+        model.step()
+
+    return job_result(model, job[:4], start)
+
+
+def set_global_aspiration(model, global_aspiration):
+    """Give every agent of a model that has not been in lockdown before its last step the
+    aspiration global_aspiration, as if the model had been created with it. The average
+    aspiration recorded at the step the lockdown started and the aspiration columns of the
+    data collected so far are computed again.
+    """
+    model.global_aspiration = global_aspiration
+    if model.engine is None:
+        for a in model.schedule.agents:
+            a.aspiration = global_aspiration
+    else:
+        model.engine.aspiration[:] = global_aspiration
+
+    model.population_metrics_step = None
+    if model.aspiration_list:
+        model.aspiration_list[-1] = model.get_avg_aspiration()
+
+    """Before the lockdown every living agent still has the global aspiration, so the sum
+    reported at a collected step is the sum of that many copies of it, added in the order
+    of the reporter: one by one for the agent engine, a NumPy reduction for the others"""
+    datacollector = model.datacollector
+    columns = list(datacollector.model_reporters)
+    values = datacollector.values[:datacollector.steps]
+    living = (model.total_population - values[:, columns.index("Dead")]).astype(np.int64)
+    if model.engine is None:
+        sums = np.concatenate(([0.0], np.cumsum(np.full(model.total_population, global_aspiration))))[living]
+    else:
+        sums = [np.full(number, global_aspiration).sum() for number in living]
+    for name in ("Aspiration", "Average Aspiration"):
+        values[:, columns.index(name)] = sums
+
+
+def fork_results(jobs, max_steps=1000, processes=None, fixed_params=None):
+    """Run the prefixes of the fork jobs, then all variants from the snapshots, on pools
+    of processes (os.cpu_count() when None). Workers are forked where the platform allows
+    it, so the snapshots are shared copy-on-write, otherwise they are sent with the jobs.
+
+    Returns: generator of the run_job results of the variants, in the order the runs finish
+    """
+    prefix_runner = functools.partial(run_prefix, max_steps=max_steps, fixed_params=fixed_params)
+    with multiprocessing.Pool(processes) as pool:
+        prefixes = pool.map(prefix_runner, jobs, chunksize=1)
+
+    _prefix_snapshots.clear()
+    for iteration, snapshot, seconds in prefixes:
+        _prefix_snapshots[iteration] = snapshot
+        print("prefix of iteration {}: {} steps in {:.2f} s".format(
+            iteration, int(snapshot["schedule"][0]), seconds))
+
+    variants = [(index, params, iteration, seed)
+                for iteration, seed, job_variants in jobs for index, params in job_variants]
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+        variant_runner = functools.partial(run_variant, max_steps=max_steps)
+    else:
+        context = multiprocessing.get_context()
+        variants = [variant + (_prefix_snapshots[variant[2]],) for variant in variants]
+        variant_runner = functools.partial(run_variant_with_snapshot, max_steps=max_steps)
+
+    with context.Pool(processes) as pool:
+        for result in pool.imap_unordered(variant_runner, variants):
+            yield result
+
+
+def run_variant_with_snapshot(job, max_steps=1000):
+    """run_variant for a job carrying its snapshot as fifth item, for platforms without fork
+    """
+    return run_variant(job, max_steps, job[4])
+
+
+def sweep_results(jobs, max_steps=1000, processes=None, fixed_params=None):
+    """Run the jobs on a pool of processes (os.cpu_count() when None)
+
+    Returns: generator of the run_job results, in the order the runs finish
+    """
+    runner = functools.partial(run_job, max_steps=max_steps, fixed_params=fixed_params)
+    with multiprocessing.Pool(processes) as pool:
+        for result in pool.imap_unordered(runner, jobs):
+            yield result
+
+
+def save_result(result, written):
+    """Write the CSVs of a finished run. A file shared by several runs keeps the run with
+    the highest job index, which is the one a serial sweep writes last.
+
+    Parameters:
+        written: dictionary of the job index last written to every path, updated in place
+    """
+    if not result["finished"]:
+        return
+
+    params = result["params"]
+    files = [
+        (batch_run.dilemma_csv_path(params["global_aspiration"], params["government_stringent"]),
+         zip(result["steps_list"], result["stay_in_list"], result["stay_out_list"])),
+        (batch_run.infection_csv_path(params["government_stringent"]),
+         zip(result["steps_list"], result["infection_list"])),
+    ]
+    for path, rows in files:
+        if written.get(path, -1) < result["index"]:
+            batch_run.write_csv(path, rows)
+            written[path] = result["index"]
+
+
+def run_sweep(params=batch_run.br_params, iterations=1, max_steps=1000, processes=None,
+              seed=0, fixed_params=None, store="simulation/results", chunk_runs=16, save_csv=False,
+              fork=False):
+    """Run the parameter sweep in parallel, saving the results and printing the progress,
+    the throughput and the utilization of every worker
+
+    Parameters:
+        store: folder of the ResultsStore the runs are appended to, None to not store them
+        chunk_runs: number of finished runs written together as one part of the store
+        save_csv: also write the CSVs of batch_run.py
+        fork: simulate the part before the lockdown once per iteration and continue every
+            parameter combination from it
+
+    Returns: list of the run_job results, in job order
+    """
+    if fork:
+        jobs = fork_jobs(params, iterations, seed)
+        total = sum(len(variants) for iteration, seed, variants in jobs)
+        results_generator = fork_results(jobs, max_steps, processes, fixed_params)
+    else:
+        jobs = sweep_jobs(params, iterations, seed)
+        total = len(jobs)
+        results_generator = sweep_results(jobs, max_steps, processes, fixed_params)
+    store = None if store is None else ResultsStore(store)
+    pending = []
+    written = {}
+    busy = {}
+    results = []
+
+    start = time.perf_counter()
+    for result in results_generator:
+        results.append(result)
+        busy[result["worker"]] = busy.get(result["worker"], 0) + result["seconds"]
+        if save_csv:
+            save_result(result, written)
+        if store is not None:
+            pending.append(result)
+            if len(pending) >= chunk_runs:
+                store.append(pending)
+                pending = []
+
+        elapsed = time.perf_counter() - start
+        print("[{}/{}] {} iteration {}: {} steps in {:.2f} s, {:.1f} runs/min".format(
+            len(results), total, result["params"], result["iteration"], result["steps"],
+            result["seconds"], len(results) / elapsed * 60))
+
+    if store is not None and pending:
+        store.append(pending)
+
+    elapsed = time.perf_counter() - start
+    print("{} runs in {:.1f} s, {:.1f} runs/min".format(len(results), elapsed, len(results) / elapsed * 60))
+    for worker, seconds in sorted(busy.items()):
+        print("worker {}: busy {:.1f} s, utilization {:.0%}".format(worker, seconds, seconds / elapsed))
+
+    return sorted(results, key=lambda result: result["index"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the parameter sweep of batch_run.py in parallel")
+    parser.add_argument("--processes", type=int, default=None, help="number of worker processes, all cores by default")
+    parser.add_argument("--iterations", type=int, default=1)
+    parser.add_argument("--max-steps", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0, help="root seed of the seeds of the runs")
+    parser.add_argument("--store", default="simulation/results", help="folder of the results store")
+    parser.add_argument("--chunk-runs", type=int, default=16, help="runs written per part of the store")
+    parser.add_argument("--csv", action="store_true", help="also write the CSVs of batch_run.py")
+    parser.add_argument("--fork", action="store_true",
+                        help="simulate the steps before the lockdown once per iteration and fork all combinations from it")
+    args = parser.parse_args()
+
+    run_sweep(iterations=args.iterations, max_steps=args.max_steps, processes=args.processes,
+              seed=args.seed, store=args.store, chunk_runs=args.chunk_runs, save_csv=args.csv,
+              fork=args.fork)
@@ -0,0 +1,107 @@
+import random
+
+import numpy as np
+import pytest
+
+from cell_pool import EmptyCellPool, sample_distinct
+from model import MainModel
+
+WIDTH, HEIGHT = 12, 9
+
+
+def assert_pool_matches(pool, occupied):
+    """The pool holds exactly the empty cells of the grid, once each, and the index points
+    every empty cell to its position in the dense array and every occupied cell to -1
+    """
+    cells = pool.cells[:pool.size]
+    assert np.unique(cells).size == pool.size
+    assert set(cells.tolist()) == set(np.flatnonzero(~occupied.reshape(-1)).tolist())
+    np.testing.assert_array_equal(pool.index[cells], np.arange(pool.size))
+    np.testing.assert_array_equal(pool.index[occupied.reshape(-1)], -1)
+    assert len(pool) == pool.size
+
+
+def take(occupied, cells):
+    """Mark the flat cells as occupied, they must have been empty"""
+    assert not occupied.reshape(-1)[cells].any()
+    occupied.reshape(-1)[cells] = True
+
+
+def free(occupied, cells):
+    """Mark the flat cells as empty, they must have been occupied"""
+    assert occupied.reshape(-1)[cells].all()
+    occupied.reshape(-1)[cells] = False
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_interleaved_operations_keep_the_index(seed):
+    generator = np.random.default_rng(seed)
+    stream = random.Random(seed)
+    occupied = generator.random((WIDTH, HEIGHT)) < 0.5
+    pool = EmptyCellPool(WIDTH, HEIGHT, occupied)
+    assert_pool_matches(pool, occupied)
+
+    for _ in range(400):
+        empty = np.flatnonzero(~occupied.reshape(-1))
+        full = np.flatnonzero(occupied.reshape(-1))
+        operation = generator.integers(6)
+        if operation == 0 and empty.size:
+            cell = int(generator.choice(empty))
+            pool.claim(divmod(cell, HEIGHT))
+            take(occupied, [cell])
+        elif operation == 1 and full.size:
+            cell = int(generator.choice(full))
+            pool.release(divmod(cell, HEIGHT))
+            free(occupied, [cell])
+        elif operation == 2 and empty.size:
+            x, y = pool.claim_random(stream)
+            take(occupied, [x * HEIGHT + y])
+        elif operation == 3:
+            claimed = pool.claim_random_many(int(generator.integers(empty.size + 1)), generator)
+            assert np.unique(claimed).size == claimed.size
+            take(occupied, claimed)
+        elif operation == 4:
+            released = generator.choice(full, int(generator.integers(full.size + 1)), replace=False)
+            pool.release_many(released)
+            free(occupied, released)
+        elif operation == 5:
+            movers = generator.choice(full, int(generator.integers(full.size + 1)), replace=False)
+            new_cells = pool.relocate(movers, generator)
+            assert np.unique(new_cells).size == movers.size
+            free(occupied, movers)
+            take(occupied, new_cells)
+        assert_pool_matches(pool, occupied)
+
+
+def test_claim_random_many_takes_every_cell():
+    occupied = np.zeros((WIDTH, HEIGHT), dtype=bool)
+    pool = EmptyCellPool(WIDTH, HEIGHT, occupied)
+    claimed = pool.claim_random_many(WIDTH * HEIGHT, np.random.default_rng(0))
+    assert sorted(claimed.tolist()) == list(range(WIDTH * HEIGHT))
+    assert pool.size == 0
+    with pytest.raises(Exception):
+        pool.claim_random_many(1, np.random.default_rng(0))
+
+
+@pytest.mark.parametrize("population, number", [(1000, 5), (1000, 400), (7, 7)])
+def test_sample_distinct(population, number):
+    sample = sample_distinct(population, number, np.random.default_rng(3))
+    assert sample.size == number
+    assert np.unique(sample).size == number
+    assert sample.min() >= 0 and sample.max() < population
+
+
+def test_agent_model_keeps_pool_and_grid_in_sync():
+    model = MainModel(population_density=0.6, death_rate=0.1, transfer_rate=0.1, initial_infection_rate=0.1,
+                      width=WIDTH, height=HEIGHT, government_stringent=0.5, government_action_threshold=0.05,
+                      global_aspiration=0.5, seed=4)
+    for _ in range(30):
+        if not model.running:
+            break
+        model.step()
+        occupied = np.zeros((WIDTH, HEIGHT), dtype=bool)
+        for agent in model.schedule.agents:
+            occupied[agent.pos] = True
+        assert_pool_matches(model.empty_cells, occupied)
+        assert set(model.grid.empties) == {divmod(int(cell), HEIGHT)
+                                           for cell in model.empty_cells.cells[:model.empty_cells.size]}
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+import checkpoint
+from model import MainModel
+from transition_log import TransitionLog
+
+"""A small model which reaches the lockdown, so the social dilemma runs after the checkpoint"""
+PARAMS = dict(population_density=0.5, death_rate=0.05, transfer_rate=0.1, initial_infection_rate=0.05,
+              width=30, height=30, government_stringent=0.5, government_action_threshold=0.05,
+              global_aspiration=0.5, seed=11)
+STEPS = 40
+
+
+def run_to_end(model):
+    """Step model until it stops or reaches STEPS steps"""
+    while model.running and model.schedule.steps < STEPS:
+        model.step()
+    return model
+
+
+def random_states(model):
+    """Returns: states of the two random number generators of model"""
+    return model.random.getstate(), model.generator.bit_generator.state
+
+
+@pytest.mark.parametrize("engine", ["agent", "vectorized"])
+@pytest.mark.parametrize("background", [False, True])
+def test_restored_model_continues_as_uninterrupted_run(engine, background, tmp_path):
+    uninterrupted = run_to_end(MainModel(engine=engine, **PARAMS))
+
+    model = MainModel(engine=engine, **PARAMS)
+    for _ in range(8):
+        model.step()
+    path = str(tmp_path / "model.npz")
+    thread = checkpoint.save(model, path, background=background)
+    if background:
+        thread.join()
+    restored = run_to_end(checkpoint.load(path))
+
+    assert restored.schedule.steps == uninterrupted.schedule.steps
+    assert restored.lockdown and uninterrupted.lockdown
+    np.testing.assert_array_equal(restored.datacollector.to_dataframe().values,
+                                  uninterrupted.datacollector.to_dataframe().values)
+    assert random_states(restored) == random_states(uninterrupted)
+
+
+@pytest.mark.parametrize("engine", ["agent", "vectorized"])
+def test_snapshot_restores_several_times(engine):
+    model = MainModel(engine=engine, **PARAMS)
+    for _ in range(5):
+        model.step()
+    state = checkpoint.snapshot(model)
+
+    first = run_to_end(checkpoint.restore(state))
+    second = run_to_end(checkpoint.restore(state))
+    np.testing.assert_array_equal(first.datacollector.to_dataframe().values,
+                                  second.datacollector.to_dataframe().values)
+
+
+def test_save_refuses_tiled_engine(tmp_path):
+    model = MainModel(engine="tiled", tiles=2, **PARAMS)
+    try:
+        model.step()
+        with pytest.raises(ValueError):
+            checkpoint.save(model, str(tmp_path / "model.npz"))
+    finally:
+        model.engine.close()
+    assert not (tmp_path / "model.npz").exists()
+
+
+def test_save_refuses_transition_log(tmp_path):
+    model = MainModel(engine="vectorized", log=TransitionLog(), **PARAMS)
+    model.step()
+    with pytest.raises(ValueError):
+        checkpoint.save(model, str(tmp_path / "model.npz"))
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from model import MainModel, InfectionState
+import vectorized
+
+PARAMS = dict(population_density=0.5, death_rate=0.05, transfer_rate=0.1, initial_infection_rate=0.02,
+              width=30, height=24, government_stringent=0.5, government_action_threshold=0.05,
+              global_aspiration=0.5, seed=9, frontier_data=True)
+ENGINES = [("agent", {}), ("vectorized", {}), ("tiled", {"tiles": 1}), ("tiled", {"tiles": 3})]
+
+
+def brute_force_frontier(model):
+    """Returns: number of susceptible agents with an infected Moore neighbour, searched on the whole grid"""
+    states = np.full((model.width, model.height), -1)
+    for agent, x, y in model.grid.coord_iter():
+        if agent is not None:
+            states[x, y] = agent.infectionstate
+    infected = vectorized.moore_neighbour_count(states == InfectionState.INFECTED)
+    return int(np.count_nonzero((states == InfectionState.CLEAN) & (infected > 0)))
+
+
+@pytest.mark.parametrize("followed", [False, True])
+@pytest.mark.parametrize("engine, options", ENGINES)
+def test_frontier_matches_whole_grid_search(engine, options, followed, monkeypatch):
+    if followed:
+        """Follow every change, however large, instead of counting the frontier again"""
+        monkeypatch.setattr(vectorized.Frontier, "CHANGED_FRACTION", 1000)
+        monkeypatch.setattr(vectorized.Frontier, "WATCHED_FRACTION", 1000)
+    model = MainModel(engine=engine, **PARAMS, **options)
+    try:
+        sizes = []
+        while model.running and model.schedule.steps < 40:
+            assert model.get_frontier_size() == brute_force_frontier(model)
+            sizes.append(model.get_frontier_size())
+            model.step()
+        assert max(sizes) > 0
+    finally:
+        if engine == "tiled":
+            model.engine.close()
+
+
+def test_frontier_does_not_change_the_run():
+    results = []
+    for frontier_data in (False, True):
+        model = MainModel(engine="vectorized", **dict(PARAMS, frontier_data=frontier_data))
+        while model.running and model.schedule.steps < 40:
+            model.step()
+        results.append(model.datacollector.to_dataframe().drop(columns="Frontier", errors="ignore").values)
+    np.testing.assert_array_equal(results[0], results[1])
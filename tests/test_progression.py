@@ -0,0 +1,123 @@
+import numpy as np
+import pytest
+
+from progression import ProgressionWheel
+
+"""Integer and non-integer lengths of the infection, down to less than a day"""
+RECOVERY_DAYS = [14, 14.5, 10.2, 3, 2.9, 1, 0.5]
+
+
+def in_death_window(days, recovery_days):
+    """The per-agent rule of the original model: a death trial every step inside the window"""
+    return recovery_days * 0.666 < days < recovery_days
+
+
+def recovers(days, recovery_days):
+    """The per-agent rule of the original model: recovery once the infection is over"""
+    return days > recovery_days
+
+
+def old_rule(infected_time, recovery_days, death_rate, steps):
+    """Step of death and of recovery of every agent with the original per-agent rule, where
+    death_rate 0 or 1 makes every death trial certain
+
+    Returns: (dictionary of agent to step of death, dictionary of agent to step of recovery)
+    """
+    dead, recovered = {}, {}
+    for time in range(steps):
+        for agent, infected in infected_time.items():
+            if agent in dead or agent in recovered or infected > time:
+                continue
+            days = time - infected
+            if in_death_window(days, recovery_days) and death_rate == 1:
+                dead[agent] = time
+            elif recovers(days, recovery_days):
+                recovered[agent] = time
+    return dead, recovered
+
+
+class CountingGenerator:
+    """Stands in for np.random.Generator: records the number of draws of every call and
+    returns draws which are all deaths or all survivals"""
+    def __init__(self, value):
+        self.value = value
+        self.calls = []
+
+    def random(self, size):
+        self.calls.append(size)
+        return np.full(size, self.value)
+
+
+def run_wheel(infected_time, recovery_days, death_rate, steps):
+    """Add the agents at their infection step, one add per agent as the agent engine does,
+    and advance the wheel every step
+
+    Returns: (dictionary of agent to step of death, dictionary of agent to step of recovery,
+            number of death trials at every step)
+    """
+    wheel = ProgressionWheel(recovery_days)
+    generator = CountingGenerator(0.0 if death_rate == 1 else 1.0)
+    dead, recovered = {}, {}
+    for time in range(steps):
+        for agent, infected in infected_time.items():
+            if infected == time:
+                wheel.add(time, [agent])
+        died, healed = wheel.advance(time, death_rate, generator)
+        dead.update((agent, time) for agent in died.tolist())
+        recovered.update((agent, time) for agent in healed.tolist())
+    return dead, recovered, generator.calls
+
+
+def infections(seed, agents=60, steps=40):
+    """Infection steps of agents, several of them infected at the same step"""
+    return dict(enumerate(np.random.default_rng(seed).integers(0, steps, agents).tolist()))
+
+
+@pytest.mark.parametrize("recovery_days", RECOVERY_DAYS)
+def test_recovery_day_matches_old_rule(recovery_days):
+    infected_time = infections(1)
+    dead, recovered, _ = run_wheel(infected_time, recovery_days, 0, 80)
+    assert dead == {}
+    assert recovered == old_rule(infected_time, recovery_days, 0, 80)[1]
+    assert len(recovered) == len(infected_time)
+
+
+@pytest.mark.parametrize("recovery_days", RECOVERY_DAYS)
+def test_death_day_matches_old_rule(recovery_days):
+    infected_time = infections(2)
+    dead, recovered, _ = run_wheel(infected_time, recovery_days, 1, 80)
+    assert (dead, recovered) == old_rule(infected_time, recovery_days, 1, 80)
+
+
+@pytest.mark.parametrize("recovery_days", RECOVERY_DAYS)
+def test_death_trials_match_old_rule(recovery_days):
+    infected_time = infections(3)
+    _, _, trials = run_wheel(infected_time, recovery_days, 0, 80)
+    expected = [sum(1 for infected in infected_time.values()
+                    if time >= infected and in_death_window(time - infected, recovery_days))
+                for time in range(80)]
+    assert trials == expected
+
+
+def test_same_step_infections_share_their_days():
+    infected_time = {agent: 5 for agent in range(10)}
+    infected_time.update({agent: 6 for agent in range(10, 15)})
+    _, recovered, _ = run_wheel(infected_time, 14, 0, 30)
+    assert {agent: step for agent, step in recovered.items() if agent < 10} == {agent: 20 for agent in range(10)}
+    assert {agent: step for agent, step in recovered.items() if agent >= 10} == {agent: 21 for agent in range(10, 15)}
+
+    dead, _, _ = run_wheel(infected_time, 14, 1, 30)
+    assert dead == {agent: 5 + 10 if agent < 10 else 6 + 10 for agent in range(15)}
+
+
+def test_restore_keeps_the_schedule():
+    wheel = ProgressionWheel(4.5)
+    for time in range(4):
+        wheel.add(time, [time, time + 10])
+        wheel.advance(time, 0, CountingGenerator(1.0))
+    restored = ProgressionWheel(4.5)
+    restored.restore(*wheel.scheduled())
+    for time in range(4, 12):
+        expected = wheel.advance(time, 0, CountingGenerator(1.0))
+        actual = restored.advance(time, 0, CountingGenerator(1.0))
+        np.testing.assert_array_equal(actual[1], expected[1])
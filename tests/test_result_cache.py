@@ -0,0 +1,95 @@
+import os
+
+import numpy as np
+
+from model import MainModel
+from result_cache import ResultCache, cache_key
+from server import cell_agent_states, cell_states
+
+PARAMS = dict(population_density=0.5, death_rate=0.05, transfer_rate=0.1, initial_infection_rate=0.05,
+              width=20, height=15, government_stringent=0.5, government_action_threshold=0.05,
+              global_aspiration=0.5, seed=4)
+
+
+def record_of(size, value=0):
+    """A run record of size bytes"""
+    return {"frames": np.full(size, value, dtype=np.uint8)}
+
+
+def save_one(folder, record):
+    """Write record in folder as the cache does
+
+    Returns: path of the file
+    """
+    cache = ResultCache(cell_states, cell_agent_states, path=str(folder))
+    cache.put("probe", record)
+    return cache.file_path("probe")
+
+
+def test_cache_key():
+    assert cache_key({"a": 1, "seed": 2}) == cache_key({"seed": 2, "a": 1})
+    assert cache_key({"a": 1, "seed": 2}) != cache_key({"a": 1, "seed": 3})
+
+
+def test_replay_shows_the_recorded_run(tmp_path):
+    cache = ResultCache(cell_states, cell_agent_states, path=str(tmp_path))
+    key = cache_key(PARAMS)
+    assert cache.get(key) is None
+
+    model = MainModel(engine="vectorized", **PARAMS)
+    recorder = cache.recorder(key, model)
+    frames = [cell_states(model)]
+    while model.running:
+        model.step()
+        recorder.record(model)
+        frames.append(cell_states(model))
+    cache.put(key, recorder.result(model))
+
+    """A new cache, as after a restart of the server, reads the run from disk"""
+    cache = ResultCache(cell_states, cell_agent_states, path=str(tmp_path))
+    record = cache.get(key)
+    assert cache.metrics()["disk_hits"] == 1
+    replay = cache.replay(record)
+    for step, frame in enumerate(frames):
+        assert replay.schedule.steps == step
+        np.testing.assert_array_equal(cell_states(replay), frame)
+        for name, values in model.datacollector.model_vars.items():
+            assert replay.datacollector.model_vars[name] == values[:step].tolist()
+        assert replay.running == (step < len(frames) - 1)
+        if replay.running:
+            replay.step()
+
+    assert cache.get(key) is record
+    assert cache.metrics()["memory_hits"] == 1
+
+
+def test_memory_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(cell_states, cell_agent_states, path=str(tmp_path), memory_bytes=250)
+    for key in "abc":
+        cache.put(key, record_of(100))
+    assert list(cache.memory) == ["b", "c"]
+    assert cache.metrics()["memory_evictions"] == 1
+    assert cache.metrics()["memory_bytes"] == 200
+
+    cache.get("b")
+    cache.put("d", record_of(100))
+    assert list(cache.memory) == ["b", "d"]
+
+    """Evicted from memory, still on disk"""
+    np.testing.assert_array_equal(cache.get("a")["frames"], record_of(100)["frames"])
+    assert cache.metrics()["disk_hits"] == 1
+    assert cache.get("missing") is None
+    assert cache.metrics()["misses"] == 1
+
+
+def test_disk_evicts_least_recently_used(tmp_path):
+    generator = np.random.default_rng(0)
+    records = {key: {"frames": generator.integers(0, 255, 4000, dtype=np.uint8)} for key in "abcd"}
+    size = os.path.getsize(save_one(tmp_path / "probe", records["a"]))
+    cache = ResultCache(cell_states, cell_agent_states, path=str(tmp_path / "cache"),
+                        memory_bytes=0, disk_bytes=int(2.5 * size))
+    for time, key in enumerate("abcd"):
+        cache.put(key, records[key])
+        os.utime(cache.file_path(key), (time, time))
+    assert sorted(os.listdir(cache.path)) == ["c.npz", "d.npz"]
+    assert cache.metrics()["disk_evictions"] == 2
@@ -0,0 +1,69 @@
+import os
+
+import numpy as np
+
+from results_store import COLUMNS, ResultsStore
+
+
+def make_run(aspiration, stringent, seed, steps, finished=True, iteration=0):
+    """A run_job result of sweep.py with steps recorded steps"""
+    return {
+        "params": {"global_aspiration": aspiration, "government_stringent": stringent},
+        "iteration": iteration,
+        "seed": seed,
+        "finished": finished,
+        "steps_list": list(range(1, steps + 1)),
+        "stay_in_list": [seed + step for step in range(steps)],
+        "stay_out_list": [seed - step for step in range(steps)],
+        "aspiration_list": [aspiration / (step + 1) for step in range(steps)],
+        "infection_list": [float(step) for step in range(steps)],
+    }
+
+
+def test_append_and_load(tmp_path):
+    store = ResultsStore(str(tmp_path / "results"))
+    assert store.parts() == []
+    assert len(store.load()) == 0
+
+    first = store.append([make_run(0.5, 0.2, 7, 3), make_run(0.1, 0.2, 8, 2)])
+    second = store.append([make_run(0.5, 0.8, 9, 4), make_run(0.3, 0.8, 10, 5, finished=False)])
+    assert store.parts() == [first, second]
+    assert not any(name.endswith(".tmp") for name in os.listdir(store.path))
+
+    frame = store.load()
+    assert list(frame.columns) == list(COLUMNS)
+    assert len(frame) == 3 + 2 + 4
+    assert frame[["aspiration", "stringent", "seed"]].drop_duplicates().values.tolist() == [
+        [0.1, 0.2, 8], [0.5, 0.2, 7], [0.5, 0.8, 9]]
+    for name, dtype in COLUMNS.items():
+        assert frame[name].dtype == dtype
+
+    run = store.load(aspiration=0.5, stringent=0.2)
+    assert run["step"].tolist() == [1, 2, 3]
+    assert run["stay_in"].tolist() == [7, 8, 9]
+    assert run["go_out"].tolist() == [7, 6, 5]
+    np.testing.assert_allclose(run["average_aspiration"], [0.5, 0.25, 0.5 / 3])
+    assert store.load(seed=[8, 9], steps=2)["seed"].tolist() == [8, 9]
+
+
+def test_unfinished_runs_make_no_part(tmp_path):
+    store = ResultsStore(str(tmp_path / "results"))
+    assert store.append([make_run(0.5, 0.2, 7, 3, finished=False)]) is None
+    assert store.append([]) is None
+    assert store.parts() == []
+
+
+def test_compact_keeps_the_rows(tmp_path):
+    store = ResultsStore(str(tmp_path / "results"))
+    for seed in range(4):
+        store.append([make_run(0.1 * seed, 0.5, seed, seed + 1)])
+    before = store.load()
+
+    merged = store.compact()
+    assert store.parts() == [merged]
+    after = store.load()
+    assert after.equals(before)
+
+    assert store.compact() == merged
+    later = store.append([make_run(0.9, 0.5, 99, 2)])
+    assert store.parts() == [merged, later]
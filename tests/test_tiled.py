@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from agent import STAY_IN
+from model import MainModel, InfectionState
+from vectorized import EMPTY
+
+PARAMS = dict(population_density=0.5, death_rate=0.05, transfer_rate=0.1, initial_infection_rate=0.05,
+              width=30, height=24, government_stringent=0.5, government_action_threshold=0.05,
+              global_aspiration=0.5, seed=6)
+STEPS = 40
+
+
+def steps(model):
+    """Step model until it stops or reaches STEPS steps, yielding after every step"""
+    while model.running and model.schedule.steps < STEPS:
+        model.step()
+        yield model
+
+
+def assert_consistent(model):
+    """Every live agent stands alone on its cell, the empty cells are the cells of no live
+    agent and the counters of the model match the states of the agents"""
+    engine = model.engine
+    alive = np.flatnonzero(engine.alive)
+    np.testing.assert_array_equal(engine.occupancy[engine.x[alive], engine.y[alive]], alive)
+    assert np.count_nonzero(engine.occupancy != EMPTY) == alive.size
+    assert model.infection_counts == np.bincount(engine.infection, minlength=len(InfectionState)).tolist()
+    assert np.all(engine.infection[~engine.alive] == InfectionState.DEAD)
+    if model.schedule.steps > 0:
+        assert model.stay_in_count == np.count_nonzero(engine.action[alive] == STAY_IN)
+        assert model.stay_in_count + model.go_out_count == alive.size
+
+
+@pytest.mark.parametrize("tiles", [1, 2, 3, 30])
+def test_tiles_keep_the_agents_consistent(tiles):
+    model = MainModel(engine="tiled", tiles=tiles, **PARAMS)
+    try:
+        assert_consistent(model)
+        for _ in steps(model):
+            assert_consistent(model)
+        assert model.lockdown
+        assert model.get_dead_number() > 0 and model.get_recovered_number() > 0
+    finally:
+        model.engine.close()
+
+
+def test_same_seed_and_tiles_repeat_the_run():
+    results = []
+    for _ in range(2):
+        model = MainModel(engine="tiled", tiles=3, **PARAMS)
+        try:
+            for _ in steps(model):
+                pass
+        finally:
+            model.engine.close()
+        results.append(model.datacollector.to_dataframe().values)
+    np.testing.assert_array_equal(results[0], results[1])
+
+
+def test_crowded_grid_moves_every_agent_to_a_free_cell():
+    """With fewer empty cells than movers, the cells left are released before the new ones are claimed"""
+    model = MainModel(engine="tiled", tiles=3, **dict(PARAMS, population_density=0.95))
+    try:
+        for _ in steps(model):
+            assert_consistent(model)
+    finally:
+        model.engine.close()
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+from model import MainModel
+import transition_log
+from transition_log import TransitionLog
+
+PARAMS = dict(population_density=0.5, death_rate=0.05, transfer_rate=0.1, initial_infection_rate=0.05,
+              width=30, height=30, government_stringent=0.5, government_action_threshold=0.05,
+              global_aspiration=0.5, seed=2)
+ENGINES = [("agent", {}), ("vectorized", {}), ("tiled", {"tiles": 2})]
+STEPS = 40
+
+
+def run(engine, options, log=None, **params):
+    """Run a model with every agent recorded at every step until it stops or reaches STEPS steps
+
+    Returns: the model, its engine closed
+    """
+    model = MainModel(engine=engine, log=log, agent_data_every=1, **dict(PARAMS, **params), **options)
+    try:
+        while model.running and model.schedule.steps < STEPS:
+            model.step()
+    finally:
+        if engine == "tiled":
+            model.engine.close()
+    return model
+
+
+@pytest.mark.parametrize("engine, options", ENGINES)
+def test_series_match_model_reporters(engine, options):
+    log = TransitionLog()
+    model = run(engine, options, log)
+    series = log.series()
+    reporters = model.datacollector.to_dataframe()
+    assert log.steps == model.schedule.steps
+    for name in ("Susceptible", "Infected", "Recovered", "Dead", "Stay In", "Go Out"):
+        np.testing.assert_array_equal(series[name][:len(reporters)], reporters[name].values)
+    assert series["Dead"][-1] > 0 and series["Recovered"][-1] > 0
+
+
+@pytest.mark.parametrize("engine, options", ENGINES)
+def test_trajectories_match_agent_records(engine, options):
+    log = TransitionLog()
+    model = run(engine, options, log)
+    records = model.datacollector.agent_table()
+    trajectories = np.stack([log.trajectory(unique_id) for unique_id in range(log.agents)])
+
+    steps, unique_ids = records[:, 0], records[:, 1]
+    np.testing.assert_array_equal(trajectories[unique_ids, steps, transition_log.INFECTION], records[:, 3])
+    np.testing.assert_array_equal(trajectories[unique_ids, steps, transition_log.QUARANTINE], records[:, 2])
+
+
+@pytest.mark.parametrize("engine, options", ENGINES)
+def test_log_does_not_change_the_run(engine, options):
+    logged = run(engine, options, TransitionLog())
+    plain = run(engine, options)
+    np.testing.assert_array_equal(logged.datacollector.to_dataframe().values,
+                                  plain.datacollector.to_dataframe().values)
+
+
+def test_file_log_loads_the_same_events(tmp_path):
+    path = str(tmp_path / "run.tlog")
+    log = TransitionLog(path)
+    run("vectorized", {}, log)
+    memory = TransitionLog()
+    run("vectorized", {}, memory)
+
+    loaded = TransitionLog.load(path)
+    np.testing.assert_array_equal(loaded.events(), memory.events())
+    assert loaded.agents == memory.agents
+    assert loaded.nbytes() == memory.nbytes()
+    for name, values in memory.series().items():
+        np.testing.assert_array_equal(loaded.series()[name], values[:loaded.steps + 1])
+
+
+def test_log_without_actions():
+    log = TransitionLog(actions=False)
+    run("agent", {}, log)
+    events = log.events()
+    assert not np.any(events["kind"] == transition_log.ACTION)
+    assert "Stay In" not in log.series()
+    assert np.all(log.trajectory(0)[:, transition_log.ACTION] == transition_log.NO_ACTION)
+
+
+def test_dead_agents_have_no_action():
+    log = TransitionLog()
+    model = run("vectorized", {}, log)
+    dead = np.flatnonzero(~model.engine.alive)
+    assert dead.size > 0
+    for unique_id in dead[:10].tolist():
+        trajectory = log.trajectory(unique_id)
+        died = np.flatnonzero(trajectory[:, transition_log.INFECTION] == transition_log.InfectionState.DEAD)[0]
+        assert np.all(trajectory[died:, transition_log.ACTION] == transition_log.NO_ACTION)
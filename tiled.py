@@ -0,0 +1,637 @@
+import contextlib
+import multiprocessing
+import os
+import traceback
+import weakref
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from agent import InfectionState, QuarantineState, ACTIONS, STAY_IN, NO_ACTION
+from cell_pool import EmptyCellPool
+from vectorized import (INITIAL_ACTION_PROB, EMPTY, NEIGHBOUR_DX, NEIGHBOUR_DY, ArrayGrid, Frontier,
+                        apply_stringency, sample_actions, social_dilemma_update)
+
+"""Tiled engine for MainModel on very large grids. The torus is cut into bands of rows
+(tiles), every tile is owned by a worker process, and the arrays of the agents and the
+occupancy grid live in shared memory, with the layout of the VectorizedEngine.
+
+A worker only writes the agents standing on its tile and the cells of its tile. A step is
+a sequence of phases run by all workers at once, the master waits for every worker at the
+end of each phase:
+
+    pick_actions    every agent picks its action and its turn in the step
+    send            movers are handed off to the tiles of their new cells
+    receive         every tile places the movers it receives on its own empty cells
+    spread          infections are drawn from the Moore neighbourhood, which reads the
+                    boundary row of each neighbouring tile (halo), with the turns of the
+                    agents as in VectorizedEngine.action_outcome_spread
+    infect          the infections drawn are applied, then spread_round draws the
+                    infections by the agents infected in the last round and infect applies
+                    them, until a round infects no agent
+    update          the social dilemma, deaths and recoveries
+
+The master keeps the model counters from the numbers returned by the workers. The random
+numbers of every tile come from its own stream, so runs agree with the other engines
+statistically, not step by step.
+"""
+
+"""Dtype and number of columns of the shared arrays of the agents"""
+AGENT_ARRAYS = {
+    "x": (np.int32, None),
+    "y": (np.int32, None),
+    "infection": (np.int8, None),
+    "quarantine": (np.int8, None),
+    "infected_time": (np.int32, None),
+    "aspiration": (np.float64, None),
+    "action_prob": (np.float64, len(ACTIONS)),
+    "action": (np.int8, None),
+    "alive": (np.bool_, None),
+    "outbox": (np.int32, None),
+    "turn": (np.float64, None),
+    "infected_round": (np.int32, None),
+}
+
+
+class SharedArrays:
+    def __init__(self, specs, names=None):
+        """NumPy arrays in shared memory blocks, created by the master and attached by the workers
+
+        Parameters:
+            specs: dictionary of array name to (shape, dtype)
+            names: dictionary of array name to the name of its block, None to create the blocks
+            self.arrays: dictionary of array name to the array over its block
+        """
+        self.specs = specs
+        self.blocks = {}
+        self.arrays = {}
+        for name, (shape, dtype) in specs.items():
+            size = max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+            if names is None:
+                block = shared_memory.SharedMemory(create=True, size=size)
+            else:
+                block = shared_memory.SharedMemory(name=names[name])
+            self.blocks[name] = block
+            self.arrays[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+    def names(self):
+        """Returns: dictionary of array name to the name of its shared memory block"""
+        return {name: block.name for name, block in self.blocks.items()}
+
+    def close(self, unlink=False):
+        """Detach from the blocks, and free them with unlink. A block stays mapped while
+        arrays over it are still referenced, it is unmapped when they are gone.
+        """
+        self.arrays = {}
+        for block in self.blocks.values():
+            if unlink:
+                block.unlink()
+            try:
+                block.close()
+            except BufferError:
+                pass
+
+
+def tile_bounds(width, tiles):
+    """First row of every tile and the end of the last one, the rows shared out evenly
+
+    Returns: int64 array of tiles + 1 row numbers
+    """
+    return np.linspace(0, width, tiles + 1).astype(np.int64)
+
+
+def multivariate_hypergeometric(colors, number, generator):
+    """Draw number distinct items from a population of colors[i] items of every color i,
+    with the np.random.Generator generator
+
+    Returns: int64 array with the number of drawn items of every color
+    """
+    drawn = np.zeros(len(colors), dtype=np.int64)
+    remaining = int(np.sum(colors))
+    for i, color in enumerate(colors):
+        if number == 0:
+            break
+        remaining -= int(color)
+        drawn[i] = number if remaining == 0 else generator.hypergeometric(color, remaining, number)
+        number -= drawn[i]
+    return drawn
+
+
+def hand_off_counts(movers, empty_cells, generator):
+    """Share out the moving agents of every tile over the empty cells of all tiles, as if
+    every mover took a distinct empty cell picked uniformly over the whole torus. The number
+    of cells taken in every tile is drawn first, then the movers of every tile take a random
+    part of the cells that are left.
+
+    Parameters:
+        movers: number of moving agents of every tile
+        empty_cells: number of empty cells of every tile
+        generator: np.random.Generator of the draws
+
+    Returns: tiles x tiles int64 array, row s column d is the number of movers from tile s to tile d
+    """
+    cells = multivariate_hypergeometric(empty_cells, int(np.sum(movers)), generator)
+    counts = np.zeros((len(movers), len(movers)), dtype=np.int64)
+    for source, number in enumerate(movers):
+        counts[source] = multivariate_hypergeometric(cells, int(number), generator)
+        cells -= counts[source]
+    return counts
+
+
+class TileWorker:
+    def __init__(self, names, specs, width, height, x0, x1, seed, recovery_days,
+                 quarantine_prob, action_infection_prob, frontier_data):
+        """State of one tile, inside its worker process
+
+        Parameters:
+            self.generator: np.random.Generator of the tile, seeded by seed
+            self.x0, self.x1: rows of the torus owned by the tile
+            self.halo: rows of the neighbouring tiles next to the tile
+            self.owned: indices of the living agents standing on the tile
+            self.empty_cells: EmptyCellPool of the empty cells of the tile, cells numbered from row x0
+            self.movers, self.stayers: owned agents that move and stay at the current step
+            self.old_cells: cells left by the movers of the tile
+            self.new_infected, self.new_quarantined: agents infected in the last round of the spread, and those of them going in quarantine
+            self.changes: agents of the tile infected, going in quarantine, dead and recovered at the current step, one list of arrays each
+            self.frontier: Frontier of the rows of the tile with frontier_data, else None
+            self.halo_infected: cells of the halo rows holding an infected agent, as counted in the frontier
+        """
+        self.generator = np.random.default_rng(seed)
+        self.shared = SharedArrays(specs, names)
+        for name, array in self.shared.arrays.items():
+            setattr(self, name, array)
+
+        self.width = width
+        self.height = height
+        self.x0 = x0
+        self.x1 = x1
+        self.halo = np.setdiff1d(np.array([x0 - 1, x1]) % width, np.arange(x0, x1))
+        self.recovery_days = recovery_days
+        self.quarantine_prob = quarantine_prob
+        self.action_infection_prob = np.array(action_infection_prob)
+
+        band = self.occupancy[x0:x1]
+        self.owned = np.sort(band[band != EMPTY]).astype(np.int64)
+        self.empty_cells = EmptyCellPool(x1 - x0, height, band != EMPTY)
+
+        self.movers = np.empty(0, dtype=np.int64)
+        self.stayers = self.owned
+        self.old_cells = np.empty(0, dtype=np.int64)
+        self.new_infected = np.empty(0, dtype=np.int64)
+        self.new_quarantined = np.empty(0, dtype=np.int64)
+        self.changes = ([], [], [], [])
+
+        self.frontier = None
+        if frontier_data:
+            self.frontier = Frontier(self, x0, x1)
+            self.halo_infected = self.infected_cells(self.halo)
+
+    def pick_actions(self, lockdown, government_stringent):
+        """Every agent of the tile chooses an action, quarantined agents stay in
+
+        Returns: (number of agents doing each action, number of movers, number of empty cells)
+        """
+        prob = self.action_prob[self.owned]
+        if lockdown:
+            apply_stringency(prob, government_stringent)
+            self.action_prob[self.owned] = prob
+
+        quarantined = self.quarantine[self.owned] == QuarantineState.QUARANTINE
+        action = sample_actions(prob, quarantined, self.generator)
+        self.action[self.owned] = action
+
+        """Turn of the agents in the step, and the cells of the tile before the moves, for the spread"""
+        self.turn[self.owned] = self.generator.random(self.owned.size)
+        self.old_occupancy[self.x0:self.x1] = self.occupancy[self.x0:self.x1]
+
+        moving = action != STAY_IN
+        self.movers = self.owned[moving]
+        self.stayers = self.owned[~moving]
+        self.changes = ([], [], [], [])
+        return np.bincount(action, minlength=len(ACTIONS)), self.movers.size, self.empty_cells.size
+
+    def send(self, destinations, offsets):
+        """Write the movers of the tile to the outbox, a random part of them for every
+        destination tile, and remember the cells they leave
+        """
+        movers = self.generator.permutation(self.movers)
+        self.old_cells = (self.x[movers] - self.x0).astype(np.int64) * self.height + self.y[movers]
+        if self.frontier is not None:
+            infected = movers[self.infection[movers] == InfectionState.INFECTED]
+            self.left_x, self.left_y = self.x[infected], self.y[infected]
+        start = 0
+        for number, offset in zip(destinations.tolist(), offsets.tolist()):
+            self.outbox[offset:offset + number] = movers[start:start + number]
+            start = start + number
+
+    def receive(self, sources, offsets, release_first):
+        """Place the movers sent to this tile on distinct random empty cells of the tile
+        and release the cells left by the movers of the tile. New cells are claimed before
+        the old ones are released, unless there are not enough empty cells for that.
+        """
+        arrivals = np.concatenate([self.outbox[offset:offset + number]
+                                   for number, offset in zip(sources.tolist(), offsets.tolist())]).astype(np.int64)
+
+        if release_first:
+            self.leave()
+        new_cells = self.empty_cells.claim_random_many(arrivals.size, self.generator)
+        self.arrive(arrivals, new_cells)
+        if not release_first:
+            self.leave()
+
+        self.owned = np.concatenate([self.stayers, arrivals])
+        self.movers = np.empty(0, dtype=np.int64)
+
+    def arrive(self, arrivals, new_cells):
+        """Place the movers received by the tile on their new cells"""
+        x, y = np.divmod(new_cells, self.height)
+        x = x + self.x0
+        changing = contextlib.nullcontext()
+        if self.frontier is not None:
+            infected = self.infection[arrivals] == InfectionState.INFECTED
+            changing = self.frontier.changing(x, y, arrived_x=x[infected], arrived_y=y[infected])
+        with changing:
+            self.occupancy[self.x0:self.x1].reshape(-1)[new_cells] = arrivals
+        self.x[arrivals] = x
+        self.y[arrivals] = y
+
+    def leave(self):
+        """Release the cells left by the movers of the tile"""
+        changing = contextlib.nullcontext()
+        if self.frontier is not None:
+            x, y = np.divmod(self.old_cells, self.height)
+            changing = self.frontier.changing(x + self.x0, y, self.left_x, self.left_y)
+        with changing:
+            self.release(self.old_cells)
+
+    def release(self, cells):
+        self.occupancy[self.x0:self.x1].reshape(-1)[cells] = EMPTY
+        self.empty_cells.release_many(cells)
+
+    def infected_cells(self, rows):
+        """Returns: len(rows) x height boolean array of the cells of the rows holding an infected agent"""
+        slab = self.occupancy[rows]
+        occupied = slab != EMPTY
+        infected = np.zeros(slab.shape, dtype=bool)
+        infected[occupied] = self.infection[slab[occupied]] == InfectionState.INFECTED
+        return infected
+
+    def spread(self):
+        """First round of the spread: the susceptible agents of the tile meet the infected
+        agents of later turns on their cell before the move, and those of earlier turns on
+        their cell after it, read with one halo row of each neighbouring tile around the rows
+        of the tile. The infections are drawn here and applied by infect, once every tile has
+        read its halo rows.
+        """
+        rows = np.arange(self.x0 - 1, self.x1 + 1) % self.width
+        after_move = self.infected_turns(self.occupancy[rows])
+        before_move = self.infected_turns(self.old_occupancy[rows])
+
+        susceptible = self.owned[self.infection[self.owned] == InfectionState.CLEAN]
+        padded_height = self.height + 2
+        cells = (((self.x[susceptible] - self.x0 + 1).astype(np.intp) * padded_height + self.y[susceptible] + 1)[:, None]
+                 + NEIGHBOUR_DX * padded_height + NEIGHBOUR_DY)
+        own_turn = self.turn[susceptible, None]
+        infected_neighbours = (after_move[cells] < own_turn).sum(axis=1) + (before_move[cells] > own_turn).sum(axis=1)
+        exposed = infected_neighbours > 0
+        self.draw_infections(susceptible[exposed], infected_neighbours[exposed])
+
+    def infected_turns(self, slab):
+        """Turns of the infected agents of some rows of an occupancy grid, with one wrapped
+        column on each side, so the Moore neighbours of a cell are at fixed offsets of its flat index
+
+        Returns: flat array of the turns, NaN (never earlier nor later) for the other cells
+        """
+        turns = np.full(slab.shape, np.nan)
+        occupied = slab != EMPTY
+        agents = slab[occupied]
+        turns[occupied] = np.where(self.infection[agents] == InfectionState.INFECTED, self.turn[agents], np.nan)
+        return np.pad(turns, ((0, 0), (1, 1)), mode="wrap").reshape(-1)
+
+    def spread_round(self, time, spread_round):
+        """Next round of the spread: the susceptible agents of the tile meet the agents
+        infected in the last round, of the tile or of the halo rows, which had an earlier turn
+        """
+        arrived = self.occupancy[self.halo].reshape(-1)
+        arrived = arrived[arrived != EMPTY]
+        arrived = arrived[(self.infection[arrived] == InfectionState.INFECTED) & (self.infected_time[arrived] == time)
+                          & (self.infected_round[arrived] == spread_round - 1)]
+        infectors = np.concatenate([self.new_infected, arrived])
+
+        rows = (self.x[infectors, None] + NEIGHBOUR_DX) % self.width
+        columns = (self.y[infectors, None] + NEIGHBOUR_DY) % self.height
+        on_tile = (rows >= self.x0) & (rows < self.x1)
+        neighbours = self.occupancy[rows[on_tile], columns[on_tile]]
+        infector_turn = np.broadcast_to(self.turn[infectors, None], on_tile.shape)[on_tile]
+        occupied = neighbours != EMPTY
+        neighbours, infector_turn = neighbours[occupied], infector_turn[occupied]
+        met = (self.infection[neighbours] == InfectionState.CLEAN) & (self.turn[neighbours] > infector_turn)
+        exposed, infected_neighbours = np.unique(neighbours[met], return_counts=True)
+        self.draw_infections(exposed, infected_neighbours)
+
+    def draw_infections(self, exposed, infected_neighbours):
+        """Draw the infections of exposed susceptible agents of the tile, one trial with
+        probability 1 - (1 - p) ** infected_neighbours as in VectorizedEngine
+        """
+        escape_prob = (1 - self.action_infection_prob[self.action[exposed]]) ** infected_neighbours
+        self.new_infected = exposed[self.generator.random(exposed.size) >= escape_prob]
+
+        # A fraction of agents choose to self quarantine on being infected
+        self.new_quarantined = self.new_infected[self.generator.random(self.new_infected.size) <= self.quarantine_prob]
+
+    def infect(self, time, spread_round):
+        """Apply the infections drawn in the last round of the spread
+
+        Returns: number of agents infected
+        """
+        changing = contextlib.nullcontext()
+        if self.frontier is not None:
+            x, y = self.x[self.new_infected], self.y[self.new_infected]
+            changing = self.frontier.changing(x, y, arrived_x=x, arrived_y=y)
+        with changing:
+            self.infection[self.new_infected] = InfectionState.INFECTED
+        self.infected_time[self.new_infected] = time
+        self.infected_round[self.new_infected] = spread_round
+        self.quarantine[self.new_quarantined] = QuarantineState.QUARANTINE
+        self.changes[0].append(self.new_infected)
+        self.changes[1].append(self.new_quarantined)
+        return self.new_infected.size
+
+    def update(self, time, lockdown, habituation, learning_rate, death_rate):
+        """The social dilemma, and the deaths and recoveries of the infected agents of the tile
+
+        Returns: (number of deaths, dead agents that stayed in, recoveries)
+        """
+        if lockdown:
+            social_dilemma_update(self, self.owned, time, habituation, learning_rate, len(ACTIONS))
+
+        """Death trial inside the death window, recovery after recovery_days"""
+        infected = self.owned[self.infection[self.owned] == InfectionState.INFECTED]
+        days = time - self.infected_time[infected]
+        at_risk = infected[(days > self.recovery_days * 0.666) & (days < self.recovery_days)]
+        dead = at_risk[self.generator.random(at_risk.size) < death_rate]
+        recovered = infected[days > self.recovery_days]
+
+        changing = contextlib.nullcontext()
+        if self.frontier is not None:
+            x, y = self.x[np.concatenate([dead, recovered])], self.y[np.concatenate([dead, recovered])]
+            changing = self.frontier.changing(x, y, left_x=x, left_y=y)
+        with changing:
+            self.alive[dead] = False
+            self.infection[dead] = InfectionState.DEAD
+            self.release((self.x[dead] - self.x0).astype(np.int64) * self.height + self.y[dead])
+            self.infection[recovered] = InfectionState.RECOVERED
+        self.owned = self.owned[self.alive[self.owned]]
+        self.quarantine[recovered] = QuarantineState.FREE
+        self.changes[2].append(dead)
+        self.changes[3].append(recovered)
+
+        dead_staying_in = int(np.count_nonzero(self.action[dead] == STAY_IN))
+        return dead.size, dead_staying_in, recovered.size
+
+    def transitions(self):
+        """Returns: (agents infected, going in quarantine, dead, recovered) of the tile at the current step"""
+        return tuple(np.concatenate(agents) if agents else np.empty(0, dtype=np.int64) for agents in self.changes)
+
+    def population_metrics(self):
+        """Returns: (agents, aspiration sum, stay in probability sum, go out probability sum) of the tile"""
+        prob = self.action_prob[self.owned]
+        return (self.owned.size, float(self.aspiration[self.owned].sum()),
+                float(prob[:, STAY_IN].sum()), float(prob[:, 1:].sum()))
+
+    def frontier_size(self):
+        """Bring the infected agents of the halo rows, which the neighbouring tiles change,
+        up to date in the frontier of the tile
+
+        Returns: number of susceptible agents of the tile with an infected neighbour
+        """
+        infected = self.infected_cells(self.halo)
+        rows, columns = np.nonzero(infected != self.halo_infected)
+        left = ~infected[rows, columns]
+        x = self.halo[rows]
+        with self.frontier.changing((), (), x[left], columns[left], x[~left], columns[~left]):
+            self.halo_infected = infected
+        return self.frontier.count()
+
+
+def run_worker(connection, *worker_args):
+    """Main loop of a worker process: run the phases sent by the master until it sends None.
+    An error is sent back to the master instead of a result.
+    """
+    worker = TileWorker(*worker_args)
+    try:
+        while True:
+            message = connection.recv()
+            if message is None:
+                break
+            method, args = message
+            try:
+                connection.send(getattr(worker, method)(*args))
+            except Exception:
+                connection.send(RuntimeError("tile {}-{}: {}".format(
+                    worker.x0, worker.x1, traceback.format_exc())))
+    finally:
+        worker.shared.close()
+        connection.close()
+
+
+def shutdown(owner, connections, processes, shared):
+    """Stop the worker processes and free the shared memory. Processes forked later inherit
+    the finalizer of the engine, so only the process owner that created the engine does it.
+    """
+    if os.getpid() != owner:
+        return
+    for connection in connections:
+        try:
+            connection.send(None)
+        except (OSError, ValueError):
+            pass
+    for process in processes:
+        process.join(timeout=5)
+        if process.is_alive():
+            process.terminate()
+    shared.close(unlink=True)
+
+
+class TiledEngine:
+    name = "tiled"
+
+    def __init__(self, model, tiles=None):
+        """Engine which holds the agents of a MainModel in shared arrays, with the grid cut
+        into tiles stepped by worker processes. The arrays have the same names and layout as
+        in VectorizedEngine, so ArrayGrid and AgentView work on them between steps.
+
+        Parameters:
+            self.tiles: number of tiles and worker processes, os.cpu_count() when None, at most width
+            self.bounds: first row of every tile and the end of the last one
+            self.outbox: shared array through which the movers are handed off between tiles
+            self.connections: pipes to the worker processes
+        """
+        self.model = model
+        self.width = model.width
+        self.height = model.height
+        self.tiles = max(1, min(tiles or os.cpu_count() or 1, self.width))
+        self.bounds = tile_bounds(self.width, self.tiles)
+
+        """Add agents and infect them with initial infection rate"""
+
+        occupied = model.generator.random((self.width, self.height)) < model.population_density
+        x, y = np.nonzero(occupied)
+        n = x.size
+        self.n = n
+        infected = model.generator.random(n) < model.initial_infection_rate
+
+        specs = {name: ((n,) if columns is None else (n, columns), dtype)
+                 for name, (dtype, columns) in AGENT_ARRAYS.items()}
+        specs["occupancy"] = ((self.width, self.height), np.int32)
+        specs["old_occupancy"] = ((self.width, self.height), np.int32)
+        self.shared = SharedArrays(specs)
+        for name, array in self.shared.arrays.items():
+            setattr(self, name, array)
+
+        self.x[:] = x
+        self.y[:] = y
+        self.infection[:] = np.where(infected, InfectionState.INFECTED, InfectionState.CLEAN)
+        self.quarantine[:] = QuarantineState.FREE
+        self.infected_time[:] = model.schedule.time
+        self.aspiration[:] = model.global_aspiration
+        self.action_prob[:] = INITIAL_ACTION_PROB
+        self.action[:] = NO_ACTION
+        self.alive[:] = True
+        self.infected_round[:] = -1
+        self.old_occupancy[:] = EMPTY
+        self.occupancy[:] = EMPTY
+        self.occupancy[x, y] = np.arange(n, dtype=np.int32)
+        del occupied, x, y
+
+        model.infection_counts[InfectionState.INFECTED] += int(np.count_nonzero(infected))
+        model.infection_counts[InfectionState.CLEAN] += n - int(np.count_nonzero(infected))
+
+        """One worker process per tile, each with its own random stream seeded from the generator of the model"""
+
+        seeds = np.random.SeedSequence(int(model.generator.integers(2 ** 63))).spawn(self.tiles)
+        if "fork" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("fork")
+        else:
+            context = multiprocessing.get_context()
+        self.connections = []
+        self.processes = []
+        for tile in range(self.tiles):
+            connection, worker_connection = context.Pipe()
+            process = context.Process(
+                target=run_worker, daemon=True,
+                args=(worker_connection, self.shared.names(), specs, self.width, self.height,
+                      int(self.bounds[tile]), int(self.bounds[tile + 1]), seeds[tile].generate_state(4),
+                      model.recovery_days, model.quarantine_prob, model.action_infection_prob,
+                      model.frontier_data))
+            process.start()
+            worker_connection.close()
+            self.connections.append(connection)
+            self.processes.append(process)
+        self._finalizer = weakref.finalize(self, shutdown, os.getpid(), self.connections, self.processes, self.shared)
+
+        self.grid = ArrayGrid(self)
+
+    def call(self, method, *args, tile_args=None):
+        """Run a method of every TileWorker at once and wait for all of them. Every tile gets
+        args, followed by its own item of tile_args when given.
+
+        Returns: list of the results of the tiles
+        """
+        for tile, connection in enumerate(self.connections):
+            connection.send((method, args if tile_args is None else args + tuple(tile_args[tile])))
+        results = [connection.recv() for connection in self.connections]
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return results
+
+    def step(self):
+        model = self.model
+        time = model.schedule.time
+
+        picked = self.call("pick_actions", model.lockdown, model.government_stringent)
+        counts = np.sum([result[0] for result in picked], axis=0)
+        if model.action_history.actions is None and model.transition_log is None:
+            model.record_action_counts(counts)
+        else:
+            alive = np.flatnonzero(self.alive)
+            model.record_actions(self.action[alive], alive)
+        self.move(np.array([result[1] for result in picked]), np.array([result[2] for result in picked]))
+
+        self.call("spread")
+        spread_round = 0
+        infected = sum(self.call("infect", time, spread_round))
+        new_infected = infected
+        while infected > 0:
+            spread_round += 1
+            self.call("spread_round", time, spread_round)
+            infected = sum(self.call("infect", time, spread_round))
+            new_infected += infected
+
+        updates = np.array(self.call("update", time, model.lockdown, model.habituation,
+                                     model.learning_rate, model.death_rate))
+        dead, dead_staying_in, recovered = updates.sum(axis=0).tolist()
+
+        model.count_transition(InfectionState.CLEAN, InfectionState.INFECTED, new_infected)
+        model.dead_agents_number = model.dead_agents_number + dead
+        model.count_transition(InfectionState.INFECTED, InfectionState.DEAD, dead)
+        model.stay_in_count -= dead_staying_in
+        model.go_out_count -= dead - dead_staying_in
+        model.count_transition(InfectionState.INFECTED, InfectionState.RECOVERED, recovered)
+        if model.transition_log is not None:
+            self.log_transitions()
+
+        model.schedule.steps += 1
+        model.schedule.time += 1
+
+    def move(self, movers, empty_cells):
+        """Hand off the movers of every tile to the tiles of their new cells through the outbox.
+        The master draws how many movers go from every tile to every tile, the tiles pick
+        which movers and which cells.
+        """
+        release_first = movers.sum() > empty_cells.sum()
+        if release_first:
+            empty_cells = empty_cells + movers
+        counts = hand_off_counts(movers, empty_cells, self.model.generator)
+        offsets = (np.cumsum(counts.reshape(-1)) - counts.reshape(-1)).reshape(counts.shape)
+
+        self.call("send", tile_args=list(zip(counts, offsets)))
+        self.call("receive", tile_args=list(zip(counts.T, offsets.T, [release_first] * self.tiles)))
+
+    def log_transitions(self):
+        """Add the changes of the agents of every tile during the step to the transition log of the model,
+        in the same order as the tiles made them
+        """
+        changes = self.call("transitions")
+        for infected, quarantined, dead, recovered in changes:
+            self.model.log_transition("infectionstate", infected, InfectionState.INFECTED)
+            self.model.log_transition("quarantinestate", quarantined, QuarantineState.QUARANTINE)
+        for infected, quarantined, dead, recovered in changes:
+            self.model.log_transition("infectionstate", dead, InfectionState.DEAD)
+            self.model.log_transition("action", dead, NO_ACTION)
+            self.model.log_transition("infectionstate", recovered, InfectionState.RECOVERED)
+            self.model.log_transition("quarantinestate", recovered, QuarantineState.FREE)
+
+    def population_metrics(self):
+        """Aggregates over all living agents, same as MainModel.get_population_metrics
+
+        Returns: dictionary with the number of agents, the sum of their aspiration and
+                the sums of their stay in and go out probabilities
+        """
+        agents, aspiration_sum, stay_in_prob_sum, go_out_prob_sum = np.sum(
+            self.call("population_metrics"), axis=0).tolist()
+        return {
+            "agents": int(agents),
+            "aspiration_sum": aspiration_sum,
+            "stay_in_prob_sum": stay_in_prob_sum,
+            "go_out_prob_sum": go_out_prob_sum,
+        }
+
+    def frontier_size(self):
+        """Returns: number of susceptible agents with at least one infected Moore neighbour"""
+        return sum(self.call("frontier_size"))
+
+    def close(self):
+        """Stop the worker processes and free the shared memory, the engine can not step afterwards"""
+        self._finalizer()
@@ -0,0 +1,195 @@
+import os
+
+import numpy as np
+
+from agent import InfectionState, QuarantineState, STAY_IN, NO_ACTION
+
+"""Event log of the state transitions of the agents. Instead of the state of every agent at
+every step, only the changes are kept, as fixed size binary records appended to a file or to
+memory, and the time series or the trajectory of an agent are rebuilt from them on demand.
+"""
+
+"""One event: at step (1 for the first model step, 0 for the initial state) the attribute kind
+of agent went from old to new"""
+EVENT_DTYPE = np.dtype([("step", "<i4"), ("agent", "<i4"), ("kind", "u1"), ("old", "i1"), ("new", "i1")])
+
+"""Kinds of events, the attributes of MainAgent they follow and the value of the attribute of a new agent"""
+INFECTION, QUARANTINE, ACTION = range(3)
+ATTRIBUTES = ("infectionstate", "quarantinestate", "action")
+INITIAL_STATES = (InfectionState.CLEAN, QuarantineState.FREE, NO_ACTION)
+
+"""Start of a log file, followed by the number of agents and 1 when actions are logged as
+int64, then the events"""
+MAGIC = b"TRANSLOG"
+HEADER_BYTES = len(MAGIC) + 16
+
+
+class TransitionLog:
+    def __init__(self, path=None, actions=True):
+        """Append-only log of the transitions of the infection state, the quarantine state
+        and, with actions, the action of every agent. The model and its engine log every
+        change where it happens, and agents that die are logged with no action. The events
+        of a step are written to the file at path after the step, or kept in memory without path.
+
+        Parameters:
+            self.agents: number of agents, unique_id 0 to agents - 1, all starting in INITIAL_STATES
+            self.steps: last step logged
+            self.states: 3 x agents int8 array of the last logged state of every agent
+            self.pending: events of the current step, one array per change, their step set by record
+            self.agent_events: events of single agents not yet in pending, as tuples of EVENT_DTYPE
+            self.chunks: events kept in memory, one array per step
+        """
+        self.path = path
+        self.actions = actions
+        self.agents = 0
+        self.steps = 0
+        self.states = None
+        self.pending = []
+        self.agent_events = []
+        self.chunks = []
+
+    def start(self, agents):
+        """Begin the log of a model of agents agents, called by the model before the initial state
+        """
+        self.agents = agents
+        self.states = np.array(INITIAL_STATES, dtype=np.int8)[:, None].repeat(agents, axis=1)
+        if self.path is not None:
+            with open(self.path, "wb") as file:
+                file.write(MAGIC)
+                file.write(np.array([agents, self.actions], dtype=np.int64).tobytes())
+
+    def change(self, attribute, unique_ids, state):
+        """Log that an attribute of agents goes to state during the current step, agents
+        already in state are left out
+
+        Parameters:
+            attribute: name of the attribute of MainAgent, one of ATTRIBUTES
+            unique_ids: one agent, or sequence of agents
+            state: new state of all the agents, or sequence of the new state of every agent
+        """
+        kind = ATTRIBUTES.index(attribute)
+        if kind == ACTION and not self.actions:
+            return
+        if isinstance(unique_ids, int):
+            """The agent engine changes one agent at a time, its events are gathered in an array
+            only before the next change of many agents"""
+            old = int(self.states[kind, unique_ids])
+            if old != state:
+                self.states[kind, unique_ids] = state
+                self.agent_events.append((0, unique_ids, kind, old, state))
+            return
+        self.gather_agent_events()
+
+        agents = np.asarray(unique_ids, dtype=np.int64)
+        new = np.broadcast_to(np.asarray(state, dtype=np.int8), agents.shape)
+        old = self.states[kind, agents]
+        changed = old != new
+
+        events = np.empty(np.count_nonzero(changed), dtype=EVENT_DTYPE)
+        events["agent"] = agents[changed]
+        events["kind"] = kind
+        events["old"] = old[changed]
+        events["new"] = new[changed]
+        self.states[kind, events["agent"]] = events["new"]
+        self.pending.append(events)
+
+    def gather_agent_events(self):
+        """Move the events of single agents to pending, after the changes logged before them"""
+        if self.agent_events:
+            self.pending.append(np.array(self.agent_events, dtype=EVENT_DTYPE))
+            self.agent_events = []
+
+    def record(self, step):
+        """Write the changes logged during step, called by the model after every step
+        """
+        self.gather_agent_events()
+        events = np.concatenate(self.pending) if self.pending else np.empty(0, dtype=EVENT_DTYPE)
+        events["step"] = step
+        self.pending = []
+
+        self.steps = step
+        if self.path is None:
+            self.chunks.append(events)
+        else:
+            with open(self.path, "ab") as file:
+                file.write(events.tobytes())
+
+    @classmethod
+    def load(cls, path):
+        """Open the log file at path for reading
+
+        Returns: TransitionLog of the file, its steps being the last step with an event
+        """
+        log = cls(path)
+        with open(path, "rb") as file:
+            if file.read(len(MAGIC)) != MAGIC:
+                raise ValueError("Not a transition log: " + str(path))
+            agents, actions = np.frombuffer(file.read(16), dtype=np.int64).tolist()
+        log.agents = agents
+        log.actions = bool(actions)
+        events = log.events()
+        log.steps = int(events["step"][-1]) if events.size else 0
+        return log
+
+    def events(self):
+        """Get all the events logged, in order of step
+
+        Returns: structured array of EVENT_DTYPE
+        """
+        if self.path is None:
+            return np.concatenate(self.chunks) if self.chunks else np.empty(0, dtype=EVENT_DTYPE)
+        return np.fromfile(self.path, dtype=EVENT_DTYPE, offset=HEADER_BYTES)
+
+    def nbytes(self):
+        """Returns: number of bytes of the events logged"""
+        if self.path is None:
+            return sum(chunk.nbytes for chunk in self.chunks)
+        return os.path.getsize(self.path) - HEADER_BYTES
+
+    def series(self):
+        """Rebuild the number of agents in every state after every step from the events
+
+        Returns: dictionary of name to int64 array with steps + 1 values, value r being the
+                number after r steps, as row r of the model reporters of the datacollector:
+                Susceptible, Infected, Recovered, Dead, Quarantined, and with actions Stay In and Go Out
+        """
+        events = self.events()
+        rows = self.steps + 1
+
+        def changes(kind, matches):
+            """Net number of agents entering the states matched, at every step"""
+            of_kind = events[events["kind"] == kind]
+            entered = np.bincount(of_kind["step"][matches(of_kind["new"])], minlength=rows)
+            exited = np.bincount(of_kind["step"][matches(of_kind["old"])], minlength=rows)
+            return np.cumsum(entered - exited)
+
+        series = {}
+        for name, state in (("Susceptible", InfectionState.CLEAN), ("Infected", InfectionState.INFECTED),
+                            ("Recovered", InfectionState.RECOVERED), ("Dead", InfectionState.DEAD)):
+            series[name] = changes(INFECTION, lambda states: states == state)
+        series["Susceptible"] += self.agents
+        series["Quarantined"] = changes(QUARANTINE, lambda states: states == QuarantineState.QUARANTINE)
+        if self.actions:
+            series["Stay In"] = changes(ACTION, lambda actions: actions == STAY_IN)
+            series["Go Out"] = changes(ACTION, lambda actions: (actions != STAY_IN) & (actions != NO_ACTION))
+        return series
+
+    def trajectory(self, unique_id):
+        """Rebuild the states of one agent after every step from its events
+
+        Returns: (steps + 1) x 3 int8 array of infection state, quarantine state and action,
+                row r being the state after r steps
+        """
+        events = self.events()
+        events = events[events["agent"] == unique_id]
+        steps = np.arange(self.steps + 1)
+
+        trajectory = np.empty((steps.size, len(ATTRIBUTES)), dtype=np.int8)
+        for kind, initial in enumerate(INITIAL_STATES):
+            of_kind = events[events["kind"] == kind]
+            if of_kind.size == 0:
+                trajectory[:, kind] = initial
+                continue
+            last = np.searchsorted(of_kind["step"], steps, side="right") - 1
+            trajectory[:, kind] = np.where(last >= 0, of_kind["new"][last], initial)
+        return trajectory
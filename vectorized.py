@@ -0,0 +1,562 @@
+import contextlib
+
+import numpy as np
+
+from agent import InfectionState, QuarantineState, STAY_IN, NO_ACTION
+import agent as agent_tables
+from cell_pool import EmptyCellPool
+
+"""Array-backed engine for MainModel. All agent state lives in NumPy arrays
+(struct-of-arrays) and every phase of the agent step is executed for the whole
+population at once instead of walking schedule.agents.
+"""
+
+"""Columns of the action tables are ordered as ACTIONS"""
+
+ACTION_PAYOFF = np.array(agent_tables.ACTION_PAYOFF)
+INITIAL_ACTION_PROB = np.array(agent_tables.INITIAL_ACTION_PROB)
+
+EMPTY = -1
+
+"""Offsets of the 8 Moore neighbours of a cell"""
+NEIGHBOUR_DX = np.array([-1, -1, -1, 0, 0, 1, 1, 1])
+NEIGHBOUR_DY = np.array([-1, 0, 1, -1, 1, -1, 0, 1])
+
+
+def moore_neighbour_count(mask):
+    """Count the marked Moore neighbours of every cell of a toroidal grid.
+    The 3x3 box sum is separable, so it is done as a 3-sum along x followed by a
+    3-sum along y with wrap around, then the centre cell is taken out again.
+
+    Returns: uint8 array with the same shape as mask
+    """
+    cells = mask.astype(np.uint8)
+
+    column_sum = cells.copy()
+    column_sum[1:] += cells[:-1]
+    column_sum[0] += cells[-1]
+    column_sum[:-1] += cells[1:]
+    column_sum[-1] += cells[0]
+
+    box_sum = column_sum.copy()
+    box_sum[:, 1:] += column_sum[:, :-1]
+    box_sum[:, 0] += column_sum[:, -1]
+    box_sum[:, :-1] += column_sum[:, 1:]
+    box_sum[:, -1] += column_sum[:, 0]
+
+    box_sum -= cells
+    return box_sum
+
+
+def apply_stringency(prob, government_stringent):
+    """Add the effect of government stringent to a N x 4 matrix of action probabilities,
+    in place. Staying in gets government_stringent / 100 more, the three go out actions
+    share the loss. Rows for which a go out probability would go below 0 are left as they are.
+
+    Returns: boolean mask of the rows that were changed
+    """
+    stay_in_t0 = prob[:, STAY_IN]
+    stay_in_t1 = stay_in_t0 + (government_stringent / 100)
+    adjust = (stay_in_t1 - stay_in_t0) / 3
+
+    changed = ((prob[:, 1:] - adjust[:, None]) >= 0).all(axis=1)
+    prob[changed, 1:] -= adjust[changed, None]
+    prob[changed, STAY_IN] = stay_in_t1[changed]
+    return changed
+
+
+def sample_actions(prob, quarantined, generator):
+    """Draw one action per row of a N x 4 matrix of action probabilities with a single
+    uniform draw per row of the np.random.Generator generator, searched in the cumulative
+    probabilities. Quarantined rows stay in.
+
+    Returns: int8 array of action indices, ordered as ACTIONS
+    """
+    draw = generator.random(prob.shape[0])
+    cumulative = np.cumsum(prob, axis=1)
+    action = (draw[:, None] >= cumulative[:, :-1]).sum(axis=1).astype(np.int8)
+    action[quarantined] = STAY_IN
+    return action
+
+
+def social_dilemma_update(state, agents, time, habituation, learning_rate, action_count):
+    """Social dilemma rules of MainAgent.social_dilemma_influence for the given agents of
+    an array state (VectorizedEngine or a tile of the TiledEngine), updated in place
+    """
+    action = state.action[agents].astype(np.intp)
+    infected = state.infection[agents] == InfectionState.INFECTED
+
+    # Agent recieves no payoff on being infected.
+    payoff = np.where(infected & (state.infected_time[agents] == time),
+                      0.0, ACTION_PAYOFF[action])
+    aspiration = state.aspiration[agents]
+    stimulus = payoff - aspiration
+
+    """if the agent isn't infected but recieves a pay off lower than the
+    aspiration, the agent explores other action (randomizer)
+    """
+    explore = (stimulus < 0) & ~infected
+    explorers = agents[explore]
+    state.action_prob[explorers] = 0.3
+    state.action_prob[explorers, action[explore]] = 0.1
+
+    learn = ~explore
+    agents, action = agents[learn], action[learn]
+    payoff, aspiration, stimulus = payoff[learn], aspiration[learn], stimulus[learn]
+
+    aspiration = aspiration * (1 - habituation) + habituation * payoff
+    p0 = state.action_prob[agents, action]
+    positive = stimulus > 0
+    p1 = np.where(positive,
+                  p0 + (1 - p0) * learning_rate * stimulus,
+                  p0 + p0 * learning_rate * stimulus)
+    aspiration = np.where(positive,
+                          aspiration * (1 - habituation) + habituation * payoff,
+                          aspiration * (1 - habituation) - habituation * payoff)
+    state.aspiration[agents] = aspiration
+
+    # Adjust probability of actions since sum of all should be 1
+    adjust = (p1 - p0) / (action_count - 1)
+    adjusted = state.action_prob[agents] - adjust[:, None]
+    own_action = np.zeros(adjusted.shape, dtype=bool)
+    own_action[np.arange(agents.size), action] = True
+
+    # Ensure the probability for actions are never negative
+    allowed = ~((adjusted < 0) & ~own_action).any(axis=1)
+    adjusted[own_action] = p1
+    state.action_prob[agents[allowed]] = adjusted[allowed]
+
+
+class AgentView:
+    """Read-only view of one agent of the engine, so that code written for
+    MainAgent (server.draw, CanvasGrid) can be used with the vectorized engine
+    """
+
+    __slots__ = ("engine", "unique_id")
+
+    def __init__(self, engine, unique_id):
+        self.engine = engine
+        self.unique_id = unique_id
+
+    @property
+    def pos(self):
+        return (int(self.engine.x[self.unique_id]), int(self.engine.y[self.unique_id]))
+
+    @property
+    def infectionstate(self):
+        return InfectionState(self.engine.infection[self.unique_id])
+
+    @property
+    def quarantinestate(self):
+        return QuarantineState(self.engine.quarantine[self.unique_id])
+
+    @property
+    def infected_time(self):
+        return int(self.engine.infected_time[self.unique_id])
+
+    @property
+    def aspiration(self):
+        return float(self.engine.aspiration[self.unique_id])
+
+    @property
+    def action_prob(self):
+        return self.engine.action_prob[self.unique_id].copy()
+
+
+class ArrayGrid:
+    """Minimal SingleGrid lookalike over the occupancy array of the engine,
+    used for visualization
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.width = engine.width
+        self.height = engine.height
+        self.torus = True
+
+    def is_cell_empty(self, pos):
+        x, y = pos
+        return self.engine.occupancy[x, y] == EMPTY
+
+    def get_cell_list_contents(self, cell_list):
+        if isinstance(cell_list, tuple):
+            cell_list = [cell_list]
+        contents = []
+        for x, y in cell_list:
+            unique_id = self.engine.occupancy[x, y]
+            if unique_id != EMPTY:
+                contents.append(AgentView(self.engine, int(unique_id)))
+        return contents
+
+    def coord_iter(self):
+        for x in range(self.width):
+            for y in range(self.height):
+                unique_id = self.engine.occupancy[x, y]
+                agent = None if unique_id == EMPTY else AgentView(self.engine, int(unique_id))
+                yield agent, x, y
+
+
+class Frontier:
+    """A change is not followed, the frontier being counted again from scratch when it is read,
+    when it has more cells than these fractions of the rows: the cells of the agents that
+    change, and the cells that can get or lose an agent of the frontier"""
+    CHANGED_FRACTION = 1 / 4
+    WATCHED_FRACTION = 1 / 64
+
+    def __init__(self, engine, x0=0, x1=None):
+        """Susceptible agents with at least one infected Moore neighbour, on the rows x0 to x1
+        of the grid of an engine (all rows when x1 is None). The engine wraps every change of
+        its agents in changing, with the infected agents that come and go, so the frontier is
+        kept up to date at the cost of the changes instead of searched for on the whole grid.
+        A change of a large part of the grid costs more to follow than a count over the whole
+        grid, so the frontier is then counted again once, when it is read. The spread of the
+        array engines does not use the frontier, it is only reported.
+
+        Parameters:
+            self.pressure: (x1 - x0) x height array with the number of infected agents around every cell of the rows
+            self.size: number of susceptible agents on the rows with an infected neighbour, unless stale
+            self.stale: True when pressure and size have to be counted again
+        """
+        self.engine = engine
+        self.x0 = x0
+        self.x1 = engine.width if x1 is None else x1
+        self.pressure = np.zeros((self.x1 - self.x0, engine.height), dtype=np.int16)
+        self.size = 0
+        self.stale = True
+
+    def neighbours(self, x, y):
+        """Returns: (rows, columns) of the Moore neighbours of the cells (x, y) that lie on the
+        rows, rows counted from x0, and the N x 8 mask of the neighbours kept
+        """
+        rows = (np.asarray(x, dtype=np.intp)[:, None] + NEIGHBOUR_DX) % self.engine.width - self.x0
+        columns = (np.asarray(y, dtype=np.intp)[:, None] + NEIGHBOUR_DY) % self.engine.height
+        kept = (rows >= 0) & (rows < self.x1 - self.x0)
+        return rows[kept], columns[kept], kept
+
+    def exposed(self, cells):
+        """Returns: number of the distinct cells, flat indices of the rows, holding a
+        susceptible agent with an infected neighbour
+        """
+        cells = cells[self.pressure.reshape(-1)[cells] > 0]
+        agents = self.engine.occupancy[self.x0:self.x1].reshape(-1)[cells]
+        agents = agents[agents != EMPTY]
+        return int(np.count_nonzero(self.engine.infection[agents] == InfectionState.CLEAN))
+
+    @contextlib.contextmanager
+    def changing(self, x, y, left_x=(), left_y=(), arrived_x=(), arrived_y=()):
+        """Keep the frontier up to date while the agents of the cells (x, y) change inside the
+        with block, infected agents leave the cells (left_x, left_y) and infected agents arrive
+        on the cells (arrived_x, arrived_y)
+        """
+        infected = len(left_x) + len(arrived_x)
+        if self.stale or len(x) + 8 * infected > self.pressure.size * self.CHANGED_FRACTION:
+            self.stale = True
+            yield
+            return
+
+        """Only the cells around the infected agents that come and go get or lose infected
+        neighbours, the other cells without any can not hold an agent of the frontier"""
+        x = np.asarray(x, dtype=np.intp) - self.x0
+        y = np.asarray(y, dtype=np.intp)
+        own = (x >= 0) & (x < self.x1 - self.x0)
+        cells = x[own] * self.engine.height + y[own]
+        cells = cells[self.pressure.reshape(-1)[cells] > 0]
+        if cells.size + 8 * infected > self.pressure.size * self.WATCHED_FRACTION:
+            self.stale = True
+            yield
+            return
+
+        infected_x = np.concatenate([np.asarray(left_x, dtype=np.intp), np.asarray(arrived_x, dtype=np.intp)])
+        infected_y = np.concatenate([np.asarray(left_y, dtype=np.intp), np.asarray(arrived_y, dtype=np.intp)])
+        rows, columns, kept = self.neighbours(infected_x, infected_y)
+        around = rows * self.engine.height + columns
+        watched = np.unique(np.concatenate([cells, around]))
+        before = self.exposed(watched)
+        yield
+
+        change = np.repeat(np.where(np.arange(infected) < len(left_x), -1, 1), kept.sum(axis=1))
+        np.add.at(self.pressure.reshape(-1), around, change)
+        self.size += self.exposed(watched) - before
+
+    def reset(self):
+        """Count the infected neighbours and the frontier from scratch, reading the rows with
+        one row of each side around them
+        """
+        rows = np.arange(self.x0 - 1, self.x1 + 1) % self.engine.width
+        """State of the agent of every cell, empty cells (EMPTY, the last index) read as DEAD"""
+        states = np.append(self.engine.infection, np.int8(InfectionState.DEAD))[self.engine.occupancy[rows]]
+        self.pressure[:] = moore_neighbour_count(states == InfectionState.INFECTED)[1:-1]
+        self.size = int(np.count_nonzero((states[1:-1] == InfectionState.CLEAN) & (self.pressure > 0)))
+        self.stale = False
+
+    def count(self):
+        """Returns: number of susceptible agents on the rows with an infected neighbour"""
+        if self.stale:
+            self.reset()
+        return self.size
+
+    def agents(self):
+        """Returns: the susceptible agents of the rows with an infected neighbour, in the
+        order of the cells
+        """
+        if self.stale:
+            self.reset()
+        cells = np.flatnonzero(self.pressure > 0)
+        agents = self.engine.occupancy[self.x0:self.x1].reshape(-1)[cells]
+        agents = agents[agents != EMPTY]
+        return agents[self.engine.infection[agents] == InfectionState.CLEAN]
+
+
+class VectorizedEngine:
+    name = "vectorized"
+
+    def __init__(self, model):
+        """Engine which holds the agents of a MainModel as arrays
+
+        Parameters:
+            self.x, self.y: position of every agent on the torus
+            self.infection: InfectionState of every agent, dead agents are marked DEAD
+            self.quarantine: QuarantineState of every agent
+            self.infected_time: step at which the agent got infected
+            self.aspiration: aspiration of every agent
+            self.action_prob: N x 4 matrix of action probabilities, columns ordered as ACTIONS
+            self.action: index of the action done in the current step, NO_ACTION before the first step
+            self.alive: False for agents that died of the virus
+            self.occupancy: width x height array holding the agent index of each cell, EMPTY if the cell is empty
+            self.empty_cells: EmptyCellPool of the cells without an agent
+            self.frontier: Frontier of the agents when the model has frontier_data, else None
+        """
+        self.model = model
+        self.width = model.width
+        self.height = model.height
+
+        """Add agents and infect them with initial infection rate"""
+
+        occupied = model.generator.random((self.width, self.height)) < model.population_density
+        x, y = np.nonzero(occupied)
+        n = x.size
+
+        self.n = n
+        self.x = x.astype(np.int32)
+        self.y = y.astype(np.int32)
+
+        infected = model.generator.random(n) < model.initial_infection_rate
+        self.infection = np.where(infected, InfectionState.INFECTED,
+                                  InfectionState.CLEAN).astype(np.int8)
+        self.quarantine = np.full(n, QuarantineState.FREE, dtype=np.int8)
+        self.infected_time = np.zeros(n, dtype=np.int32)
+        self.aspiration = np.full(n, model.global_aspiration, dtype=np.float64)
+        self.action_prob = np.tile(INITIAL_ACTION_PROB, (n, 1))
+        self.action = np.full(n, NO_ACTION, dtype=np.int8)
+        self.alive = np.ones(n, dtype=bool)
+
+        self.occupancy = np.full((self.width, self.height), EMPTY, dtype=np.int32)
+        self.occupancy[self.x, self.y] = np.arange(n, dtype=np.int32)
+        self.empty_cells = EmptyCellPool(self.width, self.height, occupied)
+
+        model.progression.add(model.schedule.time, np.flatnonzero(infected).tolist())
+        model.infection_counts[InfectionState.INFECTED] += int(np.count_nonzero(infected))
+        model.infection_counts[InfectionState.CLEAN] += n - int(np.count_nonzero(infected))
+
+        self.action_infection_prob = np.array(model.action_infection_prob)
+
+        self.frontier = Frontier(self) if model.frontier_data else None
+
+        self.grid = ArrayGrid(self)
+
+    def action_picker(self):
+        """Every living agent chooses an action for the current step, quarantined agents stay in
+        """
+        alive = np.flatnonzero(self.alive)
+        prob = self.action_prob[alive]
+
+        if self.model.lockdown:
+            apply_stringency(prob, self.model.government_stringent)
+            self.action_prob[alive] = prob
+
+        quarantined = self.quarantine[alive] == QuarantineState.QUARANTINE
+        action = sample_actions(prob, quarantined, self.model.generator)
+        self.action[alive] = action
+        self.model.record_actions(action, alive)
+
+    def move(self):
+        """Agents which are not staying in move to distinct random empty cells, all in one batch.
+        The cells of the agents before the move are kept for the spread.
+        """
+        self.old_x = self.x.copy()
+        self.old_y = self.y.copy()
+        movers = np.flatnonzero(self.alive & (self.action != STAY_IN))
+        if movers.size == 0:
+            return
+
+        occupancy = self.occupancy.reshape(-1)
+        old_cells = self.x[movers] * self.height + self.y[movers]
+        new_cells = self.empty_cells.relocate(old_cells, self.model.generator)
+        new_x, new_y = np.divmod(new_cells, self.height)
+
+        changing = contextlib.nullcontext()
+        if self.frontier is not None:
+            infected = self.infection[movers] == InfectionState.INFECTED
+            changing = self.frontier.changing(np.concatenate([self.x[movers], new_x]),
+                                              np.concatenate([self.y[movers], new_y]),
+                                              self.x[movers[infected]], self.y[movers[infected]],
+                                              new_x[infected], new_y[infected])
+        with changing:
+            occupancy[old_cells] = EMPTY
+            occupancy[new_cells] = movers
+            self.x[movers], self.y[movers] = new_x, new_y
+
+    def action_outcome_spread(self):
+        """Susceptible agents get infected by their infected Moore neighbours, as in the agent
+        engine, where every agent moves and then meets its neighbours at its own turn, in random
+        order. Every agent gets a random turn: an agent meets the infected agents of later turns
+        on their cell before the move, those of earlier turns on their cell after it, and also
+        the agents infected at an earlier turn of the same step. So the spread runs in rounds,
+        from the agents infected before the step, then from the agents infected in the last round.
+        """
+        time = self.model.schedule.time
+        susceptible = np.flatnonzero(self.alive & (self.infection == InfectionState.CLEAN))
+        infected = np.flatnonzero(self.alive & (self.infection == InfectionState.INFECTED))
+        turn = self.model.generator.random(self.n)
+
+        """Grids with one wrapped row and column on every side, so the Moore neighbours of a
+        cell are at fixed offsets of its flat index: the agents, and the turns of some agents
+        (NaN, never earlier nor later, for the other cells)"""
+        padded_height = self.height + 2
+        offsets = NEIGHBOUR_DX * padded_height + NEIGHBOUR_DY
+
+        def turn_grid(agents, x, y):
+            grid = np.full((self.width, self.height), np.nan)
+            grid[x, y] = turn[agents]
+            return np.pad(grid, 1, mode="wrap").reshape(-1)
+
+        def around(x, y):
+            """Returns: N x 8 array of the flat indices of the Moore neighbours of the cells (x, y)"""
+            return ((x.astype(np.intp) + 1) * padded_height + y + 1)[:, None] + offsets
+
+        occupancy = np.pad(self.occupancy, 1, mode="wrap").reshape(-1)
+        susceptible_turn = turn_grid(susceptible, self.x[susceptible], self.y[susceptible])
+
+        """Meetings with the agents infected before the step, searched from the smaller side"""
+        if infected.size < susceptible.size:
+            later = around(self.x[infected], self.y[infected])
+            earlier = around(self.old_x[infected], self.old_y[infected])
+            infected_turn = turn[infected, None]
+            later = later[susceptible_turn[later] > infected_turn]
+            earlier = earlier[susceptible_turn[earlier] < infected_turn]
+            exposed, infected_neighbours = np.unique(occupancy[np.concatenate([later, earlier])], return_counts=True)
+        else:
+            after_move = turn_grid(infected, self.x[infected], self.y[infected])
+            before_move = turn_grid(infected, self.old_x[infected], self.old_y[infected])
+            cells = around(self.x[susceptible], self.y[susceptible])
+            own_turn = turn[susceptible, None]
+            infected_neighbours = ((after_move[cells] < own_turn).sum(axis=1)
+                                   + (before_move[cells] > own_turn).sum(axis=1))
+            exposed = susceptible[infected_neighbours > 0]
+            infected_neighbours = infected_neighbours[infected_neighbours > 0]
+        new_infected = self.infect(exposed, infected_neighbours, time)
+
+        """Meetings with the agents infected in the last round, at their cell after the move"""
+        while new_infected.size > 0:
+            later = around(self.x[new_infected], self.y[new_infected])
+            later = later[susceptible_turn[later] > turn[new_infected, None]]
+            exposed, infected_neighbours = np.unique(occupancy[later], return_counts=True)
+            clean = self.infection[exposed] == InfectionState.CLEAN
+            new_infected = self.infect(exposed[clean], infected_neighbours[clean], time)
+
+    def infect(self, exposed, infected_neighbours, time):
+        """Infection trials of exposed susceptible agents. The original rule does one trial per
+        infected neighbour, which is the same as a single trial with probability
+        1 - (1 - p) ** infected_neighbours
+
+        Returns: agents infected
+        """
+        escape_prob = (1 - self.action_infection_prob[self.action[exposed]]) ** infected_neighbours
+        new_infected = exposed[self.model.generator.random(exposed.size) >= escape_prob]
+
+        if self.frontier is None:
+            self.infection[new_infected] = InfectionState.INFECTED
+        else:
+            x, y = self.x[new_infected], self.y[new_infected]
+            with self.frontier.changing(x, y, arrived_x=x, arrived_y=y):
+                self.infection[new_infected] = InfectionState.INFECTED
+        self.infected_time[new_infected] = time
+        self.model.count_transition(InfectionState.CLEAN, InfectionState.INFECTED, new_infected.size)
+        self.model.progression.add(time, new_infected.tolist())
+        self.model.log_transition("infectionstate", new_infected, InfectionState.INFECTED)
+
+        # A fraction of agents choose to self quarantine on being infected
+        quarantined = new_infected[self.model.generator.random(new_infected.size) <= self.model.quarantine_prob]
+        self.quarantine[quarantined] = QuarantineState.QUARANTINE
+        self.model.log_transition("quarantinestate", quarantined, QuarantineState.QUARANTINE)
+        return new_infected
+
+    def frontier_size(self):
+        """Returns: number of susceptible agents with at least one infected Moore neighbour,
+        kept by the frontier of the engine
+        """
+        return self.frontier.count()
+
+    def social_dilemma_influence(self):
+        """Updation of aspiration and action probabilities of the agents based on
+        their action and payoff, same rules as MainAgent.social_dilemma_influence
+        """
+        if not self.model.lockdown:
+            return
+
+        social_dilemma_update(self, np.flatnonzero(self.alive), self.model.schedule.time,
+                              self.model.habituation, self.model.learning_rate, self.model.action_count)
+
+    def update_status(self):
+        """Infected agents die with the death rate inside the death window and
+        recover after recovery_days, only the agents whose events are due are visited
+        """
+        dead, recovered = self.model.progression.advance(self.model.schedule.time, self.model.death_rate,
+                                                             self.model.generator)
+
+        changing = contextlib.nullcontext()
+        if self.frontier is not None:
+            x, y = self.x[np.concatenate([dead, recovered])], self.y[np.concatenate([dead, recovered])]
+            changing = self.frontier.changing(x, y, left_x=x, left_y=y)
+        with changing:
+            self.alive[dead] = False
+            self.infection[dead] = InfectionState.DEAD
+            self.occupancy[self.x[dead], self.y[dead]] = EMPTY
+            self.infection[recovered] = InfectionState.RECOVERED
+        self.empty_cells.release_many(self.x[dead] * self.height + self.y[dead])
+        self.model.dead_agents_number = self.model.dead_agents_number + dead.size
+        self.model.count_transition(InfectionState.INFECTED, InfectionState.DEAD, dead.size)
+        dead_staying_in = int(np.count_nonzero(self.action[dead] == STAY_IN))
+        self.model.stay_in_count -= dead_staying_in
+        self.model.go_out_count -= dead.size - dead_staying_in
+        self.model.log_transition("infectionstate", dead, InfectionState.DEAD)
+        self.model.log_transition("action", dead, NO_ACTION)
+
+        self.quarantine[recovered] = QuarantineState.FREE
+        self.model.count_transition(InfectionState.INFECTED, InfectionState.RECOVERED, recovered.size)
+        self.model.log_transition("infectionstate", recovered, InfectionState.RECOVERED)
+        self.model.log_transition("quarantinestate", recovered, QuarantineState.FREE)
+
+    def step(self):
+        self.action_picker()
+        self.move()
+        self.action_outcome_spread()
+        self.social_dilemma_influence()
+        self.update_status()
+
+        self.model.schedule.steps += 1
+        self.model.schedule.time += 1
+
+    def population_metrics(self):
+        """Aggregates over all living agents, same as MainModel.get_population_metrics
+
+        Returns: dictionary with the number of agents, the sum of their aspiration and
+                the sums of their stay in and go out probabilities
+        """
+        prob = self.action_prob[self.alive]
+        return {
+            "agents": int(np.count_nonzero(self.alive)),
+            "aspiration_sum": float(self.aspiration[self.alive].sum()),
+            "stay_in_prob_sum": float(prob[:, STAY_IN].sum()),
+            "go_out_prob_sum": float(prob[:, 1:].sum()),
+        }